@@ -0,0 +1,92 @@
+"""Speed of the URL canonicalizer.
+
+Times whole link sets of a synthetic forum site through the old normalize_url
+and through Canonicalizer.canonicalize_many, with a cold and a warm memo. The
+canonical forms themselves are tested in client/tests/test_canonicalize.py.
+
+    python bench_canonicalize.py --pages 200 --repeat 3
+"""
+import argparse
+import os
+import sys
+import time
+from urllib.parse import urljoin, urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+
+from canonicalize import Canonicalizer
+from extractors import get_extractor
+from bench_extractors import forum_page
+
+
+def legacy_normalize_url(base_url, links):
+    """Crawler.normalize_url before the canonicalizer, for comparison."""
+    normalized_links = set()
+    for link in links:
+        if link == "javascript:void(0)":
+            continue
+        if not urlsplit(link).scheme:
+            link = urljoin(base_url, link)
+        link = link.strip().lower().split('#')[0].split('?')[0]
+        if link.endswith('/'):
+            link = link[:-1]
+        if link.endswith(("index.html", "index.htm", "default.asp", "default.aspx")):
+            link = link.rsplit("/", 1)[0]
+        normalized_links.add(link)
+    return normalized_links
+
+
+def link_sets(pages):
+    """(page URL, raw links) of a synthetic forum, every page shares the navigation links."""
+    extraction = get_extractor("stream").extract(forum_page())
+    sets = []
+    for page in range(pages):
+        links = set(extraction.links)
+        links.update(f"?page={n}" for n in range(1, 6))
+        links.update(f"/forum/t/{page}/{n}?utm_source=feed&page={n}" for n in range(20))
+        sets.append((f"https://slo-tech.com/forum/t/{page}?page=1", links))
+    return sets
+
+
+def measure(sets, normalize, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for base_url, links in sets:
+            normalize(base_url, links)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    sets = link_sets(args.pages)
+    total_links = sum(len(links) for _, links in sets)
+    print(f"{len(sets)} pages, {total_links} links")
+
+    results = [("legacy normalize_url", measure(sets, legacy_normalize_url, args.repeat), None)]
+    plain = Canonicalizer()
+    results.append(("canonicalize, no memo",
+                    measure(sets, lambda base, links: {plain.canonicalize(link, base) for link in links}, args.repeat),
+                    None))
+    cold = Canonicalizer()
+    results.append(("canonicalize_many, cold", measure(sets, cold.canonicalize_many, 1), cold.stats()))
+    results.append(("canonicalize_many, warm", measure(sets, cold.canonicalize_many, args.repeat), None))
+
+    print(f"{'mode':<26}{'total':>10}{'us/link':>10}  memo")
+    for name, elapsed, stats in results:
+        memo = f"{stats['hit_rate']:.0%} hits, {stats['size']} entries" if stats else ""
+        print(f"{name:<26}{elapsed * 1000:>8.1f}ms{elapsed / total_links * 1e6:>10.2f}  {memo}")
+
+    legacy = set().union(*(legacy_normalize_url(base, links) for base, links in sets))
+    canonical = set().union(*(Canonicalizer().canonicalize_many(base, links) for base, links in sets))
+    print(f"distinct URLs: legacy {len(legacy)}, canonical {len(canonical)}")
+
+
+if __name__ == "__main__":
+    main()
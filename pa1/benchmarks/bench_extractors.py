@@ -0,0 +1,67 @@
+"""Per-page CPU time of the HTML extractors.
+
+Compares the original BeautifulSoup + prettify path ("soup") with the single
+pass extractors on a synthetic forum page, or on saved pages given as
+arguments. Extractors whose package is not installed are skipped.
+
+    python bench_extractors.py --repeat 50 [page.html ...]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+
+from extractors import EXTRACTORS, get_extractor
+
+
+def forum_page(posts=60, links_per_post=8):
+    parts = ["<!DOCTYPE html><html><head><meta charset='utf-8'><title>Forum thread</title>",
+             "<script>window.dataLayer = [];</script><style>.post { margin: 0 }</style></head><body>",
+             "<nav>" + "".join(f'<a href="/forum/{i}">Forum {i}</a>' for i in range(40)) + "</nav>"]
+    for post in range(posts):
+        links = "".join(f'<a href="/novice/{post}/{i}?page={i}">link {i}</a> ' for i in range(links_per_post))
+        parts.append(
+            f'<div class="post" id="p{post}" onclick="location.href=\'/forum/t/{post}\'">'
+            f'<span class="author">user{post}</span><p>{"Besedilo objave. " * 30}</p>{links}'
+            f'<img src="/avatars/{post}.png" alt="avatar"><script>track({post});</script></div>'
+        )
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pages", nargs="*", help="saved HTML files, a synthetic page is used without them")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = []
+        for path in args.pages:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                pages.append(f.read())
+    else:
+        pages = [forum_page()]
+    print(f"{len(pages)} page(s), {sum(len(page) for page in pages) / len(pages) / 1024:.0f} KiB on average")
+
+    print(f"{'extractor':<10}{'ms/page':>10}{'links':>8}{'images':>8}")
+    for name in EXTRACTORS:
+        try:
+            extractor = get_extractor(name)
+        except ImportError as e:
+            print(f"{name:<10}  skipped: {e}")
+            continue
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for page in pages:
+                extraction = extractor.extract(page)
+        elapsed = time.perf_counter() - start
+        per_page = elapsed / (args.repeat * len(pages)) * 1000
+        print(f"{name:<10}{per_page:>10.2f}{len(extraction.links):>8}{len(extraction.images):>8}")
+
+
+if __name__ == "__main__":
+    main()
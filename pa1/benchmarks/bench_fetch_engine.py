@@ -0,0 +1,72 @@
+"""Pages/sec of the multiprocess worker loop against the asyncio fetch engine.
+
+Both modes crawl the same synthetic site from mock_site.py. The Flask API has
+to be running (`python main.py` in pa1/server), every mode seeds its own path
+prefix so runs do not share URLs.
+
+    python bench_fetch_engine.py --pages 300 --workers 3 --concurrency 200
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+
+from async_crawler import AsyncCrawler
+from crawler import Crawler
+from mock_site import MockSite
+
+
+def make_crawler(site, api_base_url, pages, pool_maxsize=25, lease_size=5):
+    prefix = uuid.uuid4().hex[:8]
+    crawler = Crawler(seed_url=site.seed_url(prefix), api_base_url=api_base_url, pool_maxsize=pool_maxsize,
+                      lease_size=lease_size)
+    html_count = crawler._get_api("/page/html-count").json()["html_page_count"]
+    crawler._put_api("/crawl/budget", json={"max_pages": html_count + pages}).raise_for_status()
+    return crawler
+
+
+def measure(site, crawl):
+    served_before = site.pages_served
+    start = time.time()
+    crawl()
+    elapsed = time.time() - start
+    pages = site.pages_served - served_before
+    return pages, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api", default="http://localhost:5000")
+    parser.add_argument("--pages", type=int, default=300, help="page budget for every mode")
+    parser.add_argument("--hosts", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the mock site waits per response")
+    parser.add_argument("--crawl-delay", type=int, default=1, help="Crawl-delay in the mock robots.txt")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+
+    site = MockSite(num_hosts=args.hosts, pages_per_host=args.pages, latency=args.latency,
+                    crawl_delay=args.crawl_delay).start()
+    results = []
+    try:
+        crawler = make_crawler(site, args.api, args.pages)
+        results.append((f"run(num_workers={args.workers})", *measure(site, lambda: crawler.run(num_workers=args.workers))))
+
+        crawler = make_crawler(site, args.api, args.pages, pool_maxsize=args.concurrency,
+                               lease_size=max(5, args.concurrency // 4))
+        engine = AsyncCrawler(crawler, concurrency=args.concurrency)
+        results.append((f"AsyncCrawler(concurrency={args.concurrency})", *measure(site, engine.run)))
+    finally:
+        site.stop()
+
+    print()
+    print(f"{'mode':<36}{'pages':>8}{'seconds':>10}{'pages/sec':>12}")
+    for mode, pages, elapsed in results:
+        print(f"{mode:<36}{pages:>8}{elapsed:>10.2f}{pages / elapsed:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Ingestion rate of link batches into the frontier, before and after the set-based upsert.
+
+"before" is the old insert path: chunked multi-row inserts with ON CONFLICT on
+the full URL, then a SELECT ... WHERE url IN (...) for the IDs and a separate
+link insert, with the unique B-tree on url. "after" is main.ingest_links, one
+statement per batch on the md5(url) index. Both start from an emptied crawldb
+holding --existing pages, and every batch links from one page to --batch URLs
+of which --known-ratio already have a page, like the links of a real page.
+Needs a local Postgres database, like bench_crawl.py.
+
+    python bench_frontier_ingest.py --batch 10000 --batches 10 --existing 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from bench_crawl import DEFAULT_DATABASE, LOCAL_HOSTS, bootstrap_database
+
+
+def legacy_ingest(db, links, known_urls, from_page_id):
+    """The /page/frontierlinks insert path before ingest_links."""
+    import models
+    from sqlalchemy import select
+    from sqlalchemy.dialects.postgresql import insert
+
+    new_pages = []
+    for i in range(0, len(links), 1000):
+        chunk = links[i: i + 1000]
+        stmt = insert(models.Page).values([
+            {"site_id": None, "page_type_code": "FRONTIER", "url": link["url"], "relevance": link["relevance"]}
+            for link in chunk
+        ]).on_conflict_do_nothing(index_elements=["url"]).returning(
+            models.Page.id, models.Page.url, models.Page.relevance
+        )
+        new_pages.extend(db.execute(stmt).fetchall())
+
+    if from_page_id is None:
+        return new_pages
+    urls = [link["url"] for link in links] + list(known_urls)
+    pages = db.execute(select(models.Page.id, models.Page.url).where(models.Page.url.in_(urls))).fetchall()
+    url_to_id = {page.url: page.id for page in pages}
+    link_rows = [{"from_page": from_page_id, "to_page": url_to_id[url]} for url in urls if url in url_to_id]
+    if link_rows:
+        db.execute(insert(models.Link).values(link_rows).on_conflict_do_nothing(index_elements=["from_page", "to_page"]))
+    return new_pages
+
+
+def use_url_index(engine, legacy):
+    """The old unique index on the full URL for "before", the hash index for "after"."""
+    from sqlalchemy import text
+
+    with engine.begin() as conn:
+        if legacy:
+            conn.execute(text("DROP INDEX IF EXISTS crawldb.idx_page_url_hash"))
+            conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS unq_url_idx ON crawldb.page (url)"))
+        else:
+            conn.execute(text("DROP INDEX IF EXISTS crawldb.unq_url_idx"))
+            conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS idx_page_url_hash ON crawldb.page ((md5(url)::uuid))"))
+
+
+def url(rng, n):
+    # Realistic lengths, a host and a path of a few segments
+    return f"https://host{n % 500}.example/forum/{rng.getrandbits(32):x}/thread-{n}?page={n % 7}"
+
+
+def measure(api, ingest, args, legacy):
+    from sqlalchemy import text
+
+    bootstrap_database(api.engine, reset=True)
+    use_url_index(api.engine, legacy)
+    rng = random.Random(args.seed)
+    db = api.SessionLocal()
+    try:
+        known = [url(rng, n) for n in range(args.existing)]
+        for i in range(0, len(known), 10000):
+            db.execute(text("""INSERT INTO crawldb.page (page_type_code, url, relevance)
+                               SELECT 'FRONTIER', unnest(CAST(:urls AS text[])), 1"""), {"urls": known[i:i + 10000]})
+        db.commit()
+        db.execute(text("ANALYZE crawldb.page"))
+        from_page_id = db.execute(text("SELECT min(id) FROM crawldb.page")).scalar()
+
+        elapsed = 0.0
+        inserted = 0
+        next_url = args.existing
+        for _ in range(args.batches):
+            known_count = int(args.batch * args.known_ratio) if known else 0
+            links = [{"url": url(rng, next_url + n), "relevance": rng.randrange(30)}
+                     for n in range(args.batch - known_count)]
+            next_url += len(links)
+            known_urls = rng.sample(known, known_count)
+            start = time.perf_counter()
+            inserted += len(ingest(db, links, known_urls, from_page_id))
+            db.commit()
+            elapsed += time.perf_counter() - start
+        links_stored = db.execute(text("SELECT COUNT(*) FROM crawldb.link")).scalar()
+    finally:
+        db.close()
+    return elapsed, inserted, links_stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default=os.getenv("BENCH_DATABASE_URL", DEFAULT_DATABASE))
+    parser.add_argument("--batch", type=int, default=10000)
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--existing", type=int, default=200000, help="pages stored before the batches")
+    parser.add_argument("--known-ratio", type=float, default=0.5, help="share of every batch that already has a page")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Every run empties crawldb and rebuilds its URL index
+    if urlsplit(args.database).hostname not in LOCAL_HOSTS:
+        parser.error("refusing to empty a database that is not on localhost")
+    # main.py reads DATABASE_URL on import
+    os.environ["DATABASE_URL"] = args.database
+    import main as api
+
+    results = [
+        ("before: chunked insert + url IN", *measure(api, legacy_ingest, args, legacy=True)),
+        ("after: ingest_links", *measure(api, api.ingest_links, args, legacy=False)),
+    ]
+    # Leave the schema as the migrations define it
+    use_url_index(api.engine, legacy=False)
+
+    total = args.batch * args.batches
+    print(f"{args.batches} batches of {args.batch} links, {args.existing} pages stored before")
+    print(f"{'mode':<34}{'seconds':>9}{'links/sec':>12}{'ms/batch':>10}{'new pages':>11}{'links':>9}")
+    for name, elapsed, inserted, links_stored in results:
+        print(f"{name:<34}{elapsed:>9.2f}{total / elapsed:>12.0f}{elapsed / args.batches * 1000:>10.1f}"
+              f"{inserted:>11}{links_stored:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Lookup latency and memory of the SimHash LSH index as it grows.
+
+Random fingerprints stand in for pages. At every size the benchmark looks up
+fingerprints that are not in the index (the common case) and stored ones with
+a few flipped bits (near duplicates). No server or database is needed.
+
+    python bench_lsh_index.py --sizes 100000 1000000 3000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from lsh import SimHashIndex
+
+
+def flip_bits(fingerprint, count, rng):
+    for bit in rng.sample(range(64), count):
+        fingerprint ^= 1 << bit
+    return fingerprint
+
+
+def time_lookups(index, queries):
+    timings = []
+    hits = 0
+    for fingerprint in queries:
+        start = time.perf_counter()
+        match = index.find(fingerprint)
+        timings.append((time.perf_counter() - start) * 1e6)
+        hits += match is not None
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99)], hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 2_000_000])
+    parser.add_argument("--bands", type=int, default=4)
+    parser.add_argument("--max-distance", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    index = SimHashIndex(num_bands=args.bands, max_distance=args.max_distance)
+    stored = []
+
+    print(f"{'pages':>10}{'MB':>10}{'B/page':>8}{'miss p50 us':>13}{'miss p99 us':>13}"
+          f"{'near p50 us':>13}{'near p99 us':>13}{'near hits':>11}")
+    for size in sorted(args.sizes):
+        while index.size < size:
+            fingerprint = rng.getrandbits(64)
+            index.add(index.size, fingerprint)
+            if len(stored) < args.queries:
+                stored.append(fingerprint)
+
+        misses = [rng.getrandbits(64) for _ in range(args.queries)]
+        near = [flip_bits(rng.choice(stored), args.max_distance, rng) for _ in range(args.queries)]
+        miss_p50, miss_p99, _ = time_lookups(index, misses)
+        near_p50, near_p99, hits = time_lookups(index, near)
+        memory = index.memory_bytes()
+        print(f"{index.size:>10}{memory / 2**20:>10.1f}{memory / index.size:>8.0f}{miss_p50:>13.1f}{miss_p99:>13.1f}"
+              f"{near_p50:>13.1f}{near_p99:>13.1f}{hits / len(near):>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
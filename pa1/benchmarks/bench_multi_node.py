@@ -0,0 +1,84 @@
+"""Several crawler nodes on one machine, partitioned by host with consistent hashing.
+
+Starts the mock site and `--nodes` crawler processes, each its own node with a
+node ID, its own NodeManager and the asyncio engine. Nodes join `--stagger`
+seconds apart, so host ownership rebalances while the crawl runs. The Flask
+API has to be running with the in-memory frontier (`python main.py` in
+pa1/server). Reports pages per node and the most requests any host of the
+mock site answered at once, which stays 1 when no host is crawled by two
+nodes at the same time.
+
+    python bench_multi_node.py --nodes 3 --pages 600 --stagger 5
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+
+from async_crawler import AsyncCrawler
+from crawler import Crawler
+from mock_site import MockSite
+
+
+def run_node(node_id, seed_url, api_base_url, concurrency, pages_crawled):
+    crawler = Crawler(seed_url=seed_url, api_base_url=api_base_url, node_id=node_id, pool_maxsize=concurrency,
+                      lease_size=max(5, concurrency // 4), verbose=False, heartbeat_interval=2)
+    engine = AsyncCrawler(crawler, concurrency=concurrency)
+    engine.run()
+    pages_crawled[node_id] = engine.pages_crawled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api", default="http://localhost:5000")
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=600, help="page budget of the whole crawl")
+    parser.add_argument("--hosts", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--crawl-delay", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=50, help="fetches in flight per node")
+    parser.add_argument("--stagger", type=float, default=5, help="seconds between nodes joining")
+    args = parser.parse_args()
+
+    site = MockSite(num_hosts=args.hosts, pages_per_host=args.pages, latency=args.latency,
+                    crawl_delay=args.crawl_delay).start()
+    html_count = requests.get(f"{args.api}/page/html-count").json()["html_page_count"]
+    requests.put(f"{args.api}/crawl/budget", json={"max_pages": html_count + args.pages}).raise_for_status()
+    seed_url = site.seed_url(uuid.uuid4().hex[:8])
+
+    with multiprocessing.Manager() as manager:
+        pages_crawled = manager.dict()
+        processes = []
+        start = time.time()
+        try:
+            for index in range(args.nodes):
+                if index:
+                    time.sleep(args.stagger)
+                node_id = f"node-{index}"
+                process = multiprocessing.Process(target=run_node, name=node_id,
+                                                  args=(node_id, seed_url, args.api, args.concurrency, pages_crawled))
+                process.start()
+                processes.append(process)
+                print(f"{node_id} joined, ring: {requests.get(f'{args.api}/nodes').json()}")
+            for process in processes:
+                process.join()
+        finally:
+            site.stop()
+        elapsed = time.time() - start
+
+        print()
+        print(f"{'node':<10}{'pages':>8}")
+        for node_id, pages in sorted(pages_crawled.items()):
+            print(f"{node_id:<10}{pages:>8}")
+    print(f"{site.pages_served} pages in {elapsed:.2f}s, {site.pages_served / elapsed:.2f} pages/sec")
+    print(f"Most concurrent requests to one host: {max(site.max_in_flight)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Upload time and client memory of base64-in-JSON against binary uploads.
+
+Sends synthetic multi-MB PDFs to a running server (`python main.py` in
+pa1/server) as base64 inside JSON (POST /image, the old path), as a raw body and
+as a multipart file (POST /pagedata/upload), and streamed in chunks from a
+generator the way the crawler passes on a response body. Rows are stored on a
+leased frontier page, which is released again afterwards.
+
+    python bench_uploads.py --sizes 2 8 32 --repeat 3
+"""
+import argparse
+import base64
+import os
+import time
+import tracemalloc
+
+import requests
+
+CHUNK_SIZE = 64 * 1024
+
+
+def synthetic_pdf(size):
+    """`size` bytes that start like a PDF and, like real PDFs, hardly compress."""
+    header = b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n"
+    return header + os.urandom(size - len(header) - 6) + b"\n%%EOF"
+
+
+def chunks(data):
+    view = memoryview(data)
+    for start in range(0, len(data), CHUNK_SIZE):
+        yield view[start:start + CHUNK_SIZE]
+
+
+def upload_base64_json(session, api, page_id, data):
+    body = {"page_id": page_id, "filename": "bench.pdf", "content_type": "application/pdf",
+            "data": base64.b64encode(data).decode("ascii"), "accessed_time": None}
+    response = session.post(f"{api}/image", json=body)
+    return response, len(response.request.body)
+
+
+def upload_raw(session, api, page_id, data):
+    response = session.post(f"{api}/pagedata/upload", params={"page_id": page_id, "data_type_code": "PDF"},
+                            data=data, headers={"Content-Type": "application/octet-stream"})
+    return response, len(data)
+
+
+def upload_multipart(session, api, page_id, data):
+    response = session.post(f"{api}/pagedata/upload", data={"page_id": page_id, "data_type_code": "PDF"},
+                            files={"file": ("bench.pdf", data, "application/pdf")})
+    return response, len(response.request.body)
+
+
+def upload_streamed(session, api, page_id, data):
+    response = session.post(f"{api}/pagedata/upload", params={"page_id": page_id, "data_type_code": "PDF"},
+                            data=chunks(data), headers={"Content-Type": "application/octet-stream"})
+    return response, len(data)
+
+
+MODES = (
+    ("base64 JSON", upload_base64_json),
+    ("raw body", upload_raw),
+    ("multipart", upload_multipart),
+    ("chunked stream", upload_streamed),
+)
+
+
+def measure(session, api, page_id, upload, data, repeat):
+    times = []
+    peak = 0
+    wire = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        response, wire = upload(session, api, page_id, data)
+        times.append(time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        response.raise_for_status()
+    return min(times), wire, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api", default="http://localhost:5000")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2, 8, 32], help="PDF sizes in MB")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    session = requests.Session()
+    lease = session.get(f"{args.api}/frontier/lease", params={"limit": 1})
+    lease.raise_for_status()
+    pages = lease.json()["pages"]
+    if not pages:
+        parser.error("the frontier is empty, seed it first so there is a page to attach uploads to")
+    page_id = pages[0]["id"]
+
+    try:
+        print(f"{'size':>6} {'mode':<15} {'time':>9} {'MB/s':>8} {'wire':>10} {'client peak':>12}")
+        for size_mb in args.sizes:
+            data = synthetic_pdf(size_mb * 1024 * 1024)
+            for name, upload in MODES:
+                elapsed, wire, peak = measure(session, args.api, page_id, upload, data, args.repeat)
+                print(f"{size_mb:>4}MB {name:<15} {elapsed * 1000:>7.0f}ms {size_mb / elapsed:>8.1f} "
+                      f"{wire / 2 ** 20:>8.2f}MB {peak / 2 ** 20:>10.2f}MB")
+    finally:
+        session.post(f"{args.api}/frontier/release", json={"page_ids": [page_id]})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockSite:
+    """Synthetic website served from localhost for crawler benchmarks.
+
+    Every host is a ThreadingHTTPServer on its own port, so 127.0.0.1:8100 and
+    127.0.0.1:8101 count as different domains for politeness. Each page links to
+    `fan_out` other pages spread over all hosts. Any path prefix is served, so
+    every benchmark run can crawl its own fresh set of URLs.
+
+    The graph can be made harder: `duplicate_ratio` of the pages serve the same
+    HTML as the first page of their host, the first `slow_hosts` hosts answer
+    after `slow_latency` seconds, `js_ratio` of the pages only add their links
+    from a script, and `private_ratio` of the links point below a path that
+    robots.txt disallows. Pages served from there are counted as violations.
+    """
+
+    def __init__(self, num_hosts=4, pages_per_host=200, fan_out=10, latency=0.05,
+                 crawl_delay=1, base_port=8100, seed=0, duplicate_ratio=0.0, slow_hosts=0,
+                 slow_latency=1.0, js_ratio=0.0, private_ratio=0.0, disallow=("/private/",)):
+        self.num_hosts = num_hosts
+        self.pages_per_host = pages_per_host
+        self.fan_out = fan_out
+        self.latency = latency
+        self.crawl_delay = crawl_delay
+        self.base_port = base_port
+        self.seed = seed
+        self.duplicate_ratio = duplicate_ratio
+        self.slow_hosts = slow_hosts
+        self.slow_latency = slow_latency
+        self.js_ratio = js_ratio
+        self.private_ratio = private_ratio
+        self.disallow = tuple(disallow)
+        self.servers = []
+        self.pages_served = 0
+        self.duplicates_served = 0
+        self.js_pages_served = 0
+        self.disallowed_served = 0
+        # Requests a host is answering at once, more than one means politeness was broken
+        self.in_flight = [0] * num_hosts
+        self.max_in_flight = [0] * num_hosts
+        self.lock = threading.Lock()
+
+    def host(self, index):
+        return f"127.0.0.1:{self.base_port + index}"
+
+    def page_url(self, prefix, host_index, page):
+        return f"http://{self.host(host_index)}/{prefix}/p{page}.html"
+
+    def seed_url(self, prefix):
+        return self.page_url(prefix, 0, 0)
+
+    def robots_txt(self):
+        rules = "".join(f"Disallow: {path}\n" for path in self.disallow)
+        return f"User-agent: *\nCrawl-delay: {self.crawl_delay}\n{rules}"
+
+    def page_rng(self, host_index, page):
+        return random.Random(self.seed * 1_000_003 + host_index * 10_007 + page)
+
+    def is_duplicate(self, host_index, page):
+        return page > 0 and self.page_rng(host_index, page).random() < self.duplicate_ratio
+
+    def is_js_page(self, host_index, page):
+        return self.page_rng(host_index, -page - 1).random() < self.js_ratio
+
+    def page_html(self, prefix, host_index, page):
+        if self.is_duplicate(host_index, page):
+            page = 0
+        rng = self.page_rng(host_index, page)
+        links = []
+        for _ in range(self.fan_out):
+            target_host = rng.randrange(self.num_hosts)
+            target_page = rng.randrange(self.pages_per_host)
+            url = self.page_url(prefix, target_host, target_page)
+            if self.disallow and rng.random() < self.private_ratio:
+                url = url.replace(f"/{prefix}/", f"{self.disallow[0]}{prefix}/", 1)
+            links.append(f'<a href="{url}">page {target_page}</a>')
+
+        if self.is_js_page(host_index, page):
+            # Only a browser sees these links, the plain HTML asks for JavaScript
+            body = ('<div data-placeholder="links">Please enable JavaScript</div>'
+                    "<script>document.body.insertAdjacentHTML('beforeend', {links!r});</script>")
+        else:
+            body = "{links}"
+        return (
+            "<html><head><title>Page {page}</title><script>var x = 1;</script></head>"
+            "<body><h1>Host {host} page {page}</h1><p>{text}</p>" + body +
+            '<img src="/static/img{page}.png"></body></html>'
+        ).format(host=host_index, page=page, text="lorem ipsum " * 50, links="".join(links))
+
+    def make_handler(self, host_index):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                # robots.txt is read by whichever node checks a link, only page fetches count
+                if self.path == "/robots.txt":
+                    self.serve()
+                    return
+                with site.lock:
+                    site.in_flight[host_index] += 1
+                    site.max_in_flight[host_index] = max(site.max_in_flight[host_index], site.in_flight[host_index])
+                try:
+                    self.serve()
+                finally:
+                    with site.lock:
+                        site.in_flight[host_index] -= 1
+
+            def serve(self):
+                time.sleep(site.slow_latency if host_index < site.slow_hosts else site.latency)
+                if self.path == "/robots.txt":
+                    self.respond(200, "text/plain", site.robots_txt())
+                    return
+
+                parts = self.path.strip("/").split("/")
+                if len(parts) >= 2 and parts[-1].startswith("p") and parts[-1].endswith(".html"):
+                    page = int(parts[-1][1:-5])
+                    duplicate = site.is_duplicate(host_index, page)
+                    with site.lock:
+                        site.pages_served += 1
+                        site.duplicates_served += duplicate
+                        site.js_pages_served += site.is_js_page(host_index, 0 if duplicate else page)
+                        site.disallowed_served += self.path.startswith(site.disallow)
+                    self.respond(200, "text/html; charset=utf-8", site.page_html(parts[-2], host_index, page))
+                else:
+                    self.respond(404, "text/plain", "not found")
+
+            def respond(self, status, content_type, body):
+                payload = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        for index in range(self.num_hosts):
+            server = ThreadingHTTPServer(("127.0.0.1", self.base_port + index), self.make_handler(index))
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.servers.append(server)
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
@@ -0,0 +1,104 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from crawler import Crawler
+
+
+class AsyncCrawler:
+    """Keeps many fetches in flight from a single process.
+
+    Frontier, fetch and page handling are the blocking Crawler methods, run on a
+    thread pool. Pages come from the crawler's politeness scheduler, so a host
+    that is waiting out its crawl delay does not hold up fetches to other hosts,
+    and tasks wait on the event loop instead of in a thread.
+    """
+
+    def __init__(self, crawler, concurrency=200):
+        self.crawler = crawler
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.pages_crawled = 0
+
+    async def crawl_url(self, loop, executor, page_id, url):
+        crawler = self.crawler
+        start = time.perf_counter()
+        domain = crawler.get_domain(url)
+        with crawler.metrics.time("site_lookup"):
+            site_id = await loop.run_in_executor(
+                executor, crawler.get_or_create_site, domain, page_id, urlsplit(url).scheme
+            )
+
+        html, status_code, content_type, validators = await loop.run_in_executor(executor, crawler.fetch, url, page_id)
+        await loop.run_in_executor(
+            executor, crawler.process_page, page_id, url, site_id, html, status_code, content_type, validators
+        )
+        crawler.metrics.observe("crawler_stage_seconds", time.perf_counter() - start, stage="page")
+
+    async def task(self, loop, executor, stop):
+        while not stop.is_set():
+            if self.crawler.html_budget_reached():
+                print("The page budget has been used up.")
+                stop.set()
+                break
+
+            # Count the dequeue as in flight too, so an empty frontier is not taken as the end
+            # of the crawl while another task is about to get a URL
+            self.in_flight += 1
+            page, wait = None, None
+            try:
+                page, wait = await loop.run_in_executor(executor, self.crawler.poll_frontier_url)
+                if page is not None:
+                    page_id, url = page
+                    try:
+                        await self.crawl_url(loop, executor, page_id, url)
+                    except Exception as e:
+                        print(f"Error while crawling {url}: {e}")
+                    self.pages_crawled += 1
+                elif wait is None and self.in_flight == 1:
+                    # Links of the last pages may still wait in the write-behind buffer
+                    if self.crawler.results.pending():
+                        await loop.run_in_executor(executor, self.crawler.results.flush)
+                    else:
+                        stop.set()
+            finally:
+                self.in_flight -= 1
+
+            if page is None:
+                # Either every queued host is waiting out its delay, or pages still in
+                # flight may add new links to the frontier
+                if wait is not None:
+                    with self.crawler.metrics.time("delay_wait"):
+                        await asyncio.sleep(min(wait, 1))
+                else:
+                    await asyncio.sleep(1)
+
+    async def crawl(self):
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        if self.crawler.metrics_port is not None:
+            self.crawler.metrics.serve(self.crawler.metrics_port)
+        self.crawler.join_cluster()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            await asyncio.gather(*(self.task(loop, executor, stop) for _ in range(self.concurrency)))
+        self.crawler.results.flush()
+        self.crawler.images.close()
+        self.crawler.close_browsers()
+        self.crawler.release_frontier_urls()
+        self.crawler.leave_cluster()
+        self.crawler.save_seen_urls()
+        self.crawler.print_cache_stats()
+        self.crawler.print_harvest_rate()
+        self.crawler.metrics.close()
+
+    def run(self):
+        start = time.time()
+        asyncio.run(self.crawl())
+        elapsed = time.time() - start
+        print(f"Crawling complete. {self.pages_crawled} pages in {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    crawler = Crawler(pool_maxsize=200, lease_size=50)
+    AsyncCrawler(crawler, concurrency=200).run()
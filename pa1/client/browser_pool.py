@@ -0,0 +1,91 @@
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.webdriver.firefox.options import Options
+
+# Status of the main document, Firefox fills responseStatus since version 109
+NAVIGATION_STATUS_SCRIPT = """
+const entry = performance.getEntriesByType("navigation")[0];
+return entry && entry.responseStatus ? entry.responseStatus : null;
+"""
+
+
+def default_options():
+    options = Options()
+    options.add_argument("--headless")
+    return options
+
+
+class BrowserPool:
+    """Bounded pool of headless Firefox instances for rendering JavaScript pages.
+
+    At most `max_browsers` instances exist at once. An instance is recycled after
+    `pages_per_browser` renders, and one that raised during a render is quit
+    instead of going back to the pool, so a broken browser never leaks.
+    """
+
+    def __init__(self, max_browsers=2, pages_per_browser=50, render_timeout=30, options=None):
+        self.max_browsers = max_browsers
+        self.pages_per_browser = pages_per_browser
+        self.render_timeout = render_timeout
+        self.options = options or default_options()
+        self.slots = threading.BoundedSemaphore(max_browsers)
+        self.idle = []
+        self.lock = threading.Lock()
+        self.started = 0
+
+    def _start_browser(self):
+        driver = webdriver.Firefox(options=self.options)
+        driver.set_page_load_timeout(self.render_timeout)
+        driver.set_script_timeout(self.render_timeout)
+        with self.lock:
+            self.started += 1
+        return [driver, 0]
+
+    @staticmethod
+    def _quit(browser):
+        try:
+            browser[0].quit()
+        except Exception as e:
+            print(f"[ERROR] Closing browser failed: {e}")
+
+    @contextmanager
+    def lease(self):
+        """Lease a browser, blocks while all of them are in use."""
+        self.slots.acquire()
+        browser = None
+        try:
+            with self.lock:
+                browser = self.idle.pop() if self.idle else None
+            if browser is None:
+                browser = self._start_browser()
+
+            yield browser[0]
+
+            browser[1] += 1
+            if browser[1] >= self.pages_per_browser:
+                self._quit(browser)
+            else:
+                with self.lock:
+                    self.idle.append(browser)
+            browser = None
+        finally:
+            if browser is not None:
+                self._quit(browser)
+            self.slots.release()
+
+    def render(self, url):
+        """Load the page in a browser, returns (page_source, status_code, content_type header value)."""
+        with self.lease() as driver:
+            driver.get(url)
+            page_source = driver.page_source
+            status_code = driver.execute_script(NAVIGATION_STATUS_SCRIPT) or 200
+            content_type = driver.execute_script("return document.contentType;") or ""
+            return page_source, status_code, content_type
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for browser in idle:
+            self._quit(browser)
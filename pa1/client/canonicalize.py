@@ -0,0 +1,192 @@
+import re
+import threading
+from collections import OrderedDict
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+TRACKING_PARAMS = frozenset({
+    "utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content", "utm_id", "utm_name",
+    "gclid", "dclid", "gbraid", "wbraid", "fbclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid", "_ga", "_gl",
+})
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+DIRECTORY_INDEXES = ("index.html", "index.htm", "default.asp", "default.aspx")
+
+UNRESERVED = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+PERCENT_ENCODED = re.compile(r"%([0-9a-fA-F]{2})")
+STRAY_PERCENT = re.compile(r"%(?![0-9a-fA-F]{2})")
+# Characters that may stay as they are, everything else is percent-encoded
+PATH_SAFE = frozenset("!$&'()*+,;=:@/%") | UNRESERVED
+QUERY_SAFE = frozenset("!$'()*+,;=:@/?%") | UNRESERVED
+STRIPPED = re.compile(r"[\t\n\r]")
+HAS_SCHEME = re.compile(r"\s*[a-zA-Z][a-zA-Z0-9+.-]*:")
+
+ONCLICK_URL = re.compile(
+    r"""(?:location(?:\.href)?\s*=|location\.(?:assign|replace)\s*\(|window\.open\s*\()\s*(["'])(.+?)\1"""
+)
+
+
+def onclick_url(handler):
+    """URL an onclick handler navigates to, like location.href='/x' or window.open('/x'), or None."""
+    match = ONCLICK_URL.search(handler)
+    return match.group(2) if match else None
+
+
+def normalize_percent_encoding(part, safe):
+    """Uppercase percent-encodings, decode the unreserved characters and encode what may not appear raw."""
+    part = STRAY_PERCENT.sub("%25", part)
+    part = PERCENT_ENCODED.sub(
+        lambda match: chr(int(match.group(1), 16)) if chr(int(match.group(1), 16)) in UNRESERVED
+        else "%" + match.group(1).upper(),
+        part
+    )
+    if all(char in safe for char in part):
+        return part
+    encoded = []
+    for char in part:
+        if char in safe:
+            encoded.append(char)
+        else:
+            encoded.extend(f"%{byte:02X}" for byte in char.encode("utf-8"))
+    return "".join(encoded)
+
+
+def remove_dot_segments(path):
+    """RFC 3986 section 5.2.4."""
+    if "." not in path:
+        return path
+    output = []
+    segments = path.split("/")
+    for i, segment in enumerate(segments):
+        if segment == ".":
+            if i == len(segments) - 1:
+                output.append("")
+        elif segment == "..":
+            if len(output) > 1:
+                output.pop()
+            if i == len(segments) - 1:
+                output.append("")
+        else:
+            output.append(segment)
+    return "/".join(output)
+
+
+class Canonicalizer:
+    """URL canonicalization following RFC 3986 section 6.
+
+    Scheme and host are lowercased, the default port, dot segments and the
+    fragment are removed, percent-encodings are normalized and query parameters
+    are sorted, with the `tracking_params` dropped. The path keeps its case and
+    trailing slash. Links that are not http(s) give None. Results are memoized
+    for the scope a link depends on: absolute URLs on their own, /paths per
+    origin and relative links per base URL, so the navigation links repeated on
+    every page of a site are only canonicalized once.
+    """
+
+    def __init__(self, tracking_params=TRACKING_PARAMS, drop_directory_index=True, memo_size=200_000):
+        self.tracking_params = frozenset(param.lower() for param in tracking_params)
+        self.drop_directory_index = drop_directory_index
+        self.memo_size = memo_size
+        self.memo = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        # Worker processes started with spawn get a pickled copy, locks stay behind
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def canonicalize(self, url, base_url=None):
+        """Canonical form of a link, resolved against `base_url`, or None when it is not an http(s) URL."""
+        link = STRIPPED.sub("", url.strip())
+        if not link or link.startswith("#"):
+            return None if base_url is None else self.canonicalize(base_url)
+        if base_url is not None:
+            link = urljoin(base_url, link)
+
+        try:
+            parts = urlsplit(link)
+            scheme = parts.scheme.lower()
+            if scheme not in DEFAULT_PORTS or not parts.hostname:
+                return None
+            host = parts.hostname.rstrip(".")
+            if not host.isascii():
+                host = host.encode("idna").decode("ascii")
+            port = parts.port
+        except (ValueError, UnicodeError):
+            return None
+
+        netloc = f"[{host}]" if ":" in host else host
+        if port is not None and str(port) != DEFAULT_PORTS[scheme]:
+            netloc = f"{netloc}:{port}"
+        if "@" in parts.netloc:
+            netloc = parts.netloc.rsplit("@", 1)[0] + "@" + netloc
+
+        path = remove_dot_segments(normalize_percent_encoding(parts.path, PATH_SAFE)) or "/"
+        if self.drop_directory_index and path.endswith(DIRECTORY_INDEXES):
+            directory, _, page = path.rpartition("/")
+            if page in DIRECTORY_INDEXES:
+                path = directory + "/"
+
+        return urlunsplit((scheme, netloc, path, self.canonical_query(parts.query), ""))
+
+    def canonical_query(self, query):
+        if not query:
+            return ""
+        params = []
+        for param in query.split("&"):
+            if not param:
+                continue
+            name, sep, value = param.partition("=")
+            if name.lower() in self.tracking_params:
+                continue
+            params.append((normalize_percent_encoding(name, QUERY_SAFE), sep,
+                           normalize_percent_encoding(value, QUERY_SAFE)))
+        # Sorted by name only, repeated parameters keep their order
+        params.sort(key=lambda param: param[0])
+        return "&".join(name + sep + value for name, sep, value in params)
+
+    def scope(self, base_url, link):
+        """The part of the base URL a link's canonical form depends on."""
+        if base_url is None or HAS_SCHEME.match(link):
+            return ""
+        if link.startswith("//"):
+            return urlsplit(base_url).scheme
+        if link.startswith("/"):
+            parts = urlsplit(base_url)
+            return f"{parts.scheme}://{parts.netloc}"
+        return base_url.split("#", 1)[0]
+
+    def canonicalize_many(self, base_url, links):
+        """Canonicalize a whole link set found on `base_url`, returns the set of canonical http(s) URLs."""
+        return {url for url in self.canonical_map(base_url, links).values() if url is not None}
+
+    def canonical_map(self, base_url, links):
+        """Map every link found on `base_url` to its canonical form, None for links that are dropped."""
+        canonical = {}
+        memo = self.memo
+        for link in links:
+            key = (self.scope(base_url, link), link)
+            with self.lock:
+                result = memo.get(key, memo)
+                if result is not memo:
+                    self.hits += 1
+                    memo.move_to_end(key)
+            if result is memo:
+                result = self.canonicalize(link, base_url)
+                with self.lock:
+                    self.misses += 1
+                    memo[key] = result
+                    if len(memo) > self.memo_size:
+                        memo.popitem(last=False)
+            canonical[link] = result
+        return canonical
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"size": len(self.memo), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
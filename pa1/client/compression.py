@@ -0,0 +1,23 @@
+import base64
+import gzip
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def compress_html(html_content, codecs=("gzip",), level=6):
+    """Compress HTML for upload, returns (codec, base64 blob, uncompressed size).
+
+    `codecs` are the ones the server can read back (GET /content/codecs). zstd is
+    used when it is one of them and the zstandard package is installed here too,
+    gzip otherwise. The server stores the blob as it is, so pages are compressed
+    once, on the crawler.
+    """
+    data = html_content.encode("utf-8")
+    if zstandard is not None and "zstd" in codecs:
+        codec, blob = "zstd", zstandard.ZstdCompressor(level=level).compress(data)
+    else:
+        codec, blob = "gzip", gzip.compress(data, compresslevel=level)
+    return codec, base64.b64encode(blob).decode("ascii"), len(data)
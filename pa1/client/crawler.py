@@ -1,40 +1,98 @@
-import datetime
+import argparse
 import multiprocessing
+import os
+import re
+import threading
 import time
 from urllib.parse import urlsplit, urlparse
-from urllib.robotparser import RobotFileParser
 import hashlib
-from bs4 import BeautifulSoup
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util import Retry
-from selenium import webdriver
-from selenium.webdriver.firefox.options import Options
-import xml.etree.ElementTree as ET
 import socket
-from urllib.parse import urljoin
 from functools import lru_cache
 import requests
 
-options = Options()
-options.add_argument("--headless=new")
+from browser_pool import BrowserPool
+from canonicalize import Canonicalizer, TRACKING_PARAMS
+from compression import compress_html
+from dns_cache import install as install_dns_cache
+from extractors import get_extractor
+from image_fetcher import ImageFetcher
+from link_scoring import LinkScorer, SEED_RELEVANCE
+from metrics import Metrics
+from near_duplicates import simhash
+from result_buffer import ResultBuffer
+from robots_cache import RobotsCache
+from sitemap import iter_sitemap
+from shared import NodeManager
+
+
+# Content-Type of the binary documents stored as page_data
+DOCUMENT_TYPES = {
+    "application/pdf": "PDF",
+    "application/msword": "DOC",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "DOCX",
+    "application/vnd.ms-powerpoint": "PPT",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation": "PPTX",
+}
+UPLOAD_CHUNK_SIZE = 64 * 1024
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([a-zA-Z0-9_.:-]+)""", re.IGNORECASE)
+
+
+def decode_html(body, content_type_header):
+    """Decode an HTML body with the charset of the Content-Type header or of a meta tag, UTF-8 otherwise."""
+    charset = None
+    for param in content_type_header.split(";")[1:]:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "charset":
+            charset = value.strip().strip("\"'")
+    if not charset:
+        match = META_CHARSET.search(body[:4096])
+        charset = match.group(1).decode("ascii") if match else "utf-8"
+    try:
+        return body.decode(charset, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+def cache_samples(name, stats):
+    labels = {"cache": name}
+    return [
+        ("crawler_cache_hits_total", "counter", labels, stats["hits"]),
+        ("crawler_cache_misses_total", "counter", labels, stats["misses"]),
+        ("crawler_cache_entries", "gauge", labels, stats["size"]),
+    ]
 
 
 class Crawler:
-    def __init__(self):
+    def __init__(self, seed_url="https://slo-tech.com/", api_base_url="http://localhost:5000", pool_maxsize=25,
+                 lease_size=5, max_pending=200, lease_seconds=300, results_spill_dir=None, seen_filter_path=None, seen_capacity=1_000_000,
+                 near_duplicates=False, extractor="stream", max_browsers=2, revisit=False, connect_timeout=5,
+                 read_timeout=30, fetch_deadline=60, max_html_bytes=10 * 1024 * 1024,
+                 max_document_bytes=50 * 1024 * 1024, group_by_ip=False, tracking_params=TRACKING_PARAMS,
+                 scorer=None, verbose=True, metrics_port=None, node_id=None, heartbeat_interval=15):
         self.user_agent = "fri-wier-skupina_n"
+        # Per-page progress lines, errors are always printed
+        self.verbose = verbose
         self.hostname = socket.gethostname()
         self.ip_address = socket.gethostbyname(self.hostname)
-        self.api_base_url = "http://localhost:5000"
+        self.api_base_url = api_base_url
 
         # Use multiprocessing Manager for process-safe shared objects
-        manager = multiprocessing.Manager()
+        manager = NodeManager()
+        manager.start()
         self.stop_event = manager.Event()
-        # Replace thread-specific locks with manager dictionaries
-        self.site_cache = dict()
-        self.page_hash_cache = dict()
-
-        seed_url = "https://slo-tech.com/"
+        # Every connection of every worker resolves through the node's DNS cache
+        self.dns = manager.DNSCache()
+        install_dns_cache(self.dns)
+        # With group_by_ip, hosts on one IP address share a crawl delay
+        self.group_by_ip = group_by_ip
+        self.scheduler = manager.PolitenessScheduler(default_delay=5, group_by_ip=group_by_ip)
+        # Site IDs and content hashes looked up by any worker on this node
+        self.site_cache = manager.LRUCache(max_size=10000)
+        self.page_hash_cache = manager.LRUCache(max_size=100000, ttl=6 * 3600)
 
         # Configure session with better connection pooling
         self.session = requests.Session()
@@ -42,7 +100,7 @@ class Crawler:
         # Configure connection pooling with more connections
         adapter = HTTPAdapter(
             pool_connections=10,  # Reduced per-process to avoid memory issues
-            pool_maxsize=25,  # More realistic per process
+            pool_maxsize=pool_maxsize,  # 25 is realistic per process, the async mode needs more
             max_retries=Retry(
                 total=3,
                 backoff_factor=0.5,
@@ -57,17 +115,109 @@ class Crawler:
             "Connection": "keep-alive"
         })
 
+        # RFC 3986 canonical URLs, memoized per process
+        self.canonicalizer = Canonicalizer(tracking_params=tracking_params)
+        seed_url = self.canonicalizer.canonicalize(seed_url)
+
+        # URLs already sent to the server, restored from the last run when a path is given
+        self.seen_filter_path = seen_filter_path
+        self.seen_urls = manager.BloomFilter(capacity=seen_capacity)
+        if seen_filter_path and os.path.exists(seen_filter_path):
+            self.seen_urls.load(seen_filter_path)
+
         # Initial request
-        self._post_api("/page/frontierlinks", json={
+        response = self._post_api("/page/frontierlinks", json={
             "from_page_id": None,
-            "links": [{"url": seed_url, "relevance": 3}]
+            "links": [{"url": seed_url, "relevance": SEED_RELEVANCE}]
         })
+        if response.ok:
+            self.seen_urls.add_many([seed_url])
+
+        # HTML is uploaded compressed with a codec the server can read back
+        self.html_codecs = self.server_codecs()
+
+        # Also catch pages that differ only in small parts, through the server's SimHash index
+        self.near_duplicates = near_duplicates
+
+        # Frontier priority of links, and how many fetched pages turned out relevant
+        self.scorer = scorer or LinkScorer()
+        # Host budgets count the pages fetched by every worker on the node
+        self.scorer.host_pages = manager.HostPages()
+        self.harvest = manager.HarvestRate()
+
+        # HTML parsing backend, "soup" keeps content hashes compatible with crawls made before "stream"
+        self.extractor = get_extractor(extractor)
+
+        # Sitemaps are enqueued in batches, only the first URLs are kept as the site's sitemap_content
+        self.sitemap_batch_size = 1000
+        self.max_sitemap_content = 1_000_000
+
+        # Browsers are started per process on first use, render stats per host are shared
+        self.max_browsers = max_browsers
+        self.browser_pool = None
+        self.browser_pool_pid = None
+        self.browser_pool_lock = threading.Lock()
+        self.render_stats = manager.dict()
 
-        self.robot_parsers = {}
-        self.crawl_delays = {}
-        self.max_pages = 25000
+        # robots.txt shared by the workers and backed by Site.robots_content
+        self.robots = RobotsCache(self, manager.dict(), on_rules=self.robots_loaded)
         self.current_iteration = 0
 
+        # Images are downloaded on background threads, each URL and content hash once per node
+        self.images = ImageFetcher(self, manager.BloomFilter(capacity=seen_capacity),
+                                   manager.LRUCache(max_size=100000))
+
+        # Fetches stream, HTML is cut off at max_html_bytes or after fetch_deadline seconds
+        self.fetch_timeout = (connect_timeout, read_timeout)
+        self.fetch_deadline = fetch_deadline
+        self.max_html_bytes = max_html_bytes
+        self.max_document_bytes = max_document_bytes
+
+        # Once the frontier is empty, revisit crawled pages that are due, with conditional requests
+        self.revisit = revisit
+        self.revisit_validators = manager.dict()
+
+        # With a node_id, the server leases only the hosts this node owns on its hash ring, so
+        # politeness, robots.txt and site caches of a host live on one node
+        self.node_id = node_id
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_stop = None
+        self.cluster = manager.dict()
+
+        # Leased frontier pages wait in the scheduler until their host is ready. A page has to be
+        # handed out early enough for its fetch to finish before the lease runs out.
+        self.lease_size = lease_size
+        self.max_pending = max_pending
+        self.lease_seconds = lease_seconds
+        self.max_queue_wait = max(lease_seconds - fetch_deadline, lease_seconds / 2)
+
+        # Stage timings and counters of this process, GET /metrics on metrics_port when it is set.
+        # Worker processes of run() serve their own on the ports after it.
+        self.metrics_port = metrics_port
+        self.metrics = Metrics()
+        self.metrics.add_collector(self.collect_node_metrics)
+        self.metrics.add_collector(self.collect_process_metrics)
+
+        # Page results are written in batches through POST /crawl/results, batches the server
+        # did not take after a few attempts wait in results_spill_dir when it is set
+        self.results = ResultBuffer(self.post_results, spill_dir=results_spill_dir, on_stored=self.results_stored,
+                                    on_failed=self.results_failed)
+
+    def __getstate__(self):
+        # run() pickles the crawler into every worker when processes start with spawn (Windows, macOS).
+        # Shared state travels as manager proxies, locks, threads and browsers stay in this process.
+        state = self.__dict__.copy()
+        del state["browser_pool_lock"]
+        state["browser_pool"] = None
+        state["browser_pool_pid"] = None
+        state["heartbeat_stop"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.browser_pool_lock = threading.Lock()
+        install_dns_cache(self.dns)
+
 
     # API helper methods for better caching and connection handling
     def _get_api(self, endpoint, params=None):
@@ -85,84 +235,98 @@ class Crawler:
         url = f"{self.api_base_url}{endpoint}"
         return self.session.put(url, json=json)
 
+    def server_codecs(self):
+        try:
+            response = self._get_api("/content/codecs")
+            response.raise_for_status()
+            return tuple(response.json()["codecs"])
+        except Exception as e:
+            print(f"[ERROR] Could not get the server's compression codecs, using gzip: {e}")
+            return ("gzip",)
+
+    def post_results(self, endpoint, json=None):
+        with self.metrics.time("api_write"):
+            return self._post_api(endpoint, json=json)
+
+    def results_stored(self, results):
+        """Links of stored pages are known to the server now, later pages send them as known links."""
+        urls = [link["url"] for result in results for link in result.get("links", ())]
+        if urls:
+            self.seen_urls.add_many(urls)
+
+    def results_failed(self, results):
+        """Forget the content hashes of pages that will not be stored, copies must not point at them."""
+        for result in results:
+            if result.get("content_hash"):
+                self.page_hash_cache.delete(result["content_hash"])
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
     @lru_cache(maxsize=1000)
     def get_domain(self, url):
         parsed_url = urlparse(url)
         domain = parsed_url.netloc
         return domain
 
-    @lru_cache(maxsize=1000)
-    def is_allowed(self, url):
-        domain = self.get_domain(url)
-        base_url = f"https://{domain}"
-        path = urlsplit(url).path
-
-        if domain not in self.robot_parsers:
-            robots_url = f"{base_url}/robots.txt"
-            rp = RobotFileParser()
-            try:
-                response = requests.get(robots_url, timeout=5)
-                response.raise_for_status()
-                rp.parse(response.text.splitlines())
-                self.robot_parsers[domain] = rp
-
-                # Save crawl-delay
-                delay = rp.crawl_delay(self.user_agent)
-                self.crawl_delays[domain] = delay if delay is not None else None
-            except Exception as e:
-                print(f"[ERROR] Can't fetch robots.txt for {domain}: {e}")
-                self.robot_parsers[domain] = None
-
-        rp = self.robot_parsers.get(domain)
-        if rp is None:
-            return True
-
-        allowed = rp.can_fetch(self.user_agent, path)
-        return allowed
+    def robots_loaded(self, domain, rules):
+        self.scheduler.set_delay(domain, rules.crawl_delay)
 
-    def parse_sitemap(self, sitemap_url):
+    def is_allowed(self, url):
+        return self.robots.can_fetch(url)
+
+    def enqueue_sitemap_links(self, entries, page_id):
+        urls = [url for url, _ in entries]
+        allowed = self.robots.can_fetch_many(urls)
+        links = {}
+        for url, lastmod in entries:
+            if allowed[url]:
+                for normalized_url in self.normalize_url(url, url):
+                    links[normalized_url] = lastmod
+
+        new_urls = set(self.seen_urls.unseen(list(links)))
         try:
-            response = self.session.get(sitemap_url, timeout=5)
+            response = self._post_api("/page/frontierlinks", json={
+                "from_page_id": page_id,
+                "links": [{"url": url, "relevance": SEED_RELEVANCE, "lastmod": lastmod}
+                          for url, lastmod in links.items() if url in new_urls],
+                "known_links": [url for url in links if url not in new_urls],
+            })
             response.raise_for_status()
-            root = ET.fromstring(response.content)
-            return [url.text.strip() for url in root.findall(".//{http://www.sitemaps.org/schemas/sitemap/0.9}loc")]
-        except Exception as e:
-            print(f"[ERROR] Failed to parse sitemap {sitemap_url}: {e}")
-            return []
-
-    def get_robots_txt(self, domain):
-        robots_url = f"https://{domain}/robots.txt"
-        try:
-            return self.session.get(robots_url, timeout=5).text
+            self.seen_urls.add_many(list(new_urls))
         except Exception as e:
-            print(f"[ERROR] Failed to fetch robots.txt for {domain}: {e}")
-            return None
+            print(f"[ERROR] Failed to enqueue links from sitemap: {e}")
 
-    def extract_and_enqueue_sitemap_links(self, rp, domain, page_id):
-        sitemaps = rp.site_maps()
+    def extract_and_enqueue_sitemap_links(self, sitemaps, domain, page_id):
+        """Stream every sitemap of a site into the frontier in batches, returns the sitemap content to store."""
         if not sitemaps:
             return ""
 
-        sitemap_content = ""
+        sitemap_content = []
+        content_length = 0
+        batch = []
+        seen = set()
         for sitemap_url in sitemaps:
-            urls = self.parse_sitemap(sitemap_url)
-            for url in urls:
-                sitemap_content += url + " "
-                if self.is_allowed(url):
-                    normalized_url = list(self.normalize_url(domain, url))[0]
-                    try:
-                        self._post_api("/page/frontierlinks", json={
-                            "from_page_id": page_id,
-                            "links": [{"url": normalized_url, "relevance": 3}],
-                        })
-                    except Exception as e:
-                        print(f"[ERROR] Failed to enqueue links from sitemap: {e}")
-        return sitemap_content
-
-    def get_or_create_site(self, domain, page_id):
-        # First check shared cache - no lock needed with manager.dict()
-        if domain in self.site_cache:
-            return self.site_cache[domain]
+            for url, lastmod in iter_sitemap(self.session, sitemap_url, seen=seen):
+                if content_length < self.max_sitemap_content:
+                    sitemap_content.append(url)
+                    content_length += len(url) + 1
+
+                batch.append((url, lastmod))
+                if len(batch) >= self.sitemap_batch_size:
+                    self.enqueue_sitemap_links(batch, page_id)
+                    batch = []
+
+        if batch:
+            self.enqueue_sitemap_links(batch, page_id)
+        return " ".join(sitemap_content)
+
+    def get_or_create_site(self, domain, page_id, scheme="https"):
+        # First check the node's shared cache
+        site_id = self.site_cache.get(domain)
+        if site_id is not None:
+            return site_id
 
         # Check if site already exists
         try:
@@ -170,35 +334,34 @@ class Crawler:
             response.raise_for_status()
             data = response.json()
             if data.get("exists"):
-                # Add to cache - thread-safe with manager.dict()
-                self.site_cache[domain] = data["site_id"]
+                self.site_cache.set(domain, data["site_id"])
                 return data["site_id"]
         except Exception as e:
             print(f"[ERROR] Site existence check failed for {domain}: {e}")
             return None
 
-        # Fetch robots.txt
-        robots_content = self.get_robots_txt(domain)
+        # robots.txt usually is in the cache already, from checking links to this site
+        rules = self.robots.rules(domain, scheme)
+        robots_etag, robots_last_modified = self.robots.validators(domain)
         sitemap_content = None
 
-        # If robots.txt is available, parse it and process sitemaps
-        if robots_content:
-            rp = RobotFileParser()
-            rp.parse(robots_content.splitlines())
-            sitemap_content = self.extract_and_enqueue_sitemap_links(rp, domain, page_id)
+        # If robots.txt is available, process sitemaps
+        if rules.content:
+            sitemap_content = self.extract_and_enqueue_sitemap_links(rules.sitemaps, domain, page_id)
 
         # Create the site in the DB
         try:
             response = self._post_api("/site", json={
                 "domain": domain,
-                "robots_content": robots_content,
-                "sitemap_content": sitemap_content
+                "robots_content": rules.content,
+                "sitemap_content": sitemap_content,
+                "robots_etag": robots_etag,
+                "robots_last_modified": robots_last_modified
             })
             response.raise_for_status()
             site_id = response.json()["id"]
 
-            # Add to shared cache - thread-safe
-            self.site_cache[domain] = site_id
+            self.site_cache.set(domain, site_id)
 
             return site_id
         except Exception as e:
@@ -207,7 +370,7 @@ class Crawler:
 
     @lru_cache(maxsize=100)
     def select_content_type(self, content_type):
-        if "text/html" in content_type:
+        if any(html_type in content_type for html_type in HTML_TYPES):
             return "HTML"
         elif "application/pdf" in content_type:
             return "BINARY"
@@ -223,38 +386,162 @@ class Crawler:
             return True
         return False
 
-    def fetch(self, url):
+    def get_browser_pool(self):
+        # Browsers can't be shared with forked processes, every worker process gets its own pool.
+        # The lock keeps threads of the async engine from starting a pool each.
+        with self.browser_pool_lock:
+            if self.browser_pool_pid != os.getpid():
+                self.browser_pool = BrowserPool(max_browsers=self.max_browsers)
+                self.browser_pool_pid = os.getpid()
+            return self.browser_pool
+
+    def close_browsers(self):
+        if self.browser_pool is not None and self.browser_pool_pid == os.getpid():
+            self.browser_pool.close()
+
+    def render_needed(self, domain):
+        """Stop rendering a host once a few renders found no more links than the plain HTML had."""
+        renders, useful = self.render_stats.get(domain, (0, 0))
+        return useful > 0 or renders < 3
+
+    def record_render(self, domain, page_source, rendered_source):
+        renders, useful = self.render_stats.get(domain, (0, 0))
+        if useful == 0:
+            plain_links = self.extractor.extract(page_source).links
+            rendered_links = self.extractor.extract(rendered_source).links
+            if len(rendered_links) > len(plain_links):
+                useful += 1
+        self.render_stats[domain] = (renders + 1, useful)
+
+    def document_type(self, url, content_type_header):
+        """page_data type code of a binary document, or None when it is not one we keep."""
+        data_type = DOCUMENT_TYPES.get(content_type_header.split(";")[0].strip().lower())
+        if data_type is None and self.determine_page_type(url) in DOCUMENT_TYPES.values():
+            data_type = self.determine_page_type(url)
+        return data_type
+
+    def limited_body(self, response):
+        """Chunks of a response body, raises ValueError past max_document_bytes or fetch_deadline.
+
+        Raising inside an upload aborts the request, so the server stores nothing.
+        """
+        size = 0
+        deadline = time.monotonic() + self.fetch_deadline
+        for chunk in response.iter_content(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > self.max_document_bytes:
+                raise ValueError(f"larger than {self.max_document_bytes} bytes")
+            if time.monotonic() > deadline:
+                raise ValueError(f"not downloaded within {self.fetch_deadline}s")
+            yield chunk
+
+    def upload_page_data(self, page_id, data_type, response):
+        """Stream a document from the response body into page_data, without holding it in memory."""
+        if int(response.headers.get("Content-Length") or 0) > self.max_document_bytes:
+            self.log(f"Skipping {data_type} of page {page_id}, larger than {self.max_document_bytes} bytes")
+            return
         try:
-            response = self.session.get(url, allow_redirects=True)
-            page_source = response.text
-            status_code = response.status_code
-            content_type = response.headers.get("Content-Type", "")
-            content_type = self.select_content_type(content_type)
+            upload = self.session.post(
+                f"{self.api_base_url}/pagedata/upload",
+                params={"page_id": page_id, "data_type_code": data_type},
+                # Content-Length may be missing or wrong, the body is counted while it streams
+                data=self.limited_body(response),
+                headers={"Content-Type": "application/octet-stream"}
+            )
+            upload.raise_for_status()
+        except Exception as e:
+            print(f"[ERROR] Uploading {data_type} of page {page_id} failed: {e}")
 
-            if url.endswith(".pdf") or "application/pdf" in content_type:
+    def read_html(self, url, response, content_type_header):
+        """Read and decode an HTML body, anything past max_html_bytes or fetch_deadline is cut off."""
+        body = bytearray()
+        deadline = time.monotonic() + self.fetch_deadline
+        try:
+            for chunk in response.iter_content(UPLOAD_CHUNK_SIZE):
+                body.extend(chunk)
+                if len(body) >= self.max_html_bytes:
+                    del body[self.max_html_bytes:]
+                    self.log(f"Truncated {url} at {self.max_html_bytes} bytes")
+                    break
+                if time.monotonic() > deadline:
+                    self.log(f"Truncated {url} after {self.fetch_deadline}s")
+                    break
+        finally:
+            response.close()
+        return decode_html(bytes(body), content_type_header)
+
+    def fetch(self, url, page_id=None):
+        """Fetch a page, returns (html, status_code, content_type, (etag, last_modified)).
+
+        Binary documents are streamed into page_data of `page_id` and have no html.
+        A revisit is a conditional request, a 304 comes back as NOT_MODIFIED.
+        """
+        start = time.perf_counter()
+        try:
+            return self.fetch_page(url, page_id)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.metrics.observe("crawler_stage_seconds", elapsed, stage="fetch")
+            self.metrics.observe("crawler_fetch_seconds", elapsed, host=self.metrics.host_label(self.get_domain(url)))
+
+    def fetch_page(self, url, page_id):
+        try:
+            headers = {}
+            etag, last_modified = self.revisit_validators.get(page_id) or (None, None)
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+            response = self.session.get(url, allow_redirects=True, stream=True, headers=headers,
+                                        timeout=self.fetch_timeout)
+            status_code = response.status_code
+            retries = getattr(response.raw, "retries", None)
+            if retries is not None and retries.history:
+                self.metrics.inc("crawler_retries_total", len(retries.history))
+            validators = (response.headers.get("ETag", etag), response.headers.get("Last-Modified", last_modified))
+            if status_code == 304:
+                response.close()
+                return None, status_code, "NOT_MODIFIED", validators
+            content_type_header = response.headers.get("Content-Type", "")
+            content_type = self.select_content_type(content_type_header)
+
+            if url.endswith(".pdf") or "application/pdf" in content_type_header:
                 content_type = "BINARY"
-            elif "image/" in content_type:
+            elif "image/" in content_type_header:
                 content_type = "BINARY"
 
-            print(url, "Content-Type: ", content_type)
+            self.log(f"{url} Content-Type: {content_type}")
+
+            if content_type != "HTML":
+                data_type = self.document_type(url, content_type_header)
+                if page_id is not None and data_type is not None and status_code == 200:
+                    self.upload_page_data(page_id, data_type, response)
+                response.close()
+                return None, status_code, content_type, validators
 
-            if self.js_required(page_source):
-                driver = webdriver.Firefox(options=options)
-                driver.get(url)
-                page_source = driver.page_source
+            page_source = self.read_html(url, response, content_type_header)
 
-                cookies = {cookie['name']: cookie['value'] for cookie in driver.get_cookies()}
-                response = self.session.get(url, cookies=cookies)
-                status_code = response.status_code
-                content_type = response.headers.get("Content-Type", "")
-                content_type = self.select_content_type(content_type)
-                driver.close()
+            domain = self.get_domain(url)
+            if content_type == "HTML" and self.js_required(page_source) and self.render_needed(domain):
+                try:
+                    with self.metrics.time("render"):
+                        rendered_source, status_code, content_type = self.get_browser_pool().render(url)
+                    content_type = self.select_content_type(content_type)
+                    self.record_render(domain, page_source, rendered_source)
+                    page_source = rendered_source
+                    self.metrics.inc("crawler_renders_total", result="ok")
+                except Exception as e:
+                    # Keep the plain HTML when the render fails or times out
+                    self.metrics.inc("crawler_renders_total", result="failed")
+                    print(f"Rendering {url} failed: {e}")
 
-            return page_source, status_code, content_type
+            return page_source, status_code, content_type, validators
 
         except Exception as e:
+            self.metrics.inc("crawler_fetch_errors_total")
             print(f"Request failed: {e}")
-            return None, 500, None
+            return None, 500, None, (None, None)
 
     def determine_page_type(self, url):
         url = url.lower()
@@ -277,267 +564,464 @@ class Crawler:
             return "HTML"
 
     def normalize_url(self, base_url, links):
+        """Canonical http(s) URLs of a link set found on `base_url`."""
         if isinstance(links, str):
             links = [links]
-
-        normalized_links = set()
-        for link in links:
-            if link == "javascript:void(0)":
-                continue
-
-            parsed_link = urlsplit(link)
-
-            if not parsed_link.scheme:
-                link = urljoin(base_url, link)
-
-            link = link.strip()
-            link = link.lower()
-
-            link = link.split('#')[0]
-            link = link.split('?')[0]
-
-            if link.endswith('/'):
-                link = link[:-1]
-
-            if link.endswith(("index.html", "index.htm", "default.asp", "default.aspx")):
-                link = link.rsplit("/", 1)[0]
-
-            normalized_links.add(link)
-        return normalized_links
-
-    def extract_links(self, url, soup):
-        links = set()
-        for a_tag in soup.find_all("a"):
-            href = a_tag.get("href")
-            if href:
-                links.add(href)
-
-        for tag in soup.find_all():
-            if tag.has_attr("onclick"):
-                links.add(tag["onclick"])
-
-        links = self.normalize_url(url, links)
-        return links
-
-    def extract_images(self, url, soup):
-        images = set()
-        for img_tag in soup.find_all("img"):
-            src = img_tag.get("src")
-            if src:
-                images.add(src)
-
-        images = self.normalize_url(url, images)
-        return images
-
-    def check_relevance(self, links, page_id):
-        relevant_links = []
+        return self.canonicalizer.canonicalize_many(base_url, links)
+
+    def extract_links(self, url, extraction):
+        """Canonical links of a page, and their anchor text keyed by the canonical URL."""
+        canonical = self.canonicalizer.canonical_map(url, extraction.links)
+        anchors = {}
+        for href, text in extraction.anchors.items():
+            link = canonical.get(href)
+            if link is not None:
+                anchors[link] = f"{anchors[link]} {text}" if link in anchors else text
+        return {link for link in canonical.values() if link is not None}, anchors
+
+    def extract_images(self, url, extraction):
+        return self.normalize_url(url, extraction.images)
+
+    def check_relevance(self, links, anchors=None, parent_score=0.0):
+        """Split links into (url, relevance) pairs for the frontier and page_data rows for non-HTML links."""
+        html_links = []
+        page_data = []
+        allowed = self.robots.can_fetch_many(links)
         for link in links:
-            if self.is_allowed(link):
+            if allowed[link]:
                 type = self.determine_page_type(link)
                 if type == "HTML":
-                    relevance = 0
-                    link_domain = self.get_domain(link)
-                    if link_domain == "slo-tech.com":
-                        relevance += 1
-                    if any(keyword in link for keyword in ("novice", "forum", "clanki")):
-                        relevance += 1
-
-                    relevant_links.append((link, relevance))
+                    html_links.append(link)
                 else:
-                    try:
-                        page_data = {
-                            "page_id": page_id,
-                            "data_type_code": type, 
-                            "data": None
-                        }
-                        self._post_api("/pagedata", json=page_data)
-                    except Exception as e:
-                        print(f"Error while handling non-HTML content: {e}")
-
-        return relevant_links
+                    page_data.append({
+                        "data_type_code": type,
+                        "data": None
+                    })
+
+        relevant_links = list(zip(html_links, self.scorer.score(html_links, anchors, parent_score)))
+        return relevant_links, page_data
 
     def hash_html(self, html_content):
         return hashlib.sha256(html_content.encode("utf-8")).hexdigest()
 
     def check_duplicate(self, page_hash):
-        # First check shared cache - no lock needed
-        if page_hash in self.page_hash_cache:
-            return self.page_hash_cache[page_hash]
+        # First check the node's shared cache
+        cached = self.page_hash_cache.get(page_hash)
+        if cached is not None:
+            return cached
 
         try:
             response = self._get_api("/page/exists", params={"content_hash": page_hash})
             response.raise_for_status()
             result = response.json()
 
-            # Cache the result in shared dictionary
-            self.page_hash_cache[page_hash] = result
+            # Only hits are cached, a new page caches its own hash once it is buffered
+            if result.get("exists"):
+                self.page_hash_cache.set(page_hash, result)
 
             return result
         except Exception as e:
             print(f"Error checking for duplicate: {e}")
             return {"exists": False}
 
-    def handle_duplicate_page(self, page_id, original_page_id, duplicate_url, status_code):
+    def check_near_duplicate(self, fingerprint):
         try:
-            duplicate_page_data = {
-                "site_id": original_page_id,
-                "page_type_code": "DUPLICATE",
-                "html_content": None,
-                "content_hash": None,
-                "http_status_code": status_code,
-                "accessed_ip": self.ip_address,
-                "relevance": 0
-            }
-
-            response = self._put_api("/page/" + str(page_id), json=duplicate_page_data)
+            response = self._get_api("/page/near-duplicate", params={"simhash": fingerprint})
             response.raise_for_status()
-
-            link_data = {
-                "from_page": original_page_id,
-                "to_page": page_id
-            }
-
-            link_response = self._post_api("/link", json=link_data)
-            link_response.raise_for_status()
-
-            print(f"Duplicate page {duplicate_url} linked to original page ID {original_page_id}")
+            return response.json()
         except Exception as e:
-            print(f"Error handling duplicate page {duplicate_url}: {e}")
-
-    def worker(self, stop_event):
-        while not stop_event.is_set():
-            start = time.time()
-
-            if self.current_iteration % 10 == 0:
-                html_response = self._get_api("/page/html-count").json()
-                html_count = html_response["html_page_count"]
-
-                if html_count > self.max_pages:
-                    print(f"[{multiprocessing.current_process().name}] {self.max_pages} pages have been retrieved.")
-                    stop_event.set()
-                    break
-
-            try:
-                frontier_response = self._get_api("/frontier").json()
-                page_id = frontier_response["id"]
-                url = frontier_response["url"]
-            except:
-                print("Frontier is empty.")
-                break
+            print(f"Error checking for near duplicate: {e}")
+            return {"exists": False}
 
-            print(f"Crawling URL: {url}")
-            domain = self.get_domain(url)
-            site_id = self.get_or_create_site(domain, page_id)
-            print(f'Site ID: {site_id}')
+    def handle_duplicate_page(self, page_id, original_page_id, duplicate_url, status_code, site_id):
+        self.results.add({
+            "page_id": page_id,
+            "site_id": site_id,
+            "page_type_code": "DUPLICATE",
+            "html_content": None,
+            "content_hash": None,
+            "http_status_code": status_code,
+            "accessed_ip": self.ip_address,
+            "duplicate_of": original_page_id
+        })
+        self.log(f"Duplicate page {duplicate_url} linked to original page ID {original_page_id}")
+
+    def html_budget_reached(self):
+        """The server enforces the page budget on leases, a lease tells us once it is used up."""
+        return self.stop_event.is_set()
+
+    def lease_frontier_urls(self):
+        """Lease a batch of frontier pages into the scheduler, returns False when the frontier is empty.
+
+        Returns None when there is nothing to lease right now but pages in flight
+        may change that: they hold the rest of the page budget and may turn out
+        not to be HTML, or, on a node of a partitioned crawl, other nodes are
+        still crawling and may add links to this node's hosts.
+        """
+        params = {"limit": self.lease_size, "lease_seconds": self.lease_seconds}
+        if self.node_id:
+            params["node_id"] = self.node_id
+        try:
+            response = self._get_api("/frontier/lease", params=params)
+            response.raise_for_status()
+            lease = response.json()
+            pages = [(page["id"], page["url"]) for page in lease["pages"]]
+        except Exception as e:
+            print(f"[ERROR] Frontier lease failed: {e}")
+            return False
+
+        if lease.get("budget_reached") and not self.revisit:
+            self.stop_event.set()
+        if self.node_id:
+            self.check_ring_version(lease["ring_version"])
+        if not pages and self.revisit:
+            pages = self.lease_revisit_urls()
+
+        # Pages behind a long queue of their host would outlive the lease, they go back right away
+        rejected = self.scheduler.add(pages, self.max_queue_wait)
+        if rejected:
+            self.release_pages([page_id for page_id, _ in rejected])
+        if not pages and (lease.get("budget_pending") or lease.get("pages_elsewhere")):
+            return None
+        return len(pages) > 0
+
+    def check_ring_version(self, version):
+        """Give back the queued pages of hosts that moved to another node when nodes joined or left."""
+        previous = self.cluster.get("ring_version")
+        self.cluster["ring_version"] = version
+        if previous is None or previous == version:
+            return
+        hosts = self.scheduler.queued_hosts()
+        if not hosts:
+            return
+        try:
+            response = self._post_api("/nodes/owners", json={"hosts": sorted(hosts)})
+            response.raise_for_status()
+            owners = response.json()["owners"]
+            moved = {host for host, owner in owners.items() if owner != self.node_id}
+        except Exception as e:
+            print(f"[ERROR] Host owners of node {self.node_id} failed: {e}")
+            moved = None
+        self.log(f"Node {self.node_id}: hash ring changed, releasing queued pages of "
+                 f"{len(moved) if moved is not None else 'all'} hosts")
+        self.release_pages([page_id for page_id, _ in self.scheduler.drain(moved)])
+
+    def join_cluster(self):
+        """Register this node with the server and keep it registered until leave_cluster."""
+        if not self.node_id:
+            return
+        self.heartbeat_stop = threading.Event()
+        self.send_heartbeat()
+        threading.Thread(target=self.heartbeat_loop, args=(self.heartbeat_stop,), daemon=True).start()
+
+    def send_heartbeat(self):
+        try:
+            response = self._post_api("/nodes/heartbeat", json={"node_id": self.node_id})
+            response.raise_for_status()
+            nodes = response.json()["nodes"]
+            self.log(f"Node {self.node_id}: {len(nodes)} nodes in the crawl")
+        except Exception as e:
+            print(f"[ERROR] Heartbeat of node {self.node_id} failed: {e}")
 
-            crawl_delay = self.crawl_delays.get(domain)
-            delay = self._post_api("/site/delay", json={"site_url": domain, "ip": self.ip_address, "robots_delay": crawl_delay}).json()
-            print(f"Delay: {delay['delay']}")
-            time.sleep(delay["delay"])
+    def heartbeat_loop(self, stop):
+        while not stop.wait(self.heartbeat_interval):
+            self.send_heartbeat()
 
-            print(f"Fetching: {url}")
-            html, status_code, content_type = self.fetch(url)
+    def leave_cluster(self):
+        if not self.node_id:
+            return
+        if self.heartbeat_stop is not None:
+            self.heartbeat_stop.set()
+        try:
+            self._post_api("/nodes/leave", json={"node_id": self.node_id})
+        except Exception as e:
+            print(f"[ERROR] Node {self.node_id} could not leave the crawl: {e}")
 
-            print("TYPE ", content_type)
-            if content_type != "HTML":
-                try:
-                    self._put_api("/page/" + str(page_id), json={
-                        "page_type_code": "BINARY",  
-                        "html_content": None,
-                        "http_status_code": status_code,
-                        "accessed_ip": self.ip_address,
-                        "site_id": site_id,
-                        "content_hash": None
-                    })
-                    print(f"Processed and marked {content_type} as BINARY for {url}")
+    def lease_revisit_urls(self):
+        """Lease crawled pages that are due for a revisit, their validators are kept for the fetch."""
+        try:
+            response = self._get_api("/revisit/lease", params={"limit": self.lease_size,
+                                                               "lease_seconds": self.lease_seconds})
+            response.raise_for_status()
+            leased = response.json()["pages"]
+        except Exception as e:
+            print(f"[ERROR] Revisit lease failed: {e}")
+            return []
 
-                except Exception as e:
-                    print(f"Error while handling non-HTML content: {e}")
-                    continue
-                self.current_iteration += 1
+        self.revisit_validators.update({page["id"]: (page["etag"], page["last_modified"]) for page in leased})
+        return [(page["id"], page["url"]) for page in leased]
+
+    def poll_frontier_url(self):
+        """Return (page, wait) for the next page whose host may be fetched now.
+
+        `page` is a (page_id, url) pair or None. Without a page, `wait` is the time
+        until a queued host is ready, or None when the frontier is empty.
+        """
+        with self.metrics.time("dequeue"):
+            page, wait = self.scheduler.pop_ready()
+            if page is not None:
+                return page, 0
+
+            # Lease more pages while every queued host is waiting, a new host may be ready right away
+            if self.scheduler.pending_count() < self.max_pending:
+                leased = self.lease_frontier_urls()
+                if leased:
+                    return self.scheduler.pop_ready()
+                if leased is None and wait is None:
+                    # Pages in flight may still free budget or add links to this node's hosts
+                    return None, self.results.max_age
+            return None, wait
+
+    def next_frontier_url(self):
+        """Take the next URL off the frontier, returns (page_id, url) or None when it is empty or the budget is used up."""
+        empty_polls = 0
+        while not self.html_budget_reached():
+            page, wait = self.poll_frontier_url()
+            if page is not None:
+                return page
+
+            if wait is not None:
+                with self.metrics.time("delay_wait"):
+                    time.sleep(min(wait, 1))
                 continue
 
-            soup = BeautifulSoup(html, "html.parser")
-
-            for script in soup.find_all("script"):
-                script.decompose()
-
-            for style in soup.find_all("style"):
-                style.decompose()
-
-            for meta in soup.find_all("meta"):
-                meta.decompose()
+            # Links of the last pages may still wait in a write-behind buffer, ours or another worker's
+            if self.results.pending():
+                self.results.flush()
+                continue
+            empty_polls += 1
+            if empty_polls > 3:
+                return None
+            time.sleep(self.results.max_age)
+        return None
+
+    def release_frontier_urls(self):
+        """Give unprocessed leased pages back to the frontier instead of waiting for the lease to expire."""
+        self.release_pages([page_id for page_id, _ in self.scheduler.drain()])
+
+    def release_pages(self, page_ids):
+        if not page_ids:
+            return
+        try:
+            self._post_api("/frontier/release", json={"page_ids": page_ids})
+        except Exception as e:
+            print(f"[ERROR] Frontier release failed: {e}")
+
+    def unchanged_revisit(self, page_id, status_code, validators):
+        etag, last_modified = validators
+        self.results.add({
+            "page_id": page_id,
+            "unchanged": True,
+            "http_status_code": status_code,
+            "accessed_ip": self.ip_address,
+            "etag": etag,
+            "last_modified": last_modified
+        })
 
-            normalized_html = soup.prettify()
+    def process_page(self, page_id, url, site_id, html, status_code, content_type, validators=(None, None)):
+        """Store a fetched page and push its links to the frontier."""
+        self.log(f"TYPE {content_type}")
+        revisit = self.revisit_validators.pop(page_id, None) is not None
+        # A revisit that failed keeps the page as it was, instead of turning it into a BINARY page
+        if content_type == "NOT_MODIFIED" or (revisit and content_type != "HTML"):
+            self.metrics.inc("crawler_pages_total", result="unchanged")
+            self.unchanged_revisit(page_id, status_code, validators)
+            return
+
+        if content_type != "HTML":
+            self.results.add({
+                "page_id": page_id,
+                "page_type_code": "BINARY",
+                "html_content": None,
+                "http_status_code": status_code,
+                "accessed_ip": self.ip_address,
+                "site_id": site_id,
+                "content_hash": None
+            })
+            self.metrics.inc("crawler_pages_total", result="binary")
+            self.log(f"Processed and marked {content_type} as BINARY for {url}")
+            return
+
+        with self.metrics.time("parse"):
+            extraction = self.extractor.extract(html)
+        normalized_html = extraction.content
+        with self.metrics.time("hash"):
             page_hash = self.hash_html(normalized_html)
 
+        with self.metrics.time("duplicate_check"):
             duplicate = self.check_duplicate(page_hash)
+        if duplicate.get("page_id") == page_id:
+            if revisit:
+                self.metrics.inc("crawler_pages_total", result="unchanged")
+                self.unchanged_revisit(page_id, status_code, validators)
+                return
+            # Stored already by a fetch whose lease ran out before its result arrived
+            duplicate = {"exists": False}
+
+        fingerprint = None
+        if self.near_duplicates and not duplicate.get("exists", False):
+            with self.metrics.time("near_duplicate_check"):
+                fingerprint = simhash(extraction.text)
+                duplicate = self.check_near_duplicate(fingerprint)
+            # The index still holds the revisited page's previous version
+            if duplicate.get("page_id") == page_id:
+                duplicate = {"exists": False}
+
+        self.log(f'Page duplicate: {duplicate}')
+
+        if duplicate.get("exists", False):
+            self.metrics.inc("crawler_pages_total", result="duplicate")
+            self.handle_duplicate_page(page_id, duplicate["page_id"], url, status_code, site_id)
+            return
+
+        # The page is only written on the next flush, remember its hash so later copies are caught.
+        # results_failed forgets it again when the result is not stored.
+        self.page_hash_cache.set(page_hash, {"exists": True, "page_id": page_id})
+
+        links, anchors = self.extract_links(url, extraction)
+        images = self.extract_images(url, extraction)
+
+        self.log(f'Found {len(links)} links and {len(images)} images.')
+
+        page_score = self.scorer.page_score(extraction.text)
+        self.harvest.record(page_score)
+        self.scorer.record_page(url)
+        with self.metrics.time("link_scoring"):
+            relevant_links, page_data = self.check_relevance(links, anchors, page_score)
+        # Only probably-new URLs go to the frontier, the rest are stored as links to known pages.
+        # They enter the filter once the server has stored this result, see results_stored.
+        new_urls = set(self.seen_urls.unseen([link for link, _ in relevant_links]))
+        html_codec, html_compressed, html_size = compress_html(normalized_html, self.html_codecs)
+        self.results.add({
+            "page_id": page_id,
+            "page_type_code": content_type,
+            "html_content": None,
+            "html_codec": html_codec,
+            "html_compressed": html_compressed,
+            "html_size": html_size,
+            "http_status_code": status_code,
+            "accessed_ip": self.ip_address,
+            "site_id": site_id,
+            "content_hash": page_hash,
+            "simhash": fingerprint,
+            "etag": validators[0],
+            "last_modified": validators[1],
+            "links": [{"url": link, "relevance": relevance} for link, relevance in relevant_links if link in new_urls],
+            "known_links": [link for link, _ in relevant_links if link not in new_urls],
+            # Documents linked from a revisited page were recorded on the first visit
+            "page_data": [] if revisit else page_data
+        })
+        self.metrics.inc("crawler_pages_total", result="html")
+        # Downloaded in the background, the page loop does not wait for images
+        self.images.submit(page_id, images)
+
+    def print_cache_stats(self):
+        caches = (("site", self.site_cache), ("page hash", self.page_hash_cache), ("DNS", self.dns),
+                  ("URL", self.canonicalizer))
+        for name, cache in caches:
+            stats = cache.stats()
+            print(f"{name} cache: {stats['size']} entries, {stats['hits']} hits, {stats['misses']} misses, "
+                  f"{stats['hit_rate']:.0%} hit rate")
+        dns_stats = self.dns.stats()
+        print(f"DNS lookups: {dns_stats['mean_latency'] * 1000:.1f}ms on average, slowest: "
+              + ", ".join(f"{host} {latency * 1000:.0f}ms" for host, latency in dns_stats["slowest"]))
+
+    def collect_node_metrics(self):
+        """Counters of the caches shared by the node's workers, read on every scrape."""
+        samples = []
+        for name, cache in (("site", self.site_cache), ("page_hash", self.page_hash_cache), ("dns", self.dns)):
+            samples.extend(cache_samples(name, cache.stats()))
+        samples.append(("crawler_expired_leases_total", "counter", {}, self.scheduler.expired_count()))
+        harvest = self.harvest.stats()
+        samples.append(("crawler_harvest_pages_total", "counter", {"relevance": "relevant"}, harvest["relevant"]))
+        samples.append(("crawler_harvest_pages_total", "counter", {"relevance": "other"},
+                        harvest["fetched"] - harvest["relevant"]))
+        return samples
+
+    def collect_process_metrics(self):
+        return cache_samples("url", self.canonicalizer.stats())
+
+    def start_worker_metrics(self, index):
+        """A worker process records into its own metrics, served on the port after the node's."""
+        self.metrics = Metrics(worker=multiprocessing.current_process().name)
+        self.metrics.add_collector(self.collect_process_metrics)
+        if self.metrics_port is not None:
+            self.metrics.serve(self.metrics_port + 1 + index)
+
+    def print_harvest_rate(self):
+        stats = self.harvest.stats()
+        print(f"Harvest rate: {stats['relevant']} relevant of {stats['fetched']} fetched pages "
+              f"({stats['harvest_rate']:.0%})")
+
+    def save_seen_urls(self):
+        if self.seen_filter_path:
+            self.seen_urls.save(self.seen_filter_path)
+
+    def worker(self, stop_event, index=0):
+        self.start_worker_metrics(index)
+        while not stop_event.is_set():
+            start = time.perf_counter()
 
-            print(f'Page duplicate: {duplicate}')
-
-            if duplicate.get("exists", False):
-                self.handle_duplicate_page(page_id, duplicate["page_id"], url, status_code)
-            else:
-                try:
-                    self._put_api("/page/" + str(page_id), json={
-                        "page_type_code": content_type,
-                        "html_content": normalized_html,
-                        "http_status_code": status_code,
-                        "accessed_ip": self.ip_address,
-                        "site_id": site_id,
-                        "content_hash": page_hash
-                    })
-                except Exception as e:
-                    print(f"Error while updating page: {e}")
-                    continue
-
-                links = self.extract_links(url, soup)
-                images = self.extract_images(url, soup)
-
-                print(f'Found {len(links)} links and {len(images)} images.')
+            next_url = self.next_frontier_url()
+            if next_url is None:
+                if self.html_budget_reached():
+                    print(f"[{multiprocessing.current_process().name}] The page budget has been used up.")
+                else:
+                    self.log("Frontier is empty.")
+                break
+            page_id, url = next_url
 
-                relevant_links = self.check_relevance(links, page_id)
-                try:
-                    self._post_api("/page/frontierlinks", json={
-                        "from_page_id": page_id,
-                        "links": [{"url": url, "relevance": relevance} for url, relevance in relevant_links]
-                    })
-                    print(f"Updated frontier links for {url}")
-                except Exception as e:
-                    print(f"Error while updating frontier: {e}")
-                    continue
+            self.log(f"Crawling URL: {url}")
+            domain = self.get_domain(url)
+            with self.metrics.time("site_lookup"):
+                site_id = self.get_or_create_site(domain, page_id, urlsplit(url).scheme)
+            self.log(f'Site ID: {site_id}')
 
-            for img_url in images:
-                try:
-                    image_data = {
-                        "page_id": page_id,
-                        "filename": img_url.split("/")[-1],  
-                        "content_type": "image", 
-                        "data": "", 
-                        "accessed_time": datetime.datetime.utcnow().isoformat()
-                    }
-
-                    self._post_api("/image", json=image_data)
-                    print(f"Inserted image: {img_url}")
-                except Exception as e:
-                    print(f"Error inserting image: {img_url} - {e}")
+            self.log(f"Fetching: {url}")
+            html, status_code, content_type, validators = self.fetch(url, page_id)
+            self.process_page(page_id, url, site_id, html, status_code, content_type, validators)
 
             self.current_iteration += 1
-            end = time.time()
-            print(f"Time elapsed: {end - start:.2f}s")
+            elapsed = time.perf_counter() - start
+            self.metrics.observe("crawler_stage_seconds", elapsed, stage="page")
+            self.log(f"Time elapsed: {elapsed:.2f}s")
+
+        self.results.flush()
+        self.images.close()
+        self.close_browsers()
 
     def run(self, num_workers=2):
-        args = (self.stop_event,)
-        processes = [multiprocessing.Process(target=self.worker, args=args) for _ in range(num_workers)]
+        self.join_cluster()
+        processes = [multiprocessing.Process(target=self.worker, args=(self.stop_event, i)) for i in range(num_workers)]
 
         for i, p in enumerate(processes):
             time.sleep(i*5)
             p.start()
+        # The node's shared counters, started after the fork so workers do not inherit the socket
+        if self.metrics_port is not None:
+            self.metrics.serve(self.metrics_port)
         for p in processes:
             p.join()
+        self.metrics.close()
 
+        self.release_frontier_urls()
+        self.leave_cluster()
+        self.save_seen_urls()
+        self.print_cache_stats()
+        self.print_harvest_rate()
         print("Crawling complete.")
 
 if __name__ == '__main__':
-    crawler = Crawler()
-    crawler.run(num_workers=3)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", default="https://slo-tech.com/")
+    parser.add_argument("--api", default="http://localhost:5000")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--node-id", help="crawl only the hosts this node owns, for several crawler nodes")
+    parser.add_argument("--metrics-port", type=int)
+    parser.add_argument("--quiet", action="store_true", help="no per-page output")
+    parser.add_argument("--spill-dir", help="keep crawl results the server did not take here, to send them later")
+    args = parser.parse_args()
+
+    crawler = Crawler(seed_url=args.seed, api_base_url=args.api, node_id=args.node_id,
+                      metrics_port=args.metrics_port, verbose=not args.quiet, results_spill_dir=args.spill_dir)
+    crawler.run(num_workers=args.workers)
@@ -0,0 +1,121 @@
+import ipaddress
+import socket
+import threading
+import time
+
+import urllib3.util.connection
+
+
+class DNSCache:
+    """Host name to IP address cache shared by all workers on a node.
+
+    getaddrinfo does not report record TTLs, so answers are kept for `ttl`
+    seconds and failures for `negative_ttl`. Concurrent lookups of the same host
+    wait for the first one instead of all resolving it. The latency of every
+    real lookup is kept per host.
+    """
+
+    def __init__(self, ttl=300, negative_ttl=30):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = {}
+        self.pending = {}
+        self.latency = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def resolve(self, host):
+        """IP addresses of a host, raises socket.gaierror when it does not resolve."""
+        if is_ip(host):
+            return [host]
+
+        while True:
+            with self.lock:
+                entry = self.entries.get(host)
+                if entry is not None and entry[0] > time.monotonic():
+                    self.hits += 1
+                    if entry[1] is None:
+                        raise socket.gaierror(f"{host} did not resolve")
+                    return entry[1]
+                lookup = self.pending.get(host)
+                if lookup is None:
+                    lookup = self.pending[host] = threading.Event()
+                    self.misses += 1
+                    break
+            lookup.wait()
+
+        ips = None
+        start = time.monotonic()
+        try:
+            infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+            ips = list(dict.fromkeys(info[4][0] for info in infos))
+        except OSError:
+            pass
+        finally:
+            now = time.monotonic()
+            with self.lock:
+                self.latency[host] = now - start
+                self.entries[host] = (now + (self.ttl if ips else self.negative_ttl), ips)
+                del self.pending[host]
+            lookup.set()
+
+        if not ips:
+            raise socket.gaierror(f"{host} did not resolve")
+        return ips
+
+    def primary_ip(self, host):
+        """First address of a host, or the host itself when it does not resolve."""
+        try:
+            return self.resolve(host)[0]
+        except OSError:
+            return host
+
+    def stats(self, slowest=10):
+        with self.lock:
+            latencies = sorted(self.latency.items(), key=lambda item: item[1], reverse=True)
+            total = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "mean_latency": sum(self.latency.values()) / len(self.latency) if self.latency else 0.0,
+                "slowest": latencies[:slowest],
+            }
+
+    def latencies(self):
+        """Seconds the last lookup of every host took."""
+        with self.lock:
+            return dict(self.latency)
+
+
+def is_ip(host):
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+        return True
+    except ValueError:
+        return False
+
+
+def install(resolver):
+    """Make every urllib3 (and so requests) connection in this process resolve through `resolver`.
+
+    Only the address that is connected to changes, TLS still verifies the host name.
+    """
+    original = getattr(urllib3.util.connection.create_connection, "original", urllib3.util.connection.create_connection)
+
+    def create_connection(address, *args, **kwargs):
+        host, port = address
+        if is_ip(host):
+            return original(address, *args, **kwargs)
+        error = None
+        for ip in resolver.resolve(host):
+            try:
+                return original((ip, port), *args, **kwargs)
+            except OSError as e:
+                error = e
+        raise error
+
+    create_connection.original = original
+    urllib3.util.connection.create_connection = create_connection
@@ -0,0 +1,207 @@
+import html
+from html.parser import HTMLParser
+
+from canonicalize import onclick_url
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+try:
+    import lxml.html
+    import lxml.etree
+except ImportError:
+    lxml = None
+
+DROPPED_TAGS = ("script", "style", "meta")
+MAX_ANCHOR_TEXT = 200
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source",
+             "track", "wbr"}
+
+
+class Extraction:
+    """What the crawler needs from one HTML page.
+
+    `content` is the page without script, style and meta tags, it is stored and
+    hashed. `links` holds raw href values and the URLs onclick handlers navigate
+    to, `images` raw img src values, both still to be normalized against the
+    page URL. `anchors` maps an href to the text of its links.
+    """
+
+    def __init__(self, content, links, images, text, anchors=None):
+        self.content = content
+        self.links = links
+        self.images = images
+        self.text = text
+        self.anchors = anchors or {}
+
+
+def add_anchor(anchors, href, text):
+    text = " ".join(text.split())[:MAX_ANCHOR_TEXT]
+    if text:
+        anchors[href] = f"{anchors[href]} {text}" if href in anchors else text
+
+
+class SoupExtractor:
+    """The original BeautifulSoup html.parser + prettify path, its content hashes match older crawls."""
+
+    name = "soup"
+
+    def extract(self, page_html):
+        soup = BeautifulSoup(page_html, "html.parser")
+
+        for tag in soup.find_all(DROPPED_TAGS):
+            tag.decompose()
+
+        links = set()
+        anchors = {}
+        for a_tag in soup.find_all("a"):
+            href = a_tag.get("href")
+            if href:
+                links.add(href)
+                add_anchor(anchors, href, a_tag.get_text(" "))
+
+        for tag in soup.find_all():
+            url = onclick_url(tag["onclick"]) if tag.has_attr("onclick") else None
+            if url:
+                links.add(url)
+
+        images = set()
+        for img_tag in soup.find_all("img"):
+            src = img_tag.get("src")
+            if src:
+                images.add(src)
+
+        return Extraction(soup.prettify(), links, images, soup.get_text(" "), anchors)
+
+
+class StreamParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.text = []
+        self.links = set()
+        self.images = set()
+        self.anchors = {}
+        self.anchor = None
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        self.collect(tag, attrs)
+        if tag in DROPPED_TAGS:
+            if tag not in VOID_TAGS:
+                self.skip_depth += 1
+            return
+        if not self.skip_depth:
+            self.parts.append(self.render_tag(tag, attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self.collect(tag, attrs)
+        if tag == "a":
+            self.anchor = None
+        if tag not in DROPPED_TAGS and not self.skip_depth:
+            self.parts.append(self.render_tag(tag, attrs))
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self.anchor is not None:
+            add_anchor(self.anchors, self.anchor[0], "".join(self.anchor[1]))
+            self.anchor = None
+        if tag in DROPPED_TAGS:
+            if tag not in VOID_TAGS and self.skip_depth:
+                self.skip_depth -= 1
+            return
+        if not self.skip_depth and tag not in VOID_TAGS:
+            self.parts.append(f"</{tag}>")
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(html.escape(data, quote=False))
+            self.text.append(data)
+            if self.anchor is not None:
+                self.anchor[1].append(data)
+
+    def handle_decl(self, decl):
+        self.parts.append(f"<!{decl}>")
+
+    def collect(self, tag, attrs):
+        for name, value in attrs:
+            if not value:
+                continue
+            if name == "onclick":
+                url = onclick_url(value)
+                if url:
+                    self.links.add(url)
+            elif name == "href" and tag == "a":
+                self.links.add(value)
+                self.anchor = (value, [])
+            elif name == "src" and tag == "img":
+                self.images.add(value)
+
+    def render_tag(self, tag, attrs):
+        rendered = "".join(
+            f" {name}" if value is None else f' {name}="{html.escape(value)}"'
+            for name, value in attrs
+        )
+        return f"<{tag}{rendered}>"
+
+
+class StreamExtractor:
+    """Links, images, text and content from a single pass of the standard library HTML parser."""
+
+    name = "stream"
+
+    def extract(self, page_html):
+        parser = StreamParser()
+        parser.feed(page_html)
+        parser.close()
+        return Extraction("".join(parser.parts), parser.links, parser.images, " ".join(parser.text), parser.anchors)
+
+
+class LxmlExtractor:
+    """Same output as StreamExtractor from lxml's C parser, needs the lxml package."""
+
+    name = "lxml"
+
+    def extract(self, page_html):
+        root = lxml.html.document_fromstring(page_html)
+        lxml.etree.strip_elements(root, *DROPPED_TAGS, with_tail=False)
+
+        links = set()
+        images = set()
+        anchors = {}
+        for element in root.iter(lxml.etree.Element):
+            tag = element.tag
+            onclick = element.get("onclick")
+            url = onclick_url(onclick) if onclick else None
+            if url:
+                links.add(url)
+            if tag == "a":
+                href = element.get("href")
+                if href:
+                    links.add(href)
+                    add_anchor(anchors, href, element.text_content())
+            elif tag == "img":
+                src = element.get("src")
+                if src:
+                    images.add(src)
+
+        content = lxml.html.tostring(root, encoding="unicode")
+        return Extraction(content, links, images, root.text_content(), anchors)
+
+
+EXTRACTORS = {
+    SoupExtractor.name: SoupExtractor,
+    StreamExtractor.name: StreamExtractor,
+    LxmlExtractor.name: LxmlExtractor,
+}
+
+
+def get_extractor(name):
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown extractor {name}, use one of {', '.join(EXTRACTORS)}")
+    if name == "soup" and BeautifulSoup is None:
+        raise ImportError("The soup extractor needs the beautifulsoup4 package")
+    if name == "lxml" and lxml is None:
+        raise ImportError("The lxml extractor needs the lxml package")
+    return EXTRACTORS[name]()
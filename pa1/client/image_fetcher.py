@@ -0,0 +1,212 @@
+import datetime
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit
+
+IMAGE_TYPES = ("image/jpeg", "image/png", "image/gif", "image/webp", "image/svg+xml", "image/avif", "image/bmp",
+               "image/x-icon", "image/vnd.microsoft.icon")
+
+
+class ImageFetcher:
+    """Downloads page images on background threads, off the page loop.
+
+    Image URLs wait in a queue per host, at most `max_queued` of them, and
+    `max_workers` threads per process download them. Hosts are reserved in the
+    node's shared politeness scheduler, so images and pages of a host keep to
+    one crawl delay across every worker. A URL is fetched once per node (a
+    shared bloom filter, a URL enters it once its response was handled, so
+    images turned away by a full queue or that failed are tried again when a
+    later page links them), and an image whose content hash was already uploaded
+    is stored as a reference to the earlier copy instead of its bytes. Images
+    stream through a temporary file, responses that are not images or larger
+    than `max_bytes` are dropped while streaming.
+    """
+
+    def __init__(self, crawler, seen_images, hash_cache, max_workers=4, max_queued=1000, max_bytes=5 * 1024 * 1024,
+                 chunk_size=64 * 1024, max_candidates=200):
+        self.crawler = crawler
+        self.seen_images = seen_images
+        self.hash_cache = hash_cache
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.max_candidates = max_candidates
+        # Host -> (page_id, url) deque, hosts are offered to the scheduler round-robin
+        self.queues = OrderedDict()
+        self.queued = 0
+        # URLs queued or being fetched by this process
+        self.pending_urls = set()
+        self.wakeup = threading.Condition()
+        self.closing = False
+        self.threads = []
+        self.pid = None
+        self.stats = {"queued": 0, "stored": 0, "deduplicated": 0, "skipped": 0, "failed": 0}
+
+    def __getstate__(self):
+        # Worker processes started with spawn get a pickled copy and start their own threads
+        state = self.__dict__.copy()
+        del state["wakeup"]
+        state["threads"] = []
+        state["pid"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.wakeup = threading.Condition()
+
+    def submit(self, page_id, urls):
+        """Queue the images of a page, URLs seen before and disallowed ones are left out."""
+        self._ensure_threads()
+        new_urls = self.seen_images.unseen(list(dict.fromkeys(urls))) if urls else []
+        allowed = self.crawler.robots.can_fetch_many(new_urls)
+
+        with self.wakeup:
+            images = [(page_id, url) for url in new_urls if allowed.get(url) and url not in self.pending_urls]
+            room = self.max_queued - self.queued
+            if len(images) > room:
+                self.stats["skipped"] += len(images) - max(room, 0)
+                images = images[:max(room, 0)]
+            if not images:
+                return
+
+            for image in images:
+                host = urlsplit(image[1]).netloc
+                self.queues.setdefault(host, deque()).append(image)
+                self.pending_urls.add(image[1])
+            self.queued += len(images)
+            self.stats["queued"] += len(images)
+            self.wakeup.notify_all()
+
+    def count(self, name, n=1):
+        with self.wakeup:
+            self.stats[name] += n
+
+    def _ensure_threads(self):
+        # Threads do not survive fork, so every worker process starts its own
+        if self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        self.closing = False
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(self.max_workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def take(self, url):
+        """Remove the image of `url` from its host's queue, must hold the wakeup lock."""
+        host = urlsplit(url).netloc
+        queue = self.queues[host]
+        image = queue.popleft()
+        if queue:
+            # The host goes to the back, so the others are offered first next time
+            self.queues.move_to_end(host)
+        else:
+            del self.queues[host]
+        self.queued -= 1
+        return image
+
+    def _run(self):
+        while True:
+            with self.wakeup:
+                if not self.queues:
+                    if self.closing:
+                        return
+                    self.wakeup.wait(1)
+                    continue
+                candidates = [queue[0][1] for _, queue in zip(range(self.max_candidates), self.queues.values())]
+                url, wait = self.crawler.scheduler.reserve(candidates)
+                if url is None:
+                    self.wakeup.wait(min(wait, 1) if wait is not None else 1)
+                    continue
+                image = self.take(url)
+            try:
+                self.fetch(*image)
+                # Stored, deduplicated or not an image: no other worker on the node fetches it again
+                self.seen_images.add_many([image[1]])
+            except Exception as e:
+                self.count("failed")
+                print(f"[ERROR] Image {image[1]} failed: {e}")
+            finally:
+                with self.wakeup:
+                    self.pending_urls.discard(image[1])
+
+    def download(self, url):
+        """Stream an image into a temporary file, returns (content_type, file, sha256) or None when it is skipped.
+
+        The caller closes the file, which removes it.
+        """
+        with self.crawler.session.get(url, stream=True, timeout=self.crawler.fetch_timeout) as response:
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if response.status_code != 200 or content_type not in IMAGE_TYPES:
+                return None
+            if int(response.headers.get("Content-Length") or 0) > self.max_bytes:
+                return None
+
+            digest = hashlib.sha256()
+            size = 0
+            file = tempfile.TemporaryFile()
+            try:
+                for chunk in response.iter_content(self.chunk_size):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        file.close()
+                        return None
+                    digest.update(chunk)
+                    file.write(chunk)
+            except BaseException:
+                file.close()
+                raise
+            file.seek(0)
+            return content_type, file, digest.hexdigest()
+
+    def fetch(self, page_id, url):
+        downloaded = self.download(url)
+        if downloaded is None:
+            self.count("skipped")
+            return
+
+        content_type, file, content_hash = downloaded
+        with file:
+            self.upload(page_id, url, content_type, file, content_hash)
+
+    def upload(self, page_id, url, content_type, file, content_hash):
+        accessed_time = datetime.datetime.utcnow().isoformat()
+        # A copy uploaded before, by any worker on this node, is only referenced
+        duplicate = self.hash_cache.get(content_hash) is not None
+        params = {
+            "page_id": page_id,
+            "filename": urlsplit(url).path.rsplit("/", 1)[-1][:255],
+            "content_type": content_type,
+            "content_hash": content_hash,
+            "accessed_time": accessed_time,
+        }
+        response = self.crawler.session.post(f"{self.crawler.api_base_url}/image/upload", params=params,
+                                             data=b"" if duplicate else file,
+                                             headers={"Content-Type": "application/octet-stream"}, timeout=30)
+        response.raise_for_status()
+        self.hash_cache.set(content_hash, True)
+        self.count("deduplicated" if duplicate or response.json().get("deduplicated") else "stored")
+
+    def close(self, timeout=60):
+        """Finish the queued images, whatever is still queued after `timeout` seconds is dropped."""
+        if self.pid != os.getpid():
+            return
+        deadline = time.monotonic() + timeout
+        with self.wakeup:
+            self.closing = True
+            self.wakeup.notify_all()
+        for thread in self.threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        with self.wakeup:
+            dropped = self.queued
+            self.queues.clear()
+            self.queued = 0
+            self.pending_urls.clear()
+        if dropped:
+            print(f"[ERROR] Dropped {dropped} queued images")
+        self.pid = None
+        print(f"Images: {self.stats}")
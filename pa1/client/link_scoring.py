@@ -0,0 +1,135 @@
+import threading
+from collections import Counter
+from urllib.parse import urlsplit
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Weight of every feature, the relevance of a link is their weighted sum times RELEVANCE_SCALE
+DEFAULT_WEIGHTS = {
+    "focus_host": 1.0,       # the link stays on one of the focus hosts
+    "url_keywords": 1.0,     # best keyword weight found in the URL
+    "anchor_keywords": 0.5,  # best keyword weight found in the anchor text
+    "depth": -0.1,           # path segments
+    "host_budget": -0.5,     # share of the host's page budget already fetched, less than focus_host
+    "parent": 0.5,           # keyword score of the page the link was found on
+}
+DEFAULT_KEYWORDS = {"novice": 1.0, "forum": 1.0, "clanki": 1.0}
+RELEVANCE_SCALE = 10
+# Seeds and sitemap entries go ahead of everything the scorer produces by default
+SEED_RELEVANCE = 3 * RELEVANCE_SCALE
+
+
+class LinkScorer:
+    """Scores the whole link set of a page at once for the focused crawl.
+
+    Every link gets a row of features and the relevance is the weighted sum,
+    computed as one matrix product when NumPy is installed. The weights and
+    keyword weights are configurable, the defaults reproduce the original rules
+    (focus host +1, a topic keyword in the URL +1) and refine them with anchor
+    text, URL depth, how many pages of the host were fetched already and the
+    score of the parent page. Fetched pages are counted in `host_pages`, the
+    Crawler replaces it with the node's shared HostPages.
+    """
+
+    def __init__(self, weights=None, keywords=None, focus_hosts=("slo-tech.com",), host_budget=5000,
+                 host_pages=None):
+        unknown = set(weights or {}) - set(DEFAULT_WEIGHTS)
+        if unknown:
+            raise ValueError(f"Unknown link features {', '.join(sorted(unknown))}, use {', '.join(DEFAULT_WEIGHTS)}")
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.features = tuple(self.weights)
+        self.keywords = dict(DEFAULT_KEYWORDS if keywords is None else keywords)
+        self.focus_hosts = tuple(focus_hosts)
+        self.host_budget = host_budget
+        self.host_pages = host_pages if host_pages is not None else HostPages()
+        self.weight_vector = np.array([self.weights[name] for name in self.features]) if np is not None else None
+
+    def keyword_weight(self, text):
+        return max((weight for keyword, weight in self.keywords.items() if keyword in text), default=0.0)
+
+    def page_score(self, text):
+        """Share of the keyword weight a page's text covers, between 0 and 1."""
+        total = sum(self.keywords.values())
+        if not total:
+            return 0.0
+        text = text.lower()
+        return sum(weight for keyword, weight in self.keywords.items() if keyword in text) / total
+
+    def is_focus_host(self, host):
+        return any(host == focus or host.endswith("." + focus) for focus in self.focus_hosts)
+
+    def record_page(self, url):
+        """Count a fetched page against its host's budget."""
+        self.host_pages.record(urlsplit(url).hostname or "")
+
+    def feature_columns(self, links, anchors, parent_score):
+        hosts = [urlsplit(link).hostname or "" for link in links]
+        fetched = self.host_pages.counts(set(hosts))
+        used = [min(1.0, fetched.get(host, 0) / self.host_budget) for host in hosts]
+        return {
+            "focus_host": [1.0 if self.is_focus_host(host) else 0.0 for host in hosts],
+            "url_keywords": [self.keyword_weight(link.lower()) for link in links],
+            "anchor_keywords": [self.keyword_weight(anchors.get(link, "").lower()) for link in links],
+            "depth": [float(sum(1 for segment in urlsplit(link).path.split("/") if segment)) for link in links],
+            "host_budget": used,
+            "parent": [parent_score] * len(links),
+        }
+
+    def score(self, links, anchors=None, parent_score=0.0):
+        """Integer relevance of every link, in the order of `links`."""
+        links = list(links)
+        if not links:
+            return []
+        columns = self.feature_columns(links, anchors or {}, parent_score)
+        if np is not None:
+            matrix = np.array([columns[name] for name in self.features])
+            scores = self.weight_vector @ matrix
+            return np.rint(scores * RELEVANCE_SCALE).astype(int).tolist()
+
+        rows = zip(*(columns[name] for name in self.features))
+        weights = [self.weights[name] for name in self.features]
+        return [round(sum(w * x for w, x in zip(weights, row)) * RELEVANCE_SCALE) for row in rows]
+
+
+class HostPages:
+    """Pages fetched per host, shared by all workers on a node."""
+
+    def __init__(self):
+        self.pages = Counter()
+        self.lock = threading.Lock()
+
+    def record(self, host):
+        with self.lock:
+            self.pages[host] += 1
+
+    def counts(self, hosts):
+        """Fetched pages of every host in `hosts` that has any."""
+        with self.lock:
+            return {host: self.pages[host] for host in hosts if host in self.pages}
+
+
+class HarvestRate:
+    """Relevant pages per fetched HTML page, shared by all workers on a node."""
+
+    def __init__(self, threshold=0.3):
+        self.threshold = threshold
+        self.fetched = 0
+        self.relevant = 0
+        self.lock = threading.Lock()
+
+    def record(self, page_score):
+        with self.lock:
+            self.fetched += 1
+            if page_score >= self.threshold:
+                self.relevant += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "fetched": self.fetched,
+                "relevant": self.relevant,
+                "harvest_rate": self.relevant / self.fetched if self.fetched else 0.0,
+            }
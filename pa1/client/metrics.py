@@ -0,0 +1,113 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The text format is shared with the API's api_metrics.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+
+from prometheus_text import CONTENT_TYPE, Registry
+
+# Seconds, from parsing a small page to a slow fetch
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+DESCRIPTIONS = {
+    "crawler_stage_seconds": "Time spent in each stage of the crawl loop",
+    "crawler_fetch_seconds": "Time to fetch a page, per host",
+    "crawler_pages_total": "Pages processed, by result",
+    "crawler_retries_total": "HTTP retries made while fetching pages",
+    "crawler_renders_total": "JavaScript renders, by result",
+    "crawler_fetch_errors_total": "Fetches that failed without a response",
+    "crawler_cache_hits_total": "Cache hits, by cache",
+    "crawler_cache_misses_total": "Cache misses, by cache",
+    "crawler_cache_entries": "Entries held, by cache",
+    "crawler_expired_leases_total": "Queued pages dropped because their lease ran out",
+    "crawler_harvest_pages_total": "HTML pages scored for the harvest rate, by relevance",
+}
+
+
+class Metrics(Registry):
+    """Counters and histograms of one crawler process, in the Prometheus text format.
+
+    Recording is a dict lookup and an increment under a lock, so the crawl loop
+    can time every stage. Every series carries the `worker` label. Per-host
+    series stop adding hosts after `max_hosts`, later hosts count as "other".
+    Collectors are called on every scrape for values kept elsewhere, like the
+    node's shared caches, and return (name, type, labels, value) tuples.
+    """
+
+    def __init__(self, worker="main", buckets=BUCKETS, max_hosts=500):
+        super().__init__(buckets, DESCRIPTIONS, const_labels={"worker": worker})
+        self.worker = worker
+        self.max_hosts = max_hosts
+        self.hosts = set()
+        self.collectors = []
+        self.server = None
+
+    def __getstate__(self):
+        # Worker processes started with spawn serve their own endpoint, if any
+        state = super().__getstate__()
+        state["server"] = None
+        return state
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("crawler_stage_seconds", time.perf_counter() - start, stage=stage)
+
+    def host_label(self, host):
+        with self.lock:
+            if host in self.hosts:
+                return host
+            if len(self.hosts) < self.max_hosts:
+                self.hosts.add(host)
+                return host
+        return "other"
+
+    def add_collector(self, collect):
+        self.collectors.append(collect)
+
+    def render(self):
+        samples = []
+        for collect in self.collectors:
+            try:
+                samples.extend(collect())
+            except Exception as e:
+                print(f"[ERROR] Collecting metrics failed: {e}")
+        return super().render(samples)
+
+    def serve(self, port, host="0.0.0.0"):
+        """Expose GET /metrics on a background thread of this process."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                payload = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
@@ -0,0 +1,31 @@
+import hashlib
+import re
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def shingles(text, size=4):
+    """Overlapping word n-grams of the lowercased text."""
+    words = WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def simhash(text, size=4):
+    """64-bit SimHash of the text's shingles.
+
+    Pages that differ only in a timestamp, an ad slot or a session token share
+    almost all shingles, so their fingerprints differ in a few bits only.
+    """
+    values = [
+        format(int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big"), "064b")
+        for shingle in shingles(text, size)
+    ]
+    if not values:
+        return 0
+
+    # Column-wise bit counts of all shingle hashes, a bit is set when most hashes have it set
+    half = len(values) / 2
+    bits = "".join("1" if column.count("1") > half else "0" for column in zip(*values))
+    return int(bits, 2)
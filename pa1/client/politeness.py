@@ -0,0 +1,182 @@
+import collections
+import heapq
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class PolitenessScheduler:
+    """Per-host politeness for all workers on a node.
+
+    Leased frontier pages wait in a queue per host. A heap of next-allowed times
+    holds every host that has pages waiting, so `pop_ready` hands out a page of
+    whichever host may be fetched now instead of sleeping on the first one.
+    Handing out a page reserves the host until its crawl delay has passed, and
+    `reserve` does the same for fetches that are not queued here, like images.
+
+    Leased pages have to be fetched before their lease runs out, or the server
+    hands them to another worker. `add` turns away pages its host's queue could
+    not reach in time, and a page still queued when its time is up is dropped.
+
+    With `resolve` (host name -> IP address) hosts are grouped by IP address
+    instead, so subdomains served by one machine share a single delay, the
+    longest crawl-delay of any of them.
+    """
+
+    def __init__(self, default_delay=5, resolve=None):
+        self.default_delay = default_delay
+        self.resolve = resolve
+        self.delays = {}
+        self.next_allowed = {}
+        self.queues = collections.defaultdict(collections.deque)
+        self.heap = []
+        self.pending = 0
+        self.expired = 0
+        self.lock = threading.Lock()
+
+    def host_key(self, url):
+        if self.resolve is None:
+            return urlparse(url).netloc
+        return self.resolve(urlparse(url).hostname or "")
+
+    def set_delay(self, host, delay):
+        """Use the robots.txt crawl-delay for a host, None falls back to the default delay."""
+        if self.resolve is not None:
+            key = self.resolve(host.split(":")[0])
+            if delay is not None:
+                with self.lock:
+                    self.delays[key] = max(self.delays.get(key, 0), delay)
+            return
+
+        with self.lock:
+            if delay is None:
+                self.delays.pop(host, None)
+            else:
+                self.delays[host] = delay
+
+    def add(self, pages, max_wait=None):
+        """Queue leased (page_id, url) pairs, returns the pages that were not queued.
+
+        With `max_wait`, a page is only queued when its host can be fetched within
+        that many seconds, counting the delay of every page queued before it.
+        """
+        # Resolving can block, so keys are looked up before taking the lock
+        keyed = [(self.host_key(url), page_id, url) for page_id, url in pages]
+        rejected = []
+        with self.lock:
+            now = time.monotonic()
+            expires = now + max_wait if max_wait is not None else None
+            for host, page_id, url in keyed:
+                queue = self.queues.get(host)
+                if expires is not None:
+                    ready = max(now, self.next_allowed.get(host, 0))
+                    if ready + len(queue or ()) * self.delays.get(host, self.default_delay) > expires:
+                        rejected.append((page_id, url))
+                        continue
+                if not queue:
+                    queue = self.queues[host]
+                    heapq.heappush(self.heap, (self.next_allowed.get(host, 0), host))
+                queue.append((page_id, url, expires))
+                self.pending += 1
+        return rejected
+
+    def pop_ready(self):
+        """Return (page, wait).
+
+        `page` is a (page_id, url) pair of a host that may be fetched now, or None.
+        Without a page, `wait` is the number of seconds until the next host is
+        ready, or None when nothing is queued at all.
+        """
+        with self.lock:
+            now = time.monotonic()
+            while self.heap:
+                ready_time, host = self.heap[0]
+                if ready_time > now:
+                    return None, ready_time - now
+
+                # reserve() took the host for another fetch since it was pushed
+                allowed = self.next_allowed.get(host, 0)
+                if allowed > ready_time:
+                    heapq.heapreplace(self.heap, (allowed, host))
+                    continue
+
+                heapq.heappop(self.heap)
+                queue = self.queues.get(host)
+                # drain() emptied the host since it was pushed
+                if not queue:
+                    self.queues.pop(host, None)
+                    continue
+                page_id, url, expires = queue.popleft()
+                self.pending -= 1
+                # The lease ran out while the page waited, the server leases it again
+                if expires is not None and expires < now:
+                    self.expired += 1
+                    if queue:
+                        heapq.heappush(self.heap, (ready_time, host))
+                    else:
+                        del self.queues[host]
+                    continue
+
+                next_allowed = now + self.delays.get(host, self.default_delay)
+                self.next_allowed[host] = next_allowed
+                if queue:
+                    heapq.heappush(self.heap, (next_allowed, host))
+                else:
+                    del self.queues[host]
+                return (page_id, url), 0
+            return None, None
+
+    def reserve(self, urls):
+        """Reserve the host of the first of `urls` that may be fetched now, for a fetch outside the queues.
+
+        Returns (url, wait): the URL whose host is now reserved for its crawl
+        delay, or None and the seconds until the first of their hosts is ready.
+        """
+        keyed = [(self.host_key(url), url) for url in urls]
+        with self.lock:
+            now = time.monotonic()
+            wait = None
+            for host, url in keyed:
+                ready_time = self.next_allowed.get(host, 0)
+                if ready_time <= now:
+                    self.next_allowed[host] = now + self.delays.get(host, self.default_delay)
+                    return url, 0
+                wait = ready_time - now if wait is None else min(wait, ready_time - now)
+            return None, wait
+
+    def pending_count(self):
+        return self.pending
+
+    def expired_count(self):
+        return self.expired
+
+    def queued_hosts(self):
+        """Host names (URL netlocs) of every queued page."""
+        with self.lock:
+            return {urlparse(url).netloc for queue in self.queues.values() for _, url, _ in queue}
+
+    def drain(self, hosts=None):
+        """Remove and return every queued page, or only those whose URL netloc is in `hosts`."""
+        with self.lock:
+            if hosts is None:
+                pages = [(page_id, url) for queue in self.queues.values() for page_id, url, _ in queue]
+                self.queues.clear()
+                self.heap = []
+                self.pending = 0
+                return pages
+
+            pages = []
+            for key, queue in list(self.queues.items()):
+                kept = collections.deque()
+                for entry in queue:
+                    if urlparse(entry[1]).netloc in hosts:
+                        pages.append(entry[:2])
+                    else:
+                        kept.append(entry)
+                if kept:
+                    self.queues[key] = kept
+                else:
+                    # Its heap entry is skipped by pop_ready
+                    del self.queues[key]
+            self.pending -= len(pages)
+            return pages
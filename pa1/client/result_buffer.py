@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+import time
+
+
+class ResultBuffer:
+    """Write-behind buffer for crawl results.
+
+    Results are sent to POST /crawl/results, which stores a whole batch in one
+    transaction. The buffer is flushed when it holds `max_size` results or when
+    the oldest result is `max_age` seconds old. A batch that fails to send is
+    kept for the next flush, up to `max_attempts` tries. After that it is
+    written to `spill_dir`, when one is given, and sent again once the server
+    accepts writes, by whichever worker flushes first. Without `spill_dir` the
+    batch is dropped and its pages are crawled again when their leases run out.
+
+    `on_stored` is called with the results the server has stored, for state
+    that must only change once a result is durable, and `on_failed` with the
+    results that will not be stored, the ones the server rejected and dropped
+    batches.
+    """
+
+    def __init__(self, post, max_size=20, max_age=2.0, max_attempts=3, spill_dir=None, on_stored=None,
+                 on_failed=None):
+        self.post = post
+        self.on_stored = on_stored
+        self.on_failed = on_failed
+        self.max_size = max_size
+        self.max_age = max_age
+        self.max_attempts = max_attempts
+        self.spill_dir = spill_dir
+        self.results = []
+        self.attempts = 0
+        self.oldest = None
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.timer_pid = None
+
+    def __getstate__(self):
+        # Worker processes started with spawn get a pickled copy, they start their own timer
+        state = self.__dict__.copy()
+        del state["lock"], state["flush_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+
+    def add(self, result):
+        self._ensure_timer()
+        with self.lock:
+            if not self.results:
+                self.oldest = time.monotonic()
+            self.results.append(result)
+            full = len(self.results) >= self.max_size
+        if full:
+            self.flush()
+
+    def pending(self):
+        return len(self.results)
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                batch = self.results
+                self.results = []
+                self.oldest = None
+            if not batch:
+                return
+
+            try:
+                self.send(batch)
+                self.attempts = 0
+            except Exception as e:
+                self.attempts += 1
+                if self.attempts >= self.max_attempts:
+                    self.attempts = 0
+                    self.give_up(batch, e)
+                    return
+                print(f"[ERROR] Flushing {len(batch)} crawl results failed, will retry: {e}")
+                with self.lock:
+                    self.results = batch + self.results
+                    self.oldest = time.monotonic()
+                return
+            self.replay_spilled()
+
+    def send(self, batch):
+        response = self.post("/crawl/results", json={"results": batch})
+        response.raise_for_status()
+        outcome = response.json()
+        for failure in outcome["failed"]:
+            print(f"[ERROR] Storing crawl result for page {failure['page_id']} failed: {failure['error']}")
+        stored = set(outcome["stored"])
+        self.notify(self.on_stored, [result for result in batch if result["page_id"] in stored])
+        self.notify(self.on_failed, [result for result in batch if result["page_id"] not in stored])
+        return response
+
+    @staticmethod
+    def notify(callback, results):
+        if callback is None or not results:
+            return
+        try:
+            callback(results)
+        except Exception as e:
+            print(f"[ERROR] Handling crawl results failed: {e}")
+
+    def give_up(self, batch, error):
+        if self.spill_dir is None:
+            print(f"[ERROR] Dropping {len(batch)} crawl results after {self.max_attempts} attempts, "
+                  f"their pages are crawled again once the leases run out: {error}")
+            self.notify(self.on_failed, batch)
+            return
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = os.path.join(self.spill_dir, f"{time.time_ns()}-{os.getpid()}.json")
+            with open(path + ".tmp", "w") as f:
+                json.dump(batch, f)
+            os.replace(path + ".tmp", path)
+            print(f"[ERROR] Spilled {len(batch)} crawl results to {path} after {self.max_attempts} attempts: {error}")
+        except OSError as e:
+            print(f"[ERROR] Dropping {len(batch)} crawl results, spilling them failed: {e}")
+            self.notify(self.on_failed, batch)
+
+    def replay_spilled(self):
+        """Send the batches spilled by any worker, each file is claimed by renaming it first."""
+        if self.spill_dir is None or not os.path.isdir(self.spill_dir):
+            return
+        for name in sorted(os.listdir(self.spill_dir)):
+            path = os.path.join(self.spill_dir, name)
+            if name.endswith(".sending"):
+                # Claimed by a worker that died before it was done
+                pid = int(name.rsplit(".", 2)[1])
+                if not process_alive(pid):
+                    os.replace(path, path.rsplit(".", 2)[0])
+                continue
+            if not name.endswith(".json"):
+                continue
+
+            claimed = f"{path}.{os.getpid()}.sending"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            try:
+                with open(claimed) as f:
+                    batch = json.load(f)
+                self.send(batch)
+            except Exception as e:
+                os.replace(claimed, path)
+                print(f"[ERROR] Sending spilled crawl results {path} failed, will retry: {e}")
+                return
+            os.remove(claimed)
+            print(f"Sent {len(batch)} spilled crawl results from {path}")
+
+    def _ensure_timer(self):
+        # Threads do not survive fork, so every worker process starts its own timer
+        if self.timer_pid == os.getpid():
+            return
+        self.timer_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.max_age / 2)
+            oldest = self.oldest
+            if oldest is not None and time.monotonic() - oldest >= self.max_age:
+                self.flush()
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
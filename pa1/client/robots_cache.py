@@ -0,0 +1,214 @@
+import re
+import time
+from urllib.parse import quote, unquote, urlsplit
+
+
+class RobotsRules:
+    """robots.txt rules for one user agent, compiled for fast bulk checks.
+
+    Rules match like RFC 9309: the longest matching pattern wins and Allow wins
+    a tie, `*` matches anything and `$` anchors the end of the path.
+    """
+
+    def __init__(self, content, user_agent):
+        self.content = content
+        self.crawl_delay = None
+        self.sitemaps = []
+        self.rules = []
+        self._parse(content or "", user_agent.split("/")[0].lower())
+
+    def _parse(self, content, agent):
+        groups = []
+        group = None
+        in_agents = False
+        for line in content.splitlines():
+            line = line.split("#", 1)[0].strip()
+            if ":" not in line:
+                continue
+            field, value = line.split(":", 1)
+            field = field.strip().lower()
+            value = value.strip()
+
+            if field == "user-agent":
+                if not in_agents:
+                    group = {"agents": [], "rules": [], "delay": None}
+                    groups.append(group)
+                    in_agents = True
+                group["agents"].append(value.lower())
+                continue
+
+            in_agents = False
+            if field == "sitemap":
+                self.sitemaps.append(value)
+            elif group is None:
+                continue
+            elif field in ("allow", "disallow") and value:
+                group["rules"].append((field == "allow", value))
+            elif field == "crawl-delay":
+                try:
+                    group["delay"] = float(value)
+                except ValueError:
+                    pass
+
+        matching = [g for g in groups if any(a != "*" and a in agent for a in g["agents"])]
+        if not matching:
+            matching = [g for g in groups if "*" in g["agents"]]
+
+        patterns = []
+        for g in matching:
+            patterns.extend(g["rules"])
+            if g["delay"] is not None and self.crawl_delay is None:
+                self.crawl_delay = g["delay"]
+
+        # Longest pattern first, Allow before Disallow of the same length, the first match decides
+        patterns.sort(key=lambda rule: (-len(rule[1]), not rule[0]))
+        self.rules = [(allow, self._compile(pattern)) for allow, pattern in patterns]
+
+    @staticmethod
+    def _compile(pattern):
+        anchored = pattern.endswith("$")
+        if anchored:
+            pattern = pattern[:-1]
+        regex = ".*".join(re.escape(normalize_path(part)) for part in pattern.split("*"))
+        return re.compile(regex + ("$" if anchored else ""))
+
+    def allowed_path(self, path):
+        if not self.rules or path == "/robots.txt":
+            return True
+        for allow, regex in self.rules:
+            if regex.match(path):
+                return allow
+        return True
+
+    def can_fetch(self, url):
+        return self.allowed_path(url_path(url))
+
+
+def normalize_path(path):
+    return quote(unquote(path), safe="/?=&;:@$,*+!~'()")
+
+
+def url_path(url):
+    parts = urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    return normalize_path(path)
+
+
+class RobotsCache:
+    """robots.txt cache shared by all workers on a node.
+
+    Raw robots.txt entries live in a manager dict shared by the workers, every
+    process keeps its own compiled rules. An entry older than `ttl` is taken from
+    Site.robots_content when the server's copy is fresh, otherwise it is
+    downloaded again with If-None-Match/If-Modified-Since and written back.
+    """
+
+    def __init__(self, crawler, shared_entries, ttl=24 * 3600, on_rules=None):
+        self.crawler = crawler
+        self.entries = shared_entries
+        self.ttl = ttl
+        self.on_rules = on_rules
+        self.compiled = {}
+
+    def rules(self, domain, scheme="https"):
+        compiled = self.compiled.get(domain)
+        if compiled is not None and time.time() - compiled[0] < self.ttl:
+            return compiled[1]
+
+        entry = self.entries.get(domain)
+        if entry is None or time.time() - entry["fetched_at"] >= self.ttl:
+            entry = self.refresh(domain, scheme, entry)
+            self.entries[domain] = entry
+
+        rules = RobotsRules(entry["content"], self.crawler.user_agent)
+        self.compiled[domain] = (entry["fetched_at"], rules)
+        if self.on_rules is not None:
+            self.on_rules(domain, rules)
+        return rules
+
+    def validators(self, domain):
+        """(ETag, Last-Modified) of the cached robots.txt, to store along with it."""
+        entry = self.entries.get(domain) or {}
+        return entry.get("etag"), entry.get("last_modified")
+
+    def can_fetch(self, url):
+        parts = urlsplit(url)
+        return self.rules(parts.netloc, parts.scheme or "https").can_fetch(url)
+
+    def can_fetch_many(self, urls):
+        """Check a whole link set, robots.txt of every host is looked up once."""
+        allowed = {}
+        by_host = {}
+        for url in urls:
+            parts = urlsplit(url)
+            by_host.setdefault((parts.netloc, parts.scheme or "https"), []).append(url)
+        for (domain, scheme), host_urls in by_host.items():
+            rules = self.rules(domain, scheme)
+            for url in host_urls:
+                allowed[url] = rules.can_fetch(url)
+        return allowed
+
+    def refresh(self, domain, scheme, entry):
+        site = self.load_from_server(domain)
+        if site and site.get("robots_age") is not None and site["robots_age"] < self.ttl:
+            return {
+                "content": site["robots_content"],
+                "fetched_at": time.time() - site["robots_age"],
+                "etag": site.get("robots_etag"),
+                "last_modified": site.get("robots_last_modified"),
+            }
+
+        if entry is None and site and site.get("robots_content") is not None:
+            entry = {
+                "content": site["robots_content"],
+                "etag": site.get("robots_etag"),
+                "last_modified": site.get("robots_last_modified"),
+            }
+        entry = self.download(domain, scheme, entry)
+
+        if site and site.get("exists"):
+            try:
+                self.crawler._put_api(f"/site/{site['site_id']}/robots", json={
+                    "robots_content": entry["content"],
+                    "robots_etag": entry["etag"],
+                    "robots_last_modified": entry["last_modified"],
+                })
+            except Exception as e:
+                print(f"[ERROR] Storing robots.txt for {domain} failed: {e}")
+        return entry
+
+    def load_from_server(self, domain):
+        try:
+            response = self.crawler._get_api("/site/robots", params={"domain": domain})
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            print(f"[ERROR] Loading robots.txt for {domain} from the server failed: {e}")
+            return None
+
+    def download(self, domain, scheme, previous):
+        headers = {}
+        if previous:
+            if previous.get("etag"):
+                headers["If-None-Match"] = previous["etag"]
+            if previous.get("last_modified"):
+                headers["If-Modified-Since"] = previous["last_modified"]
+
+        content, etag, last_modified = None, None, None
+        try:
+            response = self.crawler.session.get(f"{scheme}://{domain}/robots.txt", headers=headers, timeout=5)
+            if response.status_code == 304 and previous:
+                content = previous["content"]
+                etag = response.headers.get("ETag", previous.get("etag"))
+                last_modified = response.headers.get("Last-Modified", previous.get("last_modified"))
+            elif response.status_code == 200:
+                content = response.text
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        except Exception as e:
+            print(f"[ERROR] Can't fetch robots.txt for {domain}: {e}")
+
+        # A missing or unreachable robots.txt allows everything until the entry expires
+        return {"content": content, "fetched_at": time.time(), "etag": etag, "last_modified": last_modified}
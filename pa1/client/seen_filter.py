@@ -0,0 +1,129 @@
+import hashlib
+import math
+import os
+import struct
+import threading
+
+MAGIC = b"BLM2"
+LEGACY_MAGIC = b"BLM1"
+HEADER = struct.Struct(">QQQQ")
+SLICES = struct.Struct(">Q")
+
+# Every slice holds twice as many URLs as the one before at half its error rate,
+# so the error rate of the whole filter stays below twice `error_rate`
+GROWTH = 2
+TIGHTENING = 0.5
+
+
+class BloomSlice:
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def indexes(self, h1, h2):
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def contains(self, h1, h2):
+        return all(self.bits[i >> 3] & (1 << (i & 7)) for i in self.indexes(h1, h2))
+
+    def add(self, h1, h2):
+        for i in self.indexes(h1, h2):
+            self.bits[i >> 3] |= 1 << (i & 7)
+        self.count += 1
+
+
+class BloomFilter:
+    """Set of URLs the crawler has already sent to the server, with a bounded error rate.
+
+    A URL that was added is always reported as seen. A URL that was never added
+    is reported as seen with probability below about twice `error_rate`, such a
+    link is then stored as a link to a known page only. The filter starts with
+    room for `capacity` URLs and adds a larger slice whenever the last one is
+    full, so a filter kept across runs does not fill up and turn away new URLs.
+    """
+
+    def __init__(self, capacity=1_000_000, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.slices = [BloomSlice(capacity, error_rate * (1 - TIGHTENING))]
+        self.lock = threading.Lock()
+
+    @property
+    def count(self):
+        return sum(bloom_slice.count for bloom_slice in self.slices)
+
+    @staticmethod
+    def _hashes(url):
+        digest = hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+    def _contains(self, hashes):
+        return any(bloom_slice.contains(*hashes) for bloom_slice in self.slices)
+
+    def __contains__(self, url):
+        return self._contains(self._hashes(url))
+
+    def add(self, url):
+        """Add a URL, returns True when it was probably not in the filter yet."""
+        hashes = self._hashes(url)
+        if self._contains(hashes):
+            return False
+        last = self.slices[-1]
+        if last.count >= last.capacity:
+            rate = self.error_rate * (1 - TIGHTENING) * TIGHTENING ** len(self.slices)
+            last = BloomSlice(last.capacity * GROWTH, rate)
+            self.slices.append(last)
+        last.add(*hashes)
+        return True
+
+    def add_many(self, urls):
+        """Add URLs, returns the ones that were probably new, in order."""
+        with self.lock:
+            return [url for url in urls if self.add(url)]
+
+    def unseen(self, urls):
+        """URLs that are probably not in the filter, in order, without adding them."""
+        with self.lock:
+            return [url for url in urls if url not in self]
+
+    def save(self, path):
+        with self.lock:
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(MAGIC)
+                f.write(SLICES.pack(len(self.slices)))
+                for bloom_slice in self.slices:
+                    f.write(HEADER.pack(bloom_slice.capacity, bloom_slice.num_bits, bloom_slice.num_hashes,
+                                        bloom_slice.count))
+                    f.write(bloom_slice.bits)
+            os.replace(tmp_path, path)
+
+    def load(self, path):
+        """Restore the filter saved at `path`, replacing the current contents."""
+        with open(path, "rb") as f:
+            magic = f.read(len(MAGIC))
+            if magic == LEGACY_MAGIC:
+                num_slices = 1
+            elif magic == MAGIC:
+                num_slices, = SLICES.unpack(f.read(SLICES.size))
+            else:
+                raise ValueError(f"{path} is not a saved Bloom filter")
+
+            slices = []
+            for _ in range(num_slices):
+                capacity, num_bits, num_hashes, count = HEADER.unpack(f.read(HEADER.size))
+                bloom_slice = BloomSlice.__new__(BloomSlice)
+                bloom_slice.capacity = capacity
+                bloom_slice.num_bits = num_bits
+                bloom_slice.num_hashes = num_hashes
+                bloom_slice.count = count
+                bloom_slice.bits = bytearray(f.read((num_bits + 7) // 8))
+                if len(bloom_slice.bits) != (num_bits + 7) // 8:
+                    raise ValueError(f"{path} is truncated")
+                slices.append(bloom_slice)
+        with self.lock:
+            self.capacity = slices[0].capacity
+            self.slices = slices
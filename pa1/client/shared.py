@@ -0,0 +1,33 @@
+from multiprocessing.managers import SyncManager
+
+from cache import LRUCache
+from dns_cache import DNSCache
+from link_scoring import HarvestRate, HostPages
+from politeness import PolitenessScheduler
+from seen_filter import BloomFilter
+
+node_dns_cache = None
+
+
+class NodeManager(SyncManager):
+    """Manager process holding the state shared by all crawler workers on a node."""
+
+
+def get_dns_cache():
+    """The node's single DNS cache, also used by the schedulers to group hosts by IP address."""
+    global node_dns_cache
+    if node_dns_cache is None:
+        node_dns_cache = DNSCache()
+    return node_dns_cache
+
+
+def politeness_scheduler(default_delay=5, group_by_ip=False):
+    return PolitenessScheduler(default_delay, resolve=get_dns_cache().primary_ip if group_by_ip else None)
+
+
+NodeManager.register("LRUCache", LRUCache)
+NodeManager.register("PolitenessScheduler", politeness_scheduler)
+NodeManager.register("BloomFilter", BloomFilter)
+NodeManager.register("DNSCache", get_dns_cache)
+NodeManager.register("HarvestRate", HarvestRate)
+NodeManager.register("HostPages", HostPages)
@@ -0,0 +1,75 @@
+import gzip
+import io
+import xml.etree.ElementTree as ET
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def open_sitemap(session, sitemap_url, timeout=(5, 30)):
+    """Open a sitemap as a byte stream, gzip compressed sitemaps are decompressed on the fly."""
+    response = session.get(sitemap_url, stream=True, timeout=timeout)
+    response.raise_for_status()
+    # Undo Content-Encoding of the transfer, then check whether the file itself is gzipped (.xml.gz)
+    response.raw.decode_content = True
+    stream = io.BufferedReader(response.raw)
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        stream = gzip.GzipFile(fileobj=stream)
+    return response, stream
+
+
+def iter_sitemap(session, sitemap_url, max_depth=3, seen=None):
+    """Yield (loc, lastmod) for every page of a sitemap, following sitemap indexes.
+
+    The XML is read with iterparse and every entry is cleared once it has been
+    yielded, so memory does not grow with the size of the sitemap.
+    """
+    seen = set() if seen is None else seen
+    if sitemap_url in seen:
+        return
+    seen.add(sitemap_url)
+
+    child_sitemaps = []
+    try:
+        response, stream = open_sitemap(session, sitemap_url)
+    except Exception as e:
+        print(f"[ERROR] Failed to open sitemap {sitemap_url}: {e}")
+        return
+
+    try:
+        root = None
+        for event, element in ET.iterparse(stream, events=("start", "end")):
+            if root is None:
+                root = element
+            if event != "end":
+                continue
+
+            name = local_name(element.tag)
+            if name not in ("url", "sitemap"):
+                continue
+
+            loc, lastmod = None, None
+            for child in element:
+                child_name = local_name(child.tag)
+                if child_name == "loc" and child.text:
+                    loc = child.text.strip()
+                elif child_name == "lastmod" and child.text:
+                    lastmod = child.text.strip()
+
+            if loc:
+                if name == "url":
+                    yield loc, lastmod
+                else:
+                    child_sitemaps.append(loc)
+            root.clear()
+    except Exception as e:
+        print(f"[ERROR] Failed to parse sitemap {sitemap_url}: {e}")
+    finally:
+        response.close()
+
+    if max_depth > 0:
+        for child_url in child_sitemaps:
+            yield from iter_sitemap(session, child_url, max_depth - 1, seen)
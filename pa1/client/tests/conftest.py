@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The client modules import each other by their flat names, like when run from pa1/client
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
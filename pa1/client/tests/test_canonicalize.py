@@ -0,0 +1,62 @@
+"""Canonical forms of links: RFC 3986 normalization, tracking parameters, non-http links."""
+import pytest
+
+from canonicalize import Canonicalizer
+
+BASE = "https://slo-tech.com/forum/t/812?page=2"
+
+# (link, base URL, canonical form)
+CASES = [
+    ("https://slo-tech.com/forum", None, "https://slo-tech.com/forum"),
+    ("HTTPS://Slo-Tech.COM/Forum/T/1", None, "https://slo-tech.com/Forum/T/1"),
+    ("http://example.com:80/a", None, "http://example.com/a"),
+    ("https://example.com:443", None, "https://example.com/"),
+    ("https://example.com:8443/a", None, "https://example.com:8443/a"),
+    ("https://example.com./a", None, "https://example.com/a"),
+    ("https://bücher.de/x", None, "https://xn--bcher-kva.de/x"),
+    ("http://[::1]:8080/x", None, "http://[::1]:8080/x"),
+    ("/a/./b/../c", BASE, "https://slo-tech.com/a/c"),
+    ("../../novice", BASE, "https://slo-tech.com/novice"),
+    ("/../../a", BASE, "https://slo-tech.com/a"),
+    ("https://example.com/a/b/../../../c", None, "https://example.com/c"),
+    ("/%7Euser/%41%2f%2F", BASE, "https://slo-tech.com/~user/A%2F%2F"),
+    ("/a b/č", BASE, "https://slo-tech.com/a%20b/%C4%8D"),
+    ("/100%", BASE, "https://slo-tech.com/100%25"),
+    ("?page=3", BASE, "https://slo-tech.com/forum/t/812?page=3"),
+    ("/forum?page=2&sort=new", BASE, "https://slo-tech.com/forum?page=2&sort=new"),
+    ("/forum?sort=new&page=2", BASE, "https://slo-tech.com/forum?page=2&sort=new"),
+    ("/forum?tag=b&tag=a", BASE, "https://slo-tech.com/forum?tag=b&tag=a"),
+    ("/forum?page=2&utm_source=x&UTM_Medium=y&fbclid=z", BASE, "https://slo-tech.com/forum?page=2"),
+    ("/forum?utm_campaign=x", BASE, "https://slo-tech.com/forum"),
+    ("/forum?q=a%2fb&t=c==&&", BASE, "https://slo-tech.com/forum?q=a%2Fb&t=c=="),
+    ("/forum?flag", BASE, "https://slo-tech.com/forum?flag"),
+    ("/clanki/1#komentarji", BASE, "https://slo-tech.com/clanki/1"),
+    ("#top", BASE, "https://slo-tech.com/forum/t/812?page=2"),
+    ("//cdn.slo-tech.com/s.png", BASE, "https://cdn.slo-tech.com/s.png"),
+    ("//cdn.slo-tech.com/s.png", "http://slo-tech.com/", "http://cdn.slo-tech.com/s.png"),
+    ("  /novice/\n1 ", BASE, "https://slo-tech.com/novice/1"),
+    ("/dir/", BASE, "https://slo-tech.com/dir/"),
+    ("/dir/index.html", BASE, "https://slo-tech.com/dir/"),
+    ("/dir/default.aspx?x=1", BASE, "https://slo-tech.com/dir/?x=1"),
+    ("/dir/myindex.html", BASE, "https://slo-tech.com/dir/myindex.html"),
+    ("javascript:void(0)", BASE, None),
+    ("mailto:info@slo-tech.com", BASE, None),
+    ("tel:+38612345678", BASE, None),
+    ("ftp://example.com/file", BASE, None),
+    ("http://", None, None),
+    ("", BASE, "https://slo-tech.com/forum/t/812?page=2"),
+]
+
+
+@pytest.mark.parametrize("link, base_url, expected", CASES)
+def test_canonicalize(link, base_url, expected):
+    canonicalizer = Canonicalizer()
+    if base_url is None:
+        assert canonicalizer.canonicalize(link) == expected
+    else:
+        assert canonicalizer.canonicalize(link, base_url) == expected
+
+
+@pytest.mark.parametrize("link, base_url, expected", [case for case in CASES if case[1] is not None])
+def test_canonicalize_many(link, base_url, expected):
+    assert Canonicalizer().canonicalize_many(base_url, [link]) == ({expected} if expected else set())
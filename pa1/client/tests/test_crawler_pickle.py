@@ -0,0 +1,36 @@
+"""run() pickles the crawler into every worker process when they start with spawn (Windows, macOS)."""
+import pickle
+import threading
+
+import pytest
+
+pytest.importorskip("selenium")
+pytest.importorskip("requests")
+
+import crawler
+
+
+class Offline:
+    ok = False
+
+
+@pytest.fixture
+def offline_crawler(monkeypatch):
+    monkeypatch.setattr(crawler.Crawler, "_post_api", lambda self, *args, **kwargs: Offline())
+    monkeypatch.setattr(crawler.Crawler, "server_codecs", lambda self: ("gzip",))
+    return crawler.Crawler(verbose=False)
+
+
+def test_crawler_pickles(offline_crawler):
+    offline_crawler.metrics.inc("crawler_pages_total", result="stored")
+    offline_crawler.results.results.append({"page_id": 1})
+
+    copy = pickle.loads(pickle.dumps(offline_crawler))
+
+    assert isinstance(copy.browser_pool_lock, type(threading.Lock()))
+    assert copy.results.results == [{"page_id": 1}]
+    assert "crawler_pages_total" in copy.metrics.render()
+    assert copy.canonicalizer.canonicalize("HTTP://Example.COM/a") == "http://example.com/a"
+    # Shared state still goes through the node's manager
+    offline_crawler.seen_urls.add_many(["https://example.com/"])
+    assert copy.seen_urls.unseen(["https://example.com/"]) == []
@@ -0,0 +1,94 @@
+"""Image URLs enter the node's seen filter only once their response was handled."""
+import pytest
+
+from image_fetcher import ImageFetcher
+from politeness import PolitenessScheduler
+from seen_filter import BloomFilter
+
+
+class Robots:
+    def can_fetch_many(self, urls):
+        return {url: True for url in urls}
+
+
+class Response:
+    def __init__(self, status_code=200, content_type="image/png", body=b"png"):
+        self.status_code = status_code
+        self.headers = {"Content-Type": content_type}
+        self.body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def iter_content(self, chunk_size):
+        yield self.body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {}
+
+
+class Session:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.uploaded = []
+
+    def get(self, url, **kwargs):
+        if url in self.failing:
+            raise ConnectionError(f"{url} timed out")
+        return Response()
+
+    def post(self, url, params, data, **kwargs):
+        self.uploaded.append(params["filename"])
+        return Response()
+
+
+class Crawler:
+    def __init__(self, session):
+        self.robots = Robots()
+        self.session = session
+        self.scheduler = PolitenessScheduler(default_delay=0)
+        self.fetch_timeout = 1
+        self.api_base_url = "http://api"
+
+
+class HashCache(dict):
+    def set(self, key, value):
+        self[key] = value
+
+
+@pytest.fixture
+def fetcher_for():
+    fetchers = []
+
+    def make(session, **kwargs):
+        fetcher = ImageFetcher(Crawler(session), BloomFilter(capacity=100), HashCache(), max_workers=1, **kwargs)
+        fetchers.append(fetcher)
+        return fetcher
+
+    yield make
+    for fetcher in fetchers:
+        fetcher.close(timeout=5)
+
+
+def test_failed_and_skipped_images_are_tried_again(fetcher_for):
+    session = Session(failing={"http://a/broken.png"})
+    fetcher = fetcher_for(session, max_queued=2)
+    urls = ["http://a/1.png", "http://a/broken.png", "http://a/3.png"]
+    fetcher.submit(1, urls)
+    fetcher.close(timeout=5)
+
+    assert fetcher.stats["skipped"] == 1
+    assert fetcher.stats["failed"] == 1
+    assert fetcher.seen_images.unseen(urls) == ["http://a/broken.png", "http://a/3.png"]
+
+    session.failing.clear()
+    fetcher.submit(2, urls)
+    fetcher.close(timeout=5)
+    assert sorted(session.uploaded) == ["1.png", "3.png", "broken.png"]
+    assert fetcher.seen_images.unseen(urls) == []
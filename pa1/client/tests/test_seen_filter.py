@@ -0,0 +1,44 @@
+"""Seen-URL Bloom filter: no false negatives, a bounded error rate past its capacity, save and load."""
+from seen_filter import BloomFilter
+
+
+def urls(prefix, n):
+    return [f"https://{prefix}.example/page/{i}" for i in range(n)]
+
+
+def false_positive_rate(bloom, n=20000):
+    return sum(url in bloom for url in urls("never-added", n)) / n
+
+
+def test_added_urls_are_seen():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    added = urls("a", 1000)
+    assert bloom.add_many(added) == added
+    assert bloom.add_many(added) == []
+    assert bloom.unseen(added) == []
+
+
+def test_overfilled_filter_keeps_its_error_rate():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    added = urls("a", 5000)
+    bloom.add_many(added)
+
+    assert len(bloom.slices) > 1
+    assert bloom.unseen(added) == []
+    assert false_positive_rate(bloom) < 2 * 0.01
+    # Almost every new URL is still reported as new
+    assert len(bloom.unseen(urls("b", 1000))) > 980
+
+
+def test_save_and_load(tmp_path):
+    bloom = BloomFilter(capacity=100, error_rate=0.01)
+    added = urls("a", 500)
+    bloom.add_many(added)
+    path = str(tmp_path / "seen.bloom")
+    bloom.save(path)
+
+    loaded = BloomFilter(capacity=10)
+    loaded.load(path)
+    assert len(loaded.slices) == len(bloom.slices)
+    assert loaded.count == bloom.count
+    assert loaded.unseen(added) == []
@@ -0,0 +1,92 @@
+import bisect
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Registry:
+    """Counters and histograms in the Prometheus text format, used by the crawler and the API.
+
+    Recording is a dict lookup and an increment under a lock. `const_labels`
+    are added to every series, values kept elsewhere are passed to render() as
+    (name, type, labels, value) tuples.
+    """
+
+    def __init__(self, buckets, descriptions=None, const_labels=None):
+        self.buckets = tuple(buckets)
+        self.descriptions = dict(descriptions or {})
+        self.const_labels = dict(const_labels or {})
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def render(self, samples=()):
+        with self.lock:
+            histograms = [(name, labels, list(h.counts), h.sum) for (name, labels), h in self.histograms.items()]
+            counters = [(name, "counter", dict(labels), value) for (name, labels), value in self.counters.items()]
+        counters.extend(samples)
+
+        families = {}
+        for name, labels, counts, total in histograms:
+            lines = families.setdefault((name, "histogram"), [])
+            labels = dict(labels, **self.const_labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{format_labels(dict(labels, le=bound))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+        for name, kind, labels, value in counters:
+            families.setdefault((name, kind), []).append(
+                f"{name}{format_labels(dict(labels, **self.const_labels))} {value}")
+
+        output = []
+        for (name, kind), lines in sorted(families.items()):
+            if name in self.descriptions:
+                output.append(f"# HELP {name} {self.descriptions[name]}")
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(lines)
+        return "\n".join(output) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,30 @@
+import os
+import sys
+
+# The text format is shared with the crawler's client/metrics.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+
+from prometheus_text import CONTENT_TYPE, Registry
+
+# Seconds, from a cached lookup to a large batch of crawl results
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+DESCRIPTIONS = {
+    "api_request_seconds": "Time to handle a request, per endpoint",
+    "api_requests_total": "Requests handled, per endpoint and status",
+    "api_db_queries_total": "SQL statements run, per endpoint",
+    "api_pages": "Pages per page type",
+    "api_page_budget": "HTML pages the crawl may store",
+    "api_frontier_size": "Pages waiting in the in-memory frontier",
+}
+
+
+class Metrics(Registry):
+    """Request latencies and counters of the API, in the Prometheus text format.
+
+    Values that live elsewhere, like the page counts of CrawlStats, are passed
+    to render() as (name, type, labels, value) tuples.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        super().__init__(buckets, DESCRIPTIONS)
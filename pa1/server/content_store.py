@@ -0,0 +1,65 @@
+import gzip
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+import models
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def available_codecs():
+    return ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+
+def compress(data, codec=None):
+    """Compress bytes, with zstd when the zstandard package is installed, returns (codec, blob)."""
+    codec = codec or available_codecs()[0]
+    if codec == "zstd":
+        return codec, zstandard.ZstdCompressor(level=6).compress(data)
+    if codec == "gzip":
+        return codec, gzip.compress(data, compresslevel=6)
+    raise ValueError(f"Unknown codec {codec}")
+
+
+def decompress(codec, blob):
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("Reading zstd content needs the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    if codec == "gzip":
+        return gzip.decompress(blob)
+    raise ValueError(f"Unknown codec {codec}")
+
+
+def store_content(db, content_hash, codec, blob, size):
+    """Store a compressed blob under its hash, a blob that is already stored is kept as it is."""
+    # A blob this server could not decompress would only fail later, on /page/<id>/content
+    if codec not in available_codecs():
+        raise ValueError(f"Codec {codec} can't be read by this server, it reads {', '.join(available_codecs())}")
+    db.execute(
+        insert(models.PageContent)
+        .values(content_hash=content_hash, codec=codec, size=size, data=blob)
+        .on_conflict_do_nothing(index_elements=["content_hash"])
+    )
+
+
+def store_html(db, content_hash, html_content):
+    """Compress and store HTML that was uploaded as plain text."""
+    data = html_content.encode("utf-8")
+    codec, blob = compress(data)
+    store_content(db, content_hash, codec, blob, len(data))
+
+
+def load_content(db, content_hash):
+    """(codec, blob) of a stored page content, or None. Nothing is decompressed here."""
+    row = db.execute(
+        text("SELECT codec, data FROM crawldb.page_content WHERE content_hash = :content_hash"),
+        {"content_hash": content_hash}
+    ).first()
+    if row is None:
+        return None
+    return row.codec, bytes(row.data)
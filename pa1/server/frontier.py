@@ -0,0 +1,177 @@
+import heapq
+import itertools
+import threading
+from collections import namedtuple
+
+LeasedPage = namedtuple("LeasedPage", ["id", "url", "relevance"])
+
+
+class Frontier:
+    """In-memory priority frontier with a queue per host.
+
+    Every host has a heap of its pages by relevance, and a heap of hosts keyed by
+    their best page picks the next page. Leasing costs O(log n) no matter how many
+    pages the database holds. Leased pages are remembered until they are
+    completed or released. A page whose lease expires goes back into its host's
+    queue on the next lease call. `queued` is the set of pages that may be
+    leased, heap entries of pages no longer in it (completed by a late result)
+    are skipped. Postgres stays the durable copy, the server
+    writes every change through to it and rebuilds the frontier from it on startup.
+
+    In a partitioned crawl the host heap is split by the node owning each host,
+    so a node's lease only looks at its own hosts. The heaps are rebuilt when a
+    lease brings a new ring version.
+    """
+
+    def __init__(self):
+        self.hosts = {}
+        # Owner -> heap of (best page priority, token, host), owner None without a partition
+        self.host_heaps = {}
+        self.host_tokens = {}
+        self.owner_of = None
+        self.host_owners = {}
+        self.ring_version = None
+        self.queued = set()
+        self.leased = {}
+        self.lease_heap = []
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.queued)
+
+    def _owner(self, host):
+        if self.owner_of is None:
+            return None
+        owner = self.host_owners.get(host)
+        if owner is None:
+            owner = self.host_owners[host] = self.owner_of(host)
+        return owner
+
+    def _push_host(self, host):
+        token = next(self.counter)
+        self.host_tokens[host] = token
+        heapq.heappush(self.host_heaps.setdefault(self._owner(host), []), (self.hosts[host][0][0], token, host))
+
+    def _partition(self, version, owner_of):
+        """Split the host heap by the owners of a new ring version."""
+        self.ring_version = version
+        self.owner_of = owner_of
+        self.host_owners = {}
+        self.host_heaps = {}
+        for host, token in self.host_tokens.items():
+            self.host_heaps.setdefault(self._owner(host), []).append((self.hosts[host][0][0], token, host))
+        for heap in self.host_heaps.values():
+            heapq.heapify(heap)
+
+    def _top(self, heap):
+        """The best live entry of a host heap, stale entries on top are dropped."""
+        while heap and self.host_tokens.get(heap[0][2]) != heap[0][1]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _next_heap(self, owner):
+        if owner is not None:
+            heap = self.host_heaps.get(owner)
+            return heap if heap and self._top(heap) is not None else None
+        # A lease without an owner takes the best host of any owner
+        best = None
+        for heap in self.host_heaps.values():
+            top = self._top(heap)
+            if top is not None and (best is None or top < best[0]):
+                best = (top, heap)
+        return best[1] if best else None
+
+    def _add(self, page_id, url, relevance, host):
+        if page_id in self.queued or page_id in self.leased:
+            return
+        heap = self.hosts.get(host)
+        if heap is None:
+            heap = self.hosts[host] = []
+        best = heap[0][0] if heap else None
+        heapq.heappush(heap, (-(relevance or 0), next(self.counter), page_id, url))
+        self.queued.add(page_id)
+        if best is None or heap[0][0] < best:
+            self._push_host(host)
+
+    def add(self, page_id, url, relevance, host):
+        with self.lock:
+            self._add(page_id, url, relevance, host)
+
+    def add_many(self, pages):
+        """Add (page_id, url, relevance, host) tuples."""
+        with self.lock:
+            for page in pages:
+                self._add(*page)
+
+    def restore_lease(self, page_id, url, relevance, host, lease_expires):
+        """Remember a page that was already leased when the frontier was rebuilt."""
+        with self.lock:
+            self.leased[page_id] = (url, relevance, host, lease_expires)
+            heapq.heappush(self.lease_heap, (lease_expires, page_id))
+
+    def _reclaim_expired(self, now):
+        while self.lease_heap and self.lease_heap[0][0] < now:
+            lease_expires, page_id = heapq.heappop(self.lease_heap)
+            leased = self.leased.get(page_id)
+            if leased is None or leased[3] != lease_expires:
+                continue
+            del self.leased[page_id]
+            url, relevance, host, _ = leased
+            self._add(page_id, url, relevance, host)
+
+    def lease(self, limit, now, lease_expires, owner=None, partition=None):
+        """Take up to `limit` pages with the highest relevance.
+
+        With `owner` only pages of the hosts that owner holds in `partition`, a
+        (ring version, host -> owner function) pair, are leased.
+        """
+        pages = []
+        with self.lock:
+            if partition is not None and partition[0] != self.ring_version:
+                self._partition(*partition)
+            self._reclaim_expired(now)
+            while len(pages) < limit:
+                host_heap = self._next_heap(owner)
+                if host_heap is None:
+                    break
+                _, _, host = heapq.heappop(host_heap)
+
+                heap = self.hosts[host]
+                neg_relevance, _, page_id, url = heapq.heappop(heap)
+                if page_id in self.queued:
+                    self.queued.discard(page_id)
+                    self.leased[page_id] = (url, -neg_relevance, host, lease_expires)
+                    heapq.heappush(self.lease_heap, (lease_expires, page_id))
+                    pages.append(LeasedPage(page_id, url, -neg_relevance))
+
+                if heap:
+                    self._push_host(host)
+                else:
+                    del self.hosts[host]
+                    del self.host_tokens[host]
+                    self.host_owners.pop(host, None)
+        return pages
+
+    def release(self, page_ids):
+        """Put leased pages back into their queues."""
+        with self.lock:
+            for page_id in page_ids:
+                leased = self.leased.pop(page_id, None)
+                if leased is not None:
+                    url, relevance, host, _ = leased
+                    self._add(page_id, url, relevance, host)
+
+    def complete(self, page_ids):
+        """Forget pages that have been crawled.
+
+        A result can arrive after its lease expired and the page was queued
+        again, it is taken out of the queue as well.
+        """
+        with self.lock:
+            for page_id in page_ids:
+                self.leased.pop(page_id, None)
+                self.queued.discard(page_id)
+
+    def lease_count(self):
+        return len(self.leased)
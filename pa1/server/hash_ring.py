@@ -0,0 +1,119 @@
+import bisect
+import hashlib
+import threading
+import time
+
+
+def ring_hash(key):
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hashing of hosts onto crawler nodes.
+
+    Every node is placed on the ring `vnodes` times, a host belongs to the first
+    node point after its own hash. Adding or removing a node only moves the
+    hosts next to that node's points, about 1/n of all hosts.
+    """
+
+    def __init__(self, nodes=(), vnodes=64):
+        self.vnodes = vnodes
+        self.points = []
+        self.owners = []
+        self.members = set()
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        if node in self.members:
+            return
+        self.members.add(node)
+        for replica in range(self.vnodes):
+            point = ring_hash(f"{node}#{replica}")
+            index = bisect.bisect(self.points, point)
+            self.points.insert(index, point)
+            self.owners.insert(index, node)
+
+    def remove(self, node):
+        if node not in self.members:
+            return
+        self.members.discard(node)
+        kept = [(point, owner) for point, owner in zip(self.points, self.owners) if owner != node]
+        self.points = [point for point, _ in kept]
+        self.owners = [owner for _, owner in kept]
+
+    def copy(self):
+        ring = HashRing(vnodes=self.vnodes)
+        ring.points = list(self.points)
+        ring.owners = list(self.owners)
+        ring.members = set(self.members)
+        return ring
+
+    def owner(self, key):
+        if not self.points:
+            return None
+        index = bisect.bisect(self.points, ring_hash(key)) % len(self.points)
+        return self.owners[index]
+
+
+class NodeRegistry:
+    """Crawler nodes taking part in a partitioned crawl, with their hash ring.
+
+    Nodes join with a heartbeat and are dropped when they leave or have not been
+    heard from for `ttl` seconds. Every membership change bumps `version`, which
+    nodes use to notice that host ownership moved.
+    """
+
+    def __init__(self, ttl=60, vnodes=64):
+        self.ttl = ttl
+        self.ring = HashRing(vnodes=vnodes)
+        self.last_seen = {}
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def _expire(self, now):
+        for node_id, last_seen in list(self.last_seen.items()):
+            if now - last_seen > self.ttl:
+                del self.last_seen[node_id]
+                self.ring.remove(node_id)
+                self.version += 1
+
+    def heartbeat(self, node_id):
+        now = time.monotonic()
+        with self.lock:
+            self._expire(now)
+            if node_id not in self.last_seen:
+                self.ring.add(node_id)
+                self.version += 1
+            self.last_seen[node_id] = now
+            return self.version
+
+    def leave(self, node_id):
+        with self.lock:
+            if self.last_seen.pop(node_id, None) is not None:
+                self.ring.remove(node_id)
+                self.version += 1
+            return self.version
+
+    def partition(self):
+        """(version, host -> node function) of the current ring, for Frontier.lease."""
+        with self.lock:
+            self._expire(time.monotonic())
+            # A lease runs without the lock, a node joining meanwhile must not change the ring under it
+            return self.version, self.ring.copy().owner
+
+    def owners(self, hosts):
+        """(version, {host: node}) of the current ring."""
+        with self.lock:
+            self._expire(time.monotonic())
+            return self.version, {host: self.ring.owner(host) for host in hosts}
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            self._expire(now)
+            return {
+                "ring_version": self.version,
+                "nodes": [{"node_id": node_id, "seconds_since_heartbeat": round(now - last_seen, 1)}
+                          for node_id, last_seen in sorted(self.last_seen.items())],
+            }
@@ -0,0 +1,75 @@
+import threading
+from array import array
+
+FINGERPRINT_BITS = 64
+
+
+class SimHashIndex:
+    """Banded LSH index of 64-bit SimHash fingerprints.
+
+    The fingerprint is cut into `num_bands` bands and every page is stored in
+    one bucket per band. Two fingerprints within `max_distance` bits of each
+    other agree on at least one band when num_bands > max_distance, so a lookup
+    only compares against the pages in its own buckets. Buckets are pairs of
+    arrays (fingerprints, page ids) to keep millions of pages in a few hundred MB.
+    """
+
+    def __init__(self, num_bands=4, max_distance=3):
+        if FINGERPRINT_BITS % num_bands:
+            raise ValueError("num_bands has to divide 64")
+        if num_bands <= max_distance:
+            raise ValueError("num_bands has to be larger than max_distance")
+        self.num_bands = num_bands
+        self.max_distance = max_distance
+        self.band_bits = FINGERPRINT_BITS // num_bands
+        self.band_mask = (1 << self.band_bits) - 1
+        self.bands = [dict() for _ in range(num_bands)]
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def _keys(self, fingerprint):
+        return [(fingerprint >> (band * self.band_bits)) & self.band_mask for band in range(self.num_bands)]
+
+    def add(self, page_id, fingerprint):
+        with self.lock:
+            for band, key in zip(self.bands, self._keys(fingerprint)):
+                bucket = band.get(key)
+                if bucket is None:
+                    bucket = band[key] = (array("Q"), array("q"))
+                bucket[0].append(fingerprint)
+                bucket[1].append(page_id)
+            self.size += 1
+
+    def find(self, fingerprint):
+        """Return (page_id, distance) of the closest stored page within max_distance, or None."""
+        best = None
+        for band, key in zip(self.bands, self._keys(fingerprint)):
+            bucket = band.get(key)
+            if bucket is None:
+                continue
+            fingerprints, page_ids = bucket
+            for i, other in enumerate(fingerprints):
+                distance = bin(fingerprint ^ other).count("1")
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (page_ids[i], distance)
+                    if distance == 0:
+                        return best
+        return best
+
+    def memory_bytes(self):
+        """Approximate memory held by the buckets."""
+        total = 0
+        for band in self.bands:
+            total += band.__sizeof__()
+            for fingerprints, page_ids in band.values():
+                total += fingerprints.__sizeof__() + page_ids.__sizeof__() + 64
+        return total
+
+
+def to_signed(fingerprint):
+    """Store unsigned 64-bit fingerprints in a signed BIGINT column."""
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
@@ -2,18 +2,27 @@ import base64
 import datetime
 import logging
 import os
+import threading
+import time
 from urllib.parse import urlparse
 
-from flask import Flask, request, jsonify
-from sqlalchemy import text, select, create_engine
+from flask import Flask, Response, g, has_request_context, request, jsonify
+from sqlalchemy import event, text, create_engine
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import sessionmaker, scoped_session
+from werkzeug.exceptions import RequestEntityTooLarge
 
 import models  # assuming models.py is in the server folder
-from schemas import SiteCreate, PageFrontier, PageCreate, PageDataCreate, ImageCreate, LinkCreate, DelayData
+from content_store import available_codecs, decompress, load_content, store_content, store_html
+from frontier import Frontier
+from hash_ring import NodeRegistry
+from lsh import SimHashIndex, to_signed, to_unsigned
+from api_metrics import CONTENT_TYPE, Metrics
+from stats import CrawlStats
+from schemas import SiteCreate, SiteRobots, PageFrontier, PageCreate, PageDataCreate, ImageCreate, LinkCreate, DelayData
 
 # Logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
 # Database Connection
@@ -26,6 +35,36 @@ engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 SessionLocal = scoped_session(sessionmaker(bind=engine))
 
 app = Flask(__name__)
+# Uploads are held in memory until they are stored (see read_upload), the default matches the
+# crawler's max_document_bytes. At most MAX_CONCURRENT_UPLOADS are held at once, so uploads take
+# up to MAX_UPLOAD_BYTES * MAX_CONCURRENT_UPLOADS of server memory whatever the number of threads.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+MAX_CONCURRENT_UPLOADS = int(os.getenv("MAX_CONCURRENT_UPLOADS", "4"))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
+upload_slots = threading.BoundedSemaphore(MAX_CONCURRENT_UPLOADS)
+
+# Request latencies and query counts per endpoint, served on GET /metrics
+metrics = Metrics()
+
+def endpoint_label():
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = endpoint_label()
+    metrics.observe("api_request_seconds", time.perf_counter() - g.get("request_start", time.perf_counter()),
+                    method=request.method, endpoint=endpoint)
+    metrics.inc("api_requests_total", method=request.method, endpoint=endpoint, status=response.status_code)
+    return response
+
+@event.listens_for(engine, "before_cursor_execute")
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    metrics.inc("api_db_queries_total", endpoint=endpoint_label() if has_request_context() else "background")
 
 @app.route("/test", methods=["GET"])
 def test():
@@ -41,6 +80,9 @@ def create_site():
             domain=site_data.domain,
             robots_content=site_data.robots_content,
             sitemap_content=site_data.sitemap_content,
+            robots_fetched_time=datetime.datetime.now(),
+            robots_etag=site_data.robots_etag,
+            robots_last_modified=site_data.robots_last_modified,
         )
         db.add(new_site)
         db.commit()
@@ -52,6 +94,54 @@ def create_site():
     finally:
         db.close()
 
+@app.route("/site/robots", methods=["GET"])
+def get_site_robots():
+    db = SessionLocal()
+    try:
+        domain = request.args.get("domain")
+        site = db.query(models.Site).filter(models.Site.domain == domain).first()
+        if not site:
+            return jsonify({"exists": False})
+
+        robots_age = None
+        if site.robots_fetched_time:
+            robots_age = (datetime.datetime.now() - site.robots_fetched_time).total_seconds()
+        return jsonify({
+            "exists": True,
+            "site_id": site.id,
+            "robots_content": site.robots_content,
+            "robots_age": robots_age,
+            "robots_etag": site.robots_etag,
+            "robots_last_modified": site.robots_last_modified
+        })
+    except Exception as e:
+        logger.error(f'Error /site/robots: {e}')
+        return jsonify({"error": str(e)}), 500
+    finally:
+        db.close()
+
+@app.route("/site/<int:site_id>/robots", methods=["PUT"])
+def update_site_robots(site_id):
+    db = SessionLocal()
+    try:
+        robots = SiteRobots(**request.get_json())
+        site = db.query(models.Site).filter(models.Site.id == site_id).first()
+        if not site:
+            return jsonify({"error": "Site not found"}), 404
+
+        site.robots_content = robots.robots_content
+        site.robots_etag = robots.robots_etag
+        site.robots_last_modified = robots.robots_last_modified
+        site.robots_fetched_time = datetime.datetime.now()
+        db.commit()
+        return jsonify({"id": site.id})
+    except Exception as e:
+        db.rollback()
+        logger.error(f'Error /site/{site_id}/robots: {e}')
+        return jsonify({"error": str(e)}), 500
+    finally:
+        db.close()
+
 @app.route("/site/delay", methods=["POST"])
 def get_delay():
     db = SessionLocal()
@@ -112,6 +202,7 @@ def create_page_frontier():
         )
         db.add(new_page)
         db.commit()
+        add_to_frontier([new_page])
         return jsonify({"id": new_page.id, "url": new_page.url})
     except Exception as e:
         db.rollback()
@@ -124,49 +215,79 @@ def get_domain(url):
     parsed_url = urlparse(url)
     return parsed_url.netloc
 
-@app.route("/page/frontierlinks", methods=["POST"])
-def create_pages_frontier():
-    db = SessionLocal()
+def parse_lastmod(value):
+    """Sitemap lastmod (W3C datetime) as a naive local timestamp like accessed_time, None when invalid."""
+    if not value:
+        return None
     try:
-        data = request.get_json()
-
-        links = data["links"]
-        # Prepare batch insert into Page table
-        chunk_size = 1000
-        for i in range(0, len(links), chunk_size):
-            chunk = links[i: i + chunk_size]
-            stmt = insert(models.Page).values([
-                {
-                    "site_id": None,
-                    "page_type_code": "FRONTIER",
-                    "url": link["url"],
-                    "relevance": link["relevance"],
-                }
-                for link in chunk
-            ]).on_conflict_do_nothing(index_elements=["url"])
-            db.execute(stmt)
+        lastmod = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if lastmod.tzinfo is not None:
+        lastmod = lastmod.astimezone().replace(tzinfo=None)
+    return lastmod
 
-        db.commit()
-        # Get ID-s for inserted pages
-        from_page_id = data.get("from_page_id")
-
-        urls = [link["url"] for link in links]
-        pages = db.execute(
-            select(models.Page.id, models.Page.url).where(models.Page.url.in_(urls))
-        ).fetchall()
+# One statement for a whole link set: new URLs go to the frontier, and every URL that has a page,
+# new or already stored, is linked from the page they were found on. Pages are matched through the
+# fixed-width md5(url)::uuid index instead of the full URL text. The link insert cannot see the
+# pages inserted by the same statement, so those come from its RETURNING rows.
+INGEST_LINKS = text("""
+    WITH input AS (
+        SELECT url, md5(url)::uuid AS url_hash, relevance, lastmod, is_new
+        FROM unnest(CAST(:urls AS text[]), CAST(:relevances AS integer[]),
+                    CAST(:lastmods AS timestamp[]), CAST(:is_new AS boolean[]))
+             AS t(url, relevance, lastmod, is_new)
+    ),
+    inserted AS (
+        INSERT INTO crawldb.page (page_type_code, url, relevance, lastmod)
+        SELECT DISTINCT ON (url_hash) 'FRONTIER', url, relevance, lastmod
+        FROM input
+        WHERE is_new
+        ORDER BY url_hash, relevance DESC NULLS LAST
+        ON CONFLICT ((md5(url)::uuid)) DO NOTHING
+        RETURNING id, url, relevance
+    ),
+    linked AS (
+        INSERT INTO crawldb.link (from_page, to_page)
+        SELECT CAST(:from_page_id AS integer), targets.id
+        FROM (
+            SELECT id FROM inserted
+            UNION
+            SELECT p.id FROM input i
+            JOIN crawldb.page p ON md5(p.url)::uuid = i.url_hash AND p.url = i.url
+        ) targets
+        WHERE CAST(:from_page_id AS integer) IS NOT NULL
+        ON CONFLICT DO NOTHING
+    )
+    SELECT id, url, relevance FROM inserted
+""")
 
-        url_to_id = {page.url: page.id for page in pages}
+def ingest_links(db, links, known_urls=(), from_page_id=None):
+    """Add `links` to the frontier and link `from_page_id` to them and to `known_urls`, without committing.
 
-        # Insert into Link table
-        if from_page_id is not None:
-            link_stmt = insert(models.Link).values([
-                {"from_page": from_page_id, "to_page": url_to_id[link["url"]]}
-                for link in links
-                if link["url"] in url_to_id
-            ]).on_conflict_do_nothing(index_elements=["from_page", "to_page"])
-            db.execute(link_stmt)
+    `known_urls` are URLs the crawler has sent before, they are only linked when
+    their page exists. Returns the inserted rows, they go to the in-memory
+    frontier after the commit.
+    """
+    urls = [link["url"] for link in links] + list(known_urls)
+    if not urls or (not links and from_page_id is None):
+        return []
+    return db.execute(INGEST_LINKS, {
+        "urls": urls,
+        "relevances": [link["relevance"] for link in links] + [None] * len(known_urls),
+        "lastmods": [parse_lastmod(link.get("lastmod")) for link in links] + [None] * len(known_urls),
+        "is_new": [True] * len(links) + [False] * len(known_urls),
+        "from_page_id": from_page_id,
+    }).fetchall()
 
+@app.route("/page/frontierlinks", methods=["POST"])
+def create_pages_frontier():
+    db = SessionLocal()
+    try:
+        data = request.get_json()
+        new_pages = ingest_links(db, data["links"], data.get("known_links", []), data.get("from_page_id"))
         db.commit()
+        add_to_frontier(new_pages)
         return jsonify({"status": "success", "inserted": len(data["links"])})
 
     except Exception as e:
@@ -176,6 +297,85 @@ def create_pages_frontier():
     finally:
         db.close()
 
+REVISIT_INTERVAL = int(os.getenv("REVISIT_INTERVAL", str(24 * 3600)))
+MIN_REVISIT_INTERVAL = 3600
+MAX_REVISIT_INTERVAL = 30 * 24 * 3600
+REVISIT_TYPES = ("HTML", "DUPLICATE")
+
+def schedule_revisit(page, changed, now):
+    """Set when to visit a page again from whether it changed since the last visit.
+
+    The interval halves when the page changed and grows by half when it did
+    not, so it settles around the page's own rate of change.
+    """
+    if page.page_type_code not in REVISIT_TYPES:
+        page.next_visit = None
+        return
+
+    first_visit = not page.visit_count
+    interval = page.revisit_interval or REVISIT_INTERVAL
+    if not first_visit:
+        interval = interval / 2 if changed else interval * 1.5
+    interval = int(min(max(interval, MIN_REVISIT_INTERVAL), MAX_REVISIT_INTERVAL))
+
+    page.revisit_interval = interval
+    page.next_visit = now + datetime.timedelta(seconds=interval)
+    page.visit_count = (page.visit_count or 0) + 1
+    if changed:
+        page.last_changed = now
+        if not first_visit:
+            page.change_count = (page.change_count or 0) + 1
+
+def apply_page_update(existing_page, data):
+    """Update a crawled page, returns its (old site, old type, new site, new type) transition."""
+    old_state = (existing_page.site_id, existing_page.page_type_code)
+    changed = existing_page.content_hash != data["content_hash"] or existing_page.page_type_code != data["page_type_code"]
+    now = datetime.datetime.now()
+    existing_page.page_type_code = data["page_type_code"]
+    existing_page.http_status_code = data["http_status_code"]
+    existing_page.accessed_time = now
+    existing_page.accessed_ip = data["accessed_ip"]
+    existing_page.lease_expires = None
+    existing_page.etag = data.get("etag")
+    existing_page.last_modified = data.get("last_modified")
+
+    if "site_id" in data:
+        existing_page.site_id = data["site_id"]
+
+    # HTML lives in crawldb.page_content, the page only keeps its hash
+    existing_page.html_content = None
+    existing_page.content_hash = data["content_hash"]
+
+    if data.get("simhash") is not None:
+        existing_page.simhash = to_signed(data["simhash"])
+
+    schedule_revisit(existing_page, changed, now)
+    return old_state + (existing_page.site_id, existing_page.page_type_code)
+
+def apply_unchanged_revisit(existing_page, data):
+    """A revisit that got a 304 or the same content, only timestamps and the schedule move."""
+    now = datetime.datetime.now()
+    existing_page.http_status_code = data["http_status_code"]
+    existing_page.accessed_time = now
+    existing_page.accessed_ip = data["accessed_ip"]
+    existing_page.lease_expires = None
+    if data.get("etag") or data.get("last_modified"):
+        existing_page.etag = data.get("etag")
+        existing_page.last_modified = data.get("last_modified")
+    schedule_revisit(existing_page, False, now)
+    state = (existing_page.site_id, existing_page.page_type_code)
+    return state + state
+
+def store_page_content(db, data):
+    """Store the HTML of a crawled page, uploaded either compressed or as plain text."""
+    if data["page_type_code"] != 'HTML' or not data.get("content_hash"):
+        return
+    if data.get("html_compressed") is not None:
+        store_content(db, data["content_hash"], data["html_codec"], base64.b64decode(data["html_compressed"]),
+                      data.get("html_size"))
+    elif data.get("html_content") is not None:
+        store_html(db, data["content_hash"], data["html_content"])
+
 @app.route("/page/<int:page_id>", methods=["PUT"])
 def update_page(page_id):
     db = SessionLocal()
@@ -185,26 +385,97 @@ def update_page(page_id):
         if not existing_page:
             return jsonify({"error": "Page not found"}), 404
 
-        existing_page.page_type_code = data["page_type_code"]
-        existing_page.http_status_code = data["http_status_code"]
-        existing_page.accessed_time = datetime.datetime.now()
-        existing_page.accessed_ip = data["accessed_ip"]
+        store_page_content(db, data)
+        transition = apply_page_update(existing_page, data)
+
+        db.commit()
+        record_transitions([transition])
+        complete_frontier_pages([page_id])
+        index_near_duplicate(page_id, data)
+        return jsonify({"id": existing_page.id, "url": existing_page.url})
+    except Exception as e:
+        db.rollback()
+        logger.error(f'Error /page/{page_id}: {e}')
+        return jsonify({"error": str(e)}), 500
+    finally:
+        db.close()
+
+def store_crawl_result(db, result):
+    """Write everything the crawler found on one page, without committing.
 
-        if "site_id" in data:
-            existing_page.site_id = data["site_id"]
+    Returns the page's state transition and the new frontier rows.
+    """
+    page_id = result["page_id"]
+    existing_page = db.query(models.Page).filter(models.Page.id == page_id).first()
+    if not existing_page:
+        raise ValueError(f"Page {page_id} not found")
 
-        if data["page_type_code"] == 'HTML':
-            existing_page.html_content = data["html_content"]
-        else:
-            existing_page.html_content = None
+    if result.get("unchanged"):
+        return apply_unchanged_revisit(existing_page, result), []
+
+    store_page_content(db, result)
+    transition = apply_page_update(existing_page, result)
+
+    if result.get("duplicate_of") is not None:
+        db.execute(
+            insert(models.Link).values(from_page=result["duplicate_of"], to_page=page_id)
+            .on_conflict_do_nothing(index_elements=["from_page", "to_page"])
+        )
+
+    new_pages = ingest_links(db, result.get("links", []), result.get("known_links", []), page_id)
+
+    for page_data in result.get("page_data", []):
+        db.add(models.PageData(
+            page_id=page_id,
+            data_type_code=page_data["data_type_code"],
+            data=page_data["data"]
+        ))
 
-        existing_page.content_hash = data["content_hash"]  
+    for image in result.get("images", []):
+        db.add(models.Image(
+            page_id=page_id,
+            filename=image["filename"],
+            content_type=image["content_type"],
+            data=base64.b64decode(image["data"]),
+            accessed_time=image["accessed_time"]
+        ))
+    db.flush()
+    return transition, new_pages
+
+@app.route("/crawl/results", methods=["POST"])
+def create_crawl_results():
+    db = SessionLocal()
+    try:
+        data = request.get_json()
+        stored = []
+        failed = []
+        transitions = []
+        new_pages = []
+        for result in data["results"]:
+            # A savepoint per page, so one bad result does not roll back the whole batch
+            savepoint = db.begin_nested()
+            try:
+                transition, result_pages = store_crawl_result(db, result)
+                savepoint.commit()
+                stored.append(result)
+                transitions.append(transition)
+                new_pages.extend(result_pages)
+            except Exception as e:
+                savepoint.rollback()
+                logger.error(f'Error /crawl/results page {result.get("page_id")}: {e}')
+                failed.append({"page_id": result.get("page_id"), "error": str(e)})
 
         db.commit()
-        return jsonify({"id": existing_page.id, "url": existing_page.url})
+        # Count the pages before their leases are dropped, so the budget never misses them in between
+        record_transitions(transitions)
+        complete_frontier_pages([result["page_id"] for result in stored])
+        add_to_frontier(new_pages)
+        for result in stored:
+            index_near_duplicate(result["page_id"], result)
+        return jsonify({"stored": [result["page_id"] for result in stored], "failed": failed})
     except Exception as e:
         db.rollback()
-        logger.error(f'Error /page/{page_id}: {e}')
+        logger.error(f'Error /crawl/results: {e}')
         return jsonify({"error": str(e)}), 500
     finally:
         db.close()
@@ -229,6 +500,59 @@ def create_page_data():
     finally:
         db.close()
 
+def read_upload():
+    """Body of a binary upload, sent raw or as the file part of a multipart form, read in chunks.
+
+    The body is read into memory: page_data.data and image.data are bytea
+    columns, which psycopg2 only writes from a complete bytes value. Callers
+    hold one of the upload_slots until the row is written. Bodies larger than
+    MAX_UPLOAD_BYTES raise RequestEntityTooLarge, before any of it is read when
+    they declare a Content-Length.
+    """
+    if request.content_length is not None and request.content_length > MAX_UPLOAD_BYTES:
+        raise RequestEntityTooLarge(f"Upload larger than {MAX_UPLOAD_BYTES} bytes")
+    if request.files:
+        stream = (request.files.get("file") or next(iter(request.files.values()))).stream
+    else:
+        stream = request.stream
+
+    data = bytearray()
+    while True:
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        data.extend(chunk)
+        # Chunked bodies have no Content-Length for Flask to check up front
+        if len(data) > MAX_UPLOAD_BYTES:
+            raise RequestEntityTooLarge(f"Upload larger than {MAX_UPLOAD_BYTES} bytes")
+    return data or None
+
+@app.route("/pagedata/upload", methods=["POST"])
+def upload_page_data():
+    """Store a binary document sent as the raw request body or a multipart file, metadata comes as fields."""
+    db = SessionLocal()
+    try:
+        with upload_slots:
+            data = read_upload()
+            new_pagedata = models.PageData(
+                page_id=request.values.get("page_id", type=int),
+                data_type_code=request.values.get("data_type_code"),
+                data=data
+            )
+            db.add(new_pagedata)
+            db.commit()
+        return jsonify({"id": new_pagedata.id, "size": len(data or b"")})
+    except RequestEntityTooLarge as e:
+        db.rollback()
+        logger.error(f'Error /pagedata/upload: {e}')
+        return jsonify({"error": str(e)}), 413
+    except Exception as e:
+        db.rollback()
+        logger.error(f'Error /pagedata/upload: {e}')
+        return jsonify({"error": str(e)}), 500
+    finally:
+        db.close()
+
 @app.route("/image", methods=["POST"])
 def create_image():
     db = SessionLocal()
@@ -252,6 +576,43 @@ def create_image():
     finally:
         db.close()
 
+@app.route("/image/upload", methods=["POST"])
+def upload_image():
+    """Store an image sent as the raw request body or a multipart file, metadata comes as fields.
+
+    An image whose content_hash is already stored with its bytes gets a row that
+    only references it by the hash.
+    """
+    db = SessionLocal()
+    try:
+        content_hash = request.values.get("content_hash")
+        stored = content_hash and db.execute(
+            text("SELECT 1 FROM crawldb.image WHERE content_hash = :content_hash AND data IS NOT NULL LIMIT 1"),
+            {"content_hash": content_hash}
+        ).first() is not None
+
+        with upload_slots:
+            new_image = models.Image(
+                page_id=request.values.get("page_id", type=int),
+                filename=request.values.get("filename", "")[:255],
+                content_type=request.values.get("content_type", "")[:50],
+                content_hash=content_hash,
+                data=None if stored else read_upload(),
+                accessed_time=request.values.get("accessed_time")
+            )
+            db.add(new_image)
+            db.commit()
+        return jsonify({"id": new_image.id, "deduplicated": bool(stored)})
+    except RequestEntityTooLarge as e:
+        db.rollback()
+        logger.error(f'Error /image/upload: {e}')
+        return jsonify({"error": str(e)}), 413
+    except Exception as e:
+        db.rollback()
+        logger.error(f'Error /image/upload: {e}')
+        return jsonify({"error": str(e)}), 500
+    finally:
+        db.close()
 
 @app.route("/link", methods=["POST"])
 def create_link():
@@ -272,54 +633,495 @@ def create_link():
     finally:
         db.close()
 
+LEASE_SECONDS = int(os.getenv("LEASE_SECONDS", "300"))
+MAX_LEASE_SIZE = 100
+
+# "memory" keeps the frontier and the page counts in this process, use "db" when several server processes
+# share the database, the counts and the page budget are then kept in it (see migrations.sql)
+FRONTIER_MODE = os.getenv("FRONTIER_MODE", "memory")
+memory_frontier = None
+memory_frontier_lock = threading.Lock()
+
+def get_frontier():
+    """The in-memory frontier, rebuilt from FRONTIER and CRAWLING pages on first use."""
+    global memory_frontier
+    with memory_frontier_lock:
+        if memory_frontier is None:
+            frontier = Frontier()
+            now = datetime.datetime.now()
+            db = SessionLocal()
+            try:
+                rows = db.execute(
+                    text("""SELECT id, url, relevance, page_type_code, lease_expires
+                            FROM crawldb.page
+                            WHERE page_type_code IN ('FRONTIER', 'CRAWLING')""").execution_options(yield_per=10000)
+                )
+                for row in rows:
+                    if row.page_type_code == 'FRONTIER':
+                        frontier.add(row.id, row.url, row.relevance, get_domain(row.url))
+                    else:
+                        frontier.restore_lease(row.id, row.url, row.relevance, get_domain(row.url),
+                                               row.lease_expires or now)
+            finally:
+                db.close()
+            logger.info(f"Frontier loaded with {len(frontier)} pages and {frontier.lease_count()} leases")
+            memory_frontier = frontier
+    return memory_frontier
+
+def add_to_frontier(pages):
+    if FRONTIER_MODE == "memory" and pages:
+        get_frontier().add_many([(page.id, page.url, page.relevance, get_domain(page.url)) for page in pages])
+
+def complete_frontier_pages(page_ids):
+    if FRONTIER_MODE == "memory" and page_ids:
+        get_frontier().complete(page_ids)
+
+def record_transitions(transitions):
+    # With the frontier in the database its triggers keep the counts
+    if FRONTIER_MODE == "memory":
+        get_stats().record(transitions)
+
+MAX_PAGES = int(os.getenv("MAX_PAGES", "25000"))
+crawl_stats = None
+crawl_stats_lock = threading.Lock()
+budget_lock = threading.Lock()
+
+def get_stats():
+    """Page counters, loaded with one GROUP BY on first use."""
+    global crawl_stats
+    with crawl_stats_lock:
+        if crawl_stats is None:
+            stats = CrawlStats(MAX_PAGES)
+            db = SessionLocal()
+            try:
+                rows = db.execute(
+                    text("""SELECT site_id, page_type_code, COUNT(*)
+                            FROM crawldb.page
+                            WHERE page_type_code <> 'FRONTIER'
+                            GROUP BY site_id, page_type_code""")
+                ).fetchall()
+                stats.load(rows)
+            finally:
+                db.close()
+            crawl_stats = stats
+    return crawl_stats
+
+def shared_page_counts(db):
+    """Page counts per type and the page budget kept in the database, for FRONTIER_MODE=db."""
+    page_types = {row.page_type_code: row.pages for row in db.execute(
+        text("SELECT page_type_code, pages FROM crawldb.page_type_count WHERE pages <> 0")
+    )}
+    max_pages = db.execute(text("SELECT max_pages FROM crawldb.crawl_budget")).scalar()
+    return page_types, MAX_PAGES if max_pages is None else max_pages
+
+def stats_snapshot(include_sites=False):
+    """Budget and page counts without the frontier, sites only when asked for."""
+    if FRONTIER_MODE == "memory":
+        return get_stats().snapshot(include_sites=include_sites)
+    db = SessionLocal()
+    try:
+        page_types, max_pages = shared_page_counts(db)
+        snapshot = {"max_pages": max_pages, "page_types": page_types}
+        if include_sites:
+            # No process holds the counts per site, they are counted when asked for
+            sites = {}
+            rows = db.execute(
+                text("""SELECT site_id, page_type_code, COUNT(*) AS pages
+                        FROM crawldb.page
+                        WHERE page_type_code <> 'FRONTIER' AND site_id IS NOT NULL
+                        GROUP BY site_id, page_type_code""")
+            )
+            for row in rows:
+                sites.setdefault(row.site_id, {})[row.page_type_code] = row.pages
+            snapshot["sites"] = sites
+        return snapshot
+    finally:
+        db.close()
+
+def lease_frontier(db, limit, lease_seconds, owner=None, partition=None):
+    """Hand out up to `limit` frontier pages, highest relevance first.
+
+    Pages still in CRAWLING after their lease expired (a worker crashed or was
+    stopped) are picked up again as if they were in the frontier. No more pages
+    are handed out than the max_pages budget has room for, counting the pages
+    that are leased right now. `owner` limits the lease to the hosts that node
+    holds in `partition` (see NodeRegistry.partition) and needs the in-memory
+    frontier.
+
+    Returns (pages, lease_expires, budget_full, budget_reached). `budget_full`
+    means the pages in flight take up the rest of the budget, they may still end
+    up as something other than HTML and free it again. `budget_reached` means
+    max_pages HTML pages are stored.
+    """
+    now = datetime.datetime.now()
+    lease_expires = now + datetime.timedelta(seconds=lease_seconds)
+    if FRONTIER_MODE != "memory":
+        # Server processes sharing the database lease one at a time against the counts its triggers keep,
+        # the lock is held until the lease commits
+        db.execute(text("SELECT pg_advisory_xact_lock(hashtext('crawldb.crawl_budget'))"))
+        reclaim_expired_leases(db, now)
+        page_types, max_pages = shared_page_counts(db)
+        budget = max_pages - page_types.get("HTML", 0) - page_types.get("CRAWLING", 0)
+        limit = max(0, min(limit, budget))
+        pages = lease_frontier_from_db(db, limit, now, lease_expires) if limit else []
+        db.commit()
+        return pages, lease_expires, budget <= 0, page_types.get("HTML", 0) >= max_pages
+
+    stats = get_stats()
+    frontier = get_frontier()
+    with budget_lock:
+        budget = stats.budget_left(frontier.lease_count())
+        limit = max(0, min(limit, budget))
+        pages = frontier.lease(limit, now, lease_expires, owner, partition) if limit else []
+    if pages:
+        # Write-through of the whole batch by primary key, the cost does not grow with the page table.
+        # Pages stored in the meantime (a late result of an expired lease) keep their type.
+        try:
+            updated = db.execute(
+                text("""UPDATE crawldb.page SET page_type_code = 'CRAWLING', accessed_time = :now, lease_expires = :lease_expires
+                        WHERE id = ANY(:ids) AND page_type_code IN ('FRONTIER', 'CRAWLING')
+                        RETURNING id"""),
+                {"now": now, "lease_expires": lease_expires, "ids": [page.id for page in pages]}
+            ).scalars().all()
+            db.commit()
+        except Exception:
+            frontier.release([page.id for page in pages])
+            raise
+        updated = set(updated)
+        stored = [page.id for page in pages if page.id not in updated]
+        if stored:
+            frontier.complete(stored)
+            pages = [page for page in pages if page.id in updated]
+    return pages, lease_expires, budget <= 0, stats.count("HTML") >= stats.max_pages
+
+def reclaim_expired_leases(db, now):
+    """Put pages whose lease expired back in the frontier, found through idx_page_crawling_lease."""
+    db.execute(
+        text("""UPDATE crawldb.page SET page_type_code = 'FRONTIER', lease_expires = NULL
+                WHERE page_type_code = 'CRAWLING' AND lease_expires < :now"""),
+        {"now": now}
+    )
+
+def lease_frontier_from_db(db, limit, now, lease_expires):
+    """Lease pages with a single statement on the page table, it walks idx_page_frontier by relevance."""
+    rows = db.execute(
+        text("""
+                    UPDATE crawldb.page p
+                    SET page_type_code = 'CRAWLING', accessed_time = :now, lease_expires = :lease_expires
+                    FROM (
+                        SELECT id
+                        FROM crawldb.page
+                        WHERE page_type_code = 'FRONTIER'
+                        ORDER BY relevance DESC
+                        LIMIT :limit
+                        FOR UPDATE SKIP LOCKED
+                    ) leased
+                    WHERE p.id = leased.id
+                    RETURNING p.id, p.url, p.relevance
+                """),
+        {"now": now, "lease_expires": lease_expires, "limit": limit}
+    ).fetchall()
+    db.commit()
+    return sorted(rows, key=lambda row: row.relevance or 0, reverse=True)
+
 @app.route("/frontier", methods=["GET"])
 def list_frontier_urls():
     db = SessionLocal()
     try:
-        results = db.execute(
+        rows, _, _, _ = lease_frontier(db, 1, LEASE_SECONDS)
+        if not rows:
+            return jsonify({"error": "Frontier is empty"}), 404
+
+        return jsonify({"id": rows[0].id, "url": rows[0].url})
+    except Exception as e:
+        db.rollback()
+        logger.error(f'Error /frontier-urls: {e}')
+        return jsonify({"error": str(e)}), 500
+    finally:
+        db.close()
+
+# Crawler nodes of a partitioned crawl, every node leases only its own hosts
+NODE_TTL = int(os.getenv("NODE_TTL", "60"))
+nodes = NodeRegistry(ttl=NODE_TTL)
+
+@app.route("/frontier/lease", methods=["GET"])
+def lease_frontier_urls():
+    """Lease frontier pages, with `node_id` only pages of the hosts that node owns on the hash ring."""
+    db = SessionLocal()
+    try:
+        limit = min(request.args.get("limit", 10, type=int), MAX_LEASE_SIZE)
+        lease_seconds = request.args.get("lease_seconds", LEASE_SECONDS, type=int)
+        node_id = request.args.get("node_id")
+        partition = None
+        if node_id:
+            if FRONTIER_MODE != "memory":
+                return jsonify({"error": "Leasing by node_id needs FRONTIER_MODE=memory"}), 400
+            nodes.heartbeat(node_id)
+            partition = nodes.partition()
+        rows, lease_expires, budget_full, budget_reached = lease_frontier(db, limit, lease_seconds, node_id,
+                                                                          partition)
+        lease = {
+            "pages": [{"id": row.id, "url": row.url} for row in rows],
+            "lease_expires": lease_expires.isoformat(),
+            "budget_reached": budget_reached,
+            # Pages in flight hold the rest of the budget, wait for them instead of stopping
+            "budget_pending": budget_full and not budget_reached
+        }
+        if node_id:
+            frontier = get_frontier()
+            # Pages of other nodes' hosts may still link to this node's hosts
+            lease["ring_version"] = partition[0]
+            lease["pages_elsewhere"] = len(frontier) + frontier.lease_count() > 0
+        return jsonify(lease)
+    except Exception as e:
+        db.rollback()
+        logger.error(f'Error /frontier/lease: {e}')
+        return jsonify({"error": str(e)}), 500
+    finally:
+        db.close()
+
+@app.route("/nodes", methods=["GET"])
+def list_nodes():
+    return jsonify(nodes.snapshot())
+
+@app.route("/nodes/owners", methods=["POST"])
+def node_owners():
+    """Owning node of every host in {"hosts": [...]}, a node checks which of its queued hosts moved."""
+    try:
+        data = request.get_json()
+        version, owners = nodes.owners(data["hosts"])
+        return jsonify({"ring_version": version, "owners": owners})
+    except Exception as e:
+        logger.error(f'Error /nodes/owners: {e}')
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/nodes/heartbeat", methods=["POST"])
+def node_heartbeat():
+    try:
+        data = request.get_json()
+        nodes.heartbeat(data["node_id"])
+        return jsonify(nodes.snapshot())
+    except Exception as e:
+        logger.error(f'Error /nodes/heartbeat: {e}')
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/nodes/leave", methods=["POST"])
+def node_leave():
+    try:
+        data = request.get_json()
+        nodes.leave(data["node_id"])
+        return jsonify(nodes.snapshot())
+    except Exception as e:
+        logger.error(f'Error /nodes/leave: {e}')
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/revisit/lease", methods=["GET"])
+def lease_revisit_urls():
+    """Lease crawled pages that are due for a revisit, along with their validators."""
+    db = SessionLocal()
+    try:
+        limit = min(request.args.get("limit", 10, type=int), MAX_LEASE_SIZE)
+        lease_seconds = request.args.get("lease_seconds", LEASE_SECONDS, type=int)
+        now = datetime.datetime.now()
+        lease_expires = now + datetime.timedelta(seconds=lease_seconds)
+        rows = db.execute(
             text("""
-                        SELECT id, url 
-                        FROM crawldb.page 
-                        WHERE page_type_code = 'FRONTIER' 
-                        ORDER BY relevance DESC 
-                        LIMIT 1 
+                    UPDATE crawldb.page p
+                    SET lease_expires = :lease_expires
+                    FROM (
+                        SELECT id
+                        FROM crawldb.page
+                        WHERE page_type_code IN ('HTML', 'DUPLICATE')
+                        AND next_visit <= :now
+                        AND (lease_expires IS NULL OR lease_expires < :now)
+                        ORDER BY next_visit
+                        LIMIT :limit
                         FOR UPDATE SKIP LOCKED
-                    """)
-        ).fetchone()
-
-        selected_row_id = results.id
-        selected_row_url = results.url
+                    ) due
+                    WHERE p.id = due.id
+                    RETURNING p.id, p.url, p.etag, p.last_modified
+                """),
+            {"now": now, "lease_expires": lease_expires, "limit": limit}
+        ).fetchall()
+        db.commit()
+        return jsonify({
+            "pages": [
+                {"id": row.id, "url": row.url, "etag": row.etag, "last_modified": row.last_modified}
+                for row in rows
+            ],
+            "lease_expires": lease_expires.isoformat()
+        })
+    except Exception as e:
+        db.rollback()
+        logger.error(f'Error /revisit/lease: {e}')
+        return jsonify({"error": str(e)}), 500
+    finally:
+        db.close()
 
-        # update page type to "CRAWLED" and set accessed_time to current time
-        try:
+@app.route("/frontier/release", methods=["POST"])
+def release_frontier_urls():
+    db = SessionLocal()
+    try:
+        data = request.get_json()
+        page_ids = data["page_ids"]
+        if page_ids:
+            db.execute(
+                text("""UPDATE crawldb.page SET page_type_code = 'FRONTIER', lease_expires = NULL
+                        WHERE id = ANY(:ids) AND page_type_code = 'CRAWLING'"""),
+                {"ids": page_ids}
+            )
+            # Pages leased for a revisit keep their type, only the lease goes
             db.execute(
-                text("UPDATE crawldb.page SET page_type_code = 'CRAWLING', accessed_time = :accessed_time  WHERE id = :id"),
-                {"id": selected_row_id, "accessed_time": datetime.datetime.now()}
+                text("""UPDATE crawldb.page SET lease_expires = NULL
+                        WHERE id = ANY(:ids) AND page_type_code IN ('HTML', 'DUPLICATE')"""),
+                {"ids": page_ids}
             )
             db.commit()
-        except:
-            db.rollback()
-            return jsonify({"error": "Could not update page type"}), 500
-
-        return jsonify({"id": selected_row_id, "url": selected_row_url})
+            if FRONTIER_MODE == "memory":
+                get_frontier().release(page_ids)
+        return jsonify({"released": len(page_ids)})
     except Exception as e:
-        logger.error(f'Error /frontier-urls: {e}')
+        db.rollback()
+        logger.error(f'Error /frontier/release: {e}')
         return jsonify({"error": str(e)}), 500
     finally:
         db.close()
 
 @app.route("/page/html-count", methods=["GET"])
 def count_html_pages():
-    db = SessionLocal()
     try:
-        result = db.execute(
-            text("SELECT COUNT(*) FROM crawldb.page WHERE page_type_code = 'HTML';")
-        )
-        count = result.scalar()
-        return jsonify({"html_page_count": count})
+        return jsonify({"html_page_count": stats_snapshot()["page_types"].get("HTML", 0)})
     except Exception as e:
         logger.error(f'Error /page/html-count: {e}')
         return jsonify({"error": str(e)}), 500
+
+@app.route("/crawl/stats", methods=["GET"])
+def crawl_stats_summary():
+    try:
+        snapshot = stats_snapshot(include_sites=request.args.get("sites") == "1")
+        if FRONTIER_MODE == "memory":
+            frontier = get_frontier()
+            snapshot["page_types"]["FRONTIER"] = len(frontier)
+            snapshot["page_types"]["CRAWLING"] = frontier.lease_count()
+        return jsonify(snapshot)
+    except Exception as e:
+        logger.error(f'Error /crawl/stats: {e}')
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    try:
+        snapshot = stats_snapshot()
+        samples = [("api_page_budget", "gauge", {}, snapshot["max_pages"])]
+        samples.extend(("api_pages", "gauge", {"page_type": page_type}, count)
+                       for page_type, count in snapshot["page_types"].items())
+        if FRONTIER_MODE == "memory":
+            frontier = get_frontier()
+            samples.append(("api_frontier_size", "gauge", {"state": "queued"}, len(frontier)))
+            samples.append(("api_frontier_size", "gauge", {"state": "leased"}, frontier.lease_count()))
+        return Response(metrics.render(samples), content_type=CONTENT_TYPE)
+    except Exception as e:
+        logger.error(f'Error /metrics: {e}')
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/crawl/budget", methods=["PUT"])
+def set_crawl_budget():
+    try:
+        data = request.get_json()
+        max_pages = int(data["max_pages"])
+        if FRONTIER_MODE != "memory":
+            # Every server process sharing the database leases against this budget
+            db = SessionLocal()
+            try:
+                db.execute(
+                    text("""INSERT INTO crawldb.crawl_budget (max_pages) VALUES (:max_pages)
+                            ON CONFLICT (id) DO UPDATE SET max_pages = EXCLUDED.max_pages"""),
+                    {"max_pages": max_pages}
+                )
+                db.commit()
+            finally:
+                db.close()
+            return jsonify({"max_pages": max_pages})
+        stats = get_stats()
+        with budget_lock:
+            stats.max_pages = max_pages
+        return jsonify({"max_pages": stats.max_pages})
+    except Exception as e:
+        logger.error(f'Error /crawl/budget: {e}')
+        return jsonify({"error": str(e)}), 500
+
+near_duplicate_index = None
+near_duplicate_lock = threading.Lock()
+
+def get_near_duplicate_index():
+    """The SimHash LSH index, built from the page table on first use."""
+    global near_duplicate_index
+    with near_duplicate_lock:
+        if near_duplicate_index is None:
+            index = SimHashIndex()
+            db = SessionLocal()
+            try:
+                rows = db.execute(
+                    text("SELECT id, simhash FROM crawldb.page WHERE simhash IS NOT NULL").execution_options(yield_per=10000)
+                )
+                for row in rows:
+                    index.add(row.id, to_unsigned(row.simhash))
+            finally:
+                db.close()
+            logger.info(f"Near-duplicate index loaded with {index.size} pages")
+            near_duplicate_index = index
+    return near_duplicate_index
+
+def index_near_duplicate(page_id, data):
+    if data.get("page_type_code") == "HTML" and data.get("simhash") is not None:
+        get_near_duplicate_index().add(page_id, data["simhash"])
+
+@app.route("/page/near-duplicate", methods=["GET"])
+def find_near_duplicate():
+    try:
+        fingerprint = request.args.get("simhash", type=int)
+        if fingerprint is None:
+            return jsonify({"error": "Missing simhash parameter"}), 400
+
+        match = get_near_duplicate_index().find(fingerprint)
+        if match:
+            return jsonify({"exists": True, "page_id": match[0], "distance": match[1]}), 200
+        else:
+            return jsonify({"exists": False}), 200
+    except Exception as e:
+        logger.error(f"Error in /page/near-duplicate: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/content/codecs", methods=["GET"])
+def content_codecs():
+    """Codecs this server can decompress, the crawler compresses page HTML with one of them."""
+    return jsonify({"codecs": list(available_codecs())})
+
+@app.route("/page/<int:page_id>/content", methods=["GET"])
+def get_page_content(page_id):
+    """HTML of a page, decompressed only when the caller can't take the stored encoding."""
+    db = SessionLocal()
+    try:
+        page = db.query(models.Page).filter(models.Page.id == page_id).first()
+        if not page:
+            return jsonify({"error": "Page not found"}), 404
+        # Pages stored before the content table keep their HTML in the row
+        if page.html_content is not None:
+            return Response(page.html_content, mimetype="text/html")
+
+        content = load_content(db, page.content_hash) if page.content_hash else None
+        if content is None:
+            return jsonify({"error": "Page has no content"}), 404
+
+        codec, blob = content
+        if codec == "gzip" and "gzip" in request.headers.get("Accept-Encoding", ""):
+            response = Response(blob, mimetype="text/html")
+            response.headers["Content-Encoding"] = "gzip"
+            return response
+        return Response(decompress(codec, blob), mimetype="text/html")
+    except Exception as e:
+        logger.error(f'Error /page/{page_id}/content: {e}')
+        return jsonify({"error": str(e)}), 500
     finally:
         db.close()
 
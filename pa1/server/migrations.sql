@@ -0,0 +1,116 @@
+-- Schema changes on top of the original crawldb schema, safe to run more than once.
+
+-- Frontier leases
+ALTER TABLE crawldb.page ADD COLUMN IF NOT EXISTS lease_expires TIMESTAMP;
+CREATE INDEX IF NOT EXISTS idx_page_frontier ON crawldb.page (relevance DESC) WHERE page_type_code = 'FRONTIER';
+CREATE INDEX IF NOT EXISTS idx_page_crawling_lease ON crawldb.page (lease_expires) WHERE page_type_code = 'CRAWLING';
+
+-- Near-duplicate fingerprints
+ALTER TABLE crawldb.page ADD COLUMN IF NOT EXISTS simhash BIGINT;
+
+-- robots.txt cache validators
+ALTER TABLE crawldb.site ADD COLUMN IF NOT EXISTS robots_fetched_time TIMESTAMP;
+ALTER TABLE crawldb.site ADD COLUMN IF NOT EXISTS robots_etag VARCHAR(200);
+ALTER TABLE crawldb.site ADD COLUMN IF NOT EXISTS robots_last_modified VARCHAR(100);
+CREATE INDEX IF NOT EXISTS idx_site_domain ON crawldb.site (domain);
+
+-- Sitemap lastmod
+ALTER TABLE crawldb.page ADD COLUMN IF NOT EXISTS lastmod TIMESTAMP;
+
+-- Compressed page content, pages reference it by content_hash
+CREATE TABLE IF NOT EXISTS crawldb.page_content (
+    content_hash VARCHAR(64) PRIMARY KEY,
+    codec VARCHAR(10) NOT NULL,
+    size INTEGER,
+    data BYTEA NOT NULL
+);
+
+-- Downloaded images, duplicates reference the stored copy by content_hash
+ALTER TABLE crawldb.image ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+CREATE INDEX IF NOT EXISTS idx_image_content_hash ON crawldb.image (content_hash);
+
+-- Conditional revisits
+ALTER TABLE crawldb.page ADD COLUMN IF NOT EXISTS etag VARCHAR(200);
+ALTER TABLE crawldb.page ADD COLUMN IF NOT EXISTS last_modified VARCHAR(100);
+ALTER TABLE crawldb.page ADD COLUMN IF NOT EXISTS next_visit TIMESTAMP;
+ALTER TABLE crawldb.page ADD COLUMN IF NOT EXISTS revisit_interval INTEGER;
+ALTER TABLE crawldb.page ADD COLUMN IF NOT EXISTS visit_count INTEGER;
+ALTER TABLE crawldb.page ADD COLUMN IF NOT EXISTS change_count INTEGER;
+ALTER TABLE crawldb.page ADD COLUMN IF NOT EXISTS last_changed TIMESTAMP;
+CREATE INDEX IF NOT EXISTS idx_page_next_visit ON crawldb.page (next_visit) WHERE page_type_code IN ('HTML', 'DUPLICATE');
+UPDATE crawldb.page SET next_visit = accessed_time + INTERVAL '1 day', visit_count = 1
+WHERE next_visit IS NULL AND page_type_code IN ('HTML', 'DUPLICATE');
+
+-- URLs are unique and looked up through a 16-byte hash instead of the full text
+CREATE UNIQUE INDEX IF NOT EXISTS idx_page_url_hash ON crawldb.page ((md5(url)::uuid));
+DROP INDEX IF EXISTS crawldb.unq_url_idx;
+ALTER TABLE crawldb.page DROP CONSTRAINT IF EXISTS page_url_key;
+
+-- Page counts for server processes that share the database (FRONTIER_MODE=db), kept by triggers.
+-- FRONTIER pages are not counted, so adding links never waits on a counter row.
+CREATE TABLE IF NOT EXISTS crawldb.page_type_count (
+    page_type_code VARCHAR(20) PRIMARY KEY,
+    pages BIGINT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS crawldb.crawl_budget (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    max_pages INTEGER NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION crawldb.count_page_types() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM crawldb.page_type_count;
+        RETURN NULL;
+    END IF;
+    -- Rows in a fixed order, so two transactions never wait on each other's counter rows
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO crawldb.page_type_count AS c (page_type_code, pages)
+        SELECT page_type_code, COUNT(*) FROM new_rows
+        WHERE page_type_code <> 'FRONTIER'
+        GROUP BY page_type_code ORDER BY page_type_code
+        ON CONFLICT (page_type_code) DO UPDATE SET pages = c.pages + EXCLUDED.pages;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE crawldb.page_type_count c SET pages = c.pages - deleted.pages
+        FROM (SELECT page_type_code, COUNT(*) AS pages FROM old_rows
+              WHERE page_type_code <> 'FRONTIER' GROUP BY page_type_code ORDER BY page_type_code) deleted
+        WHERE c.page_type_code = deleted.page_type_code;
+    ELSE
+        INSERT INTO crawldb.page_type_count AS c (page_type_code, pages)
+        SELECT page_type_code, SUM(delta) FROM (
+            SELECT page_type_code, -1 AS delta FROM old_rows
+            UNION ALL
+            SELECT page_type_code, 1 FROM new_rows
+        ) changes
+        WHERE page_type_code <> 'FRONTIER'
+        GROUP BY page_type_code HAVING SUM(delta) <> 0 ORDER BY page_type_code
+        ON CONFLICT (page_type_code) DO UPDATE SET pages = c.pages + EXCLUDED.pages;
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+-- The counts start from the page table once, when the triggers are first created
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'page_type_count_insert') THEN
+        LOCK TABLE crawldb.page IN SHARE ROW EXCLUSIVE MODE;
+        DELETE FROM crawldb.page_type_count;
+        INSERT INTO crawldb.page_type_count (page_type_code, pages)
+        SELECT page_type_code, COUNT(*) FROM crawldb.page
+        WHERE page_type_code <> 'FRONTIER'
+        GROUP BY page_type_code;
+        CREATE TRIGGER page_type_count_insert AFTER INSERT ON crawldb.page
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION crawldb.count_page_types();
+        CREATE TRIGGER page_type_count_update AFTER UPDATE ON crawldb.page
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION crawldb.count_page_types();
+        CREATE TRIGGER page_type_count_delete AFTER DELETE ON crawldb.page
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION crawldb.count_page_types();
+        CREATE TRIGGER page_type_count_truncate AFTER TRUNCATE ON crawldb.page
+            FOR EACH STATEMENT EXECUTE FUNCTION crawldb.count_page_types();
+    END IF;
+END
+$$;
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, TIMESTAMP, LargeBinary
+from sqlalchemy import Column, Integer, BigInteger, String, Text, ForeignKey, TIMESTAMP, LargeBinary, Index, func
+from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -20,6 +21,9 @@ class Site(Base):
     domain = Column(String(500))
     robots_content = Column(Text)
     sitemap_content = Column(Text)
+    robots_fetched_time = Column(TIMESTAMP)
+    robots_etag = Column(String(200))
+    robots_last_modified = Column(String(100))
 
 class Page(Base):
     __tablename__ = "page"
@@ -27,13 +31,34 @@ class Page(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     site_id = Column(Integer, ForeignKey("crawldb.site.id"))
     page_type_code = Column(String(20), ForeignKey("crawldb.page_type.code"))
-    url = Column(String(3000), unique=True)
+    url = Column(String(3000))
     html_content = Column(Text)
     http_status_code = Column(Integer)
     accessed_time = Column(TIMESTAMP)
     accessed_ip = Column(String(16))
     relevance = Column(Integer)
     content_hash = Column(String(64), unique=True)
+    lease_expires = Column(TIMESTAMP)
+    simhash = Column(BigInteger)
+    lastmod = Column(TIMESTAMP)
+    etag = Column(String(200))
+    last_modified = Column(String(100))
+    next_visit = Column(TIMESTAMP)
+    revisit_interval = Column(Integer)
+    visit_count = Column(Integer)
+    change_count = Column(Integer)
+    last_changed = Column(TIMESTAMP)
+
+# URLs are unique through a fixed-width hash instead of a B-tree over the full text
+Index("idx_page_url_hash", func.md5(Page.url).cast(UUID), unique=True)
+
+class PageContent(Base):
+    __tablename__ = "page_content"
+    __table_args__ = {"schema": "crawldb"}
+    content_hash = Column(String(64), primary_key=True)
+    codec = Column(String(10))
+    size = Column(Integer)
+    data = Column(LargeBinary)
 
 class PageData(Base):
     __tablename__ = "page_data"
@@ -52,6 +77,7 @@ class Image(Base):
     content_type = Column(String(50))
     data = Column(LargeBinary)
     accessed_time = Column(TIMESTAMP)
+    content_hash = Column(String(64), index=True)
 
 class Link(Base):
     __tablename__ = "link"
@@ -5,6 +5,13 @@ class SiteCreate(BaseModel):
     domain: str
     robots_content: str = None
     sitemap_content: str = None
+    robots_etag: str = None
+    robots_last_modified: str = None
+
+class SiteRobots(BaseModel):
+    robots_content: Optional[str] = None
+    robots_etag: Optional[str] = None
+    robots_last_modified: Optional[str] = None
 
 class DelayData(BaseModel):
     site_url: str
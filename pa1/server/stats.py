@@ -0,0 +1,63 @@
+import threading
+from collections import Counter, defaultdict
+
+# Frontier states change on every lease, their counts come from the frontier itself
+FRONTIER_TYPES = ("FRONTIER", "CRAWLING")
+
+
+class CrawlStats:
+    """Page counts per page type and per site, kept up to date as pages change state.
+
+    Loaded with one GROUP BY when the server starts, then every page update
+    records its (old site, old type) -> (new site, new type) transition, so
+    reading a count never scans the page table.
+    """
+
+    def __init__(self, max_pages):
+        self.max_pages = max_pages
+        self.page_types = Counter()
+        self.sites = defaultdict(Counter)
+        self.lock = threading.Lock()
+
+    def load(self, rows):
+        """Initialize from (site_id, page_type_code, count) rows."""
+        with self.lock:
+            for site_id, page_type, count in rows:
+                if page_type in FRONTIER_TYPES:
+                    continue
+                self.page_types[page_type] += count
+                if site_id is not None:
+                    self.sites[site_id][page_type] += count
+
+    def record(self, transitions):
+        """Apply (old_site_id, old_type, new_site_id, new_type) page transitions."""
+        with self.lock:
+            for old_site, old_type, new_site, new_type in transitions:
+                if old_type is not None and old_type not in FRONTIER_TYPES:
+                    self.page_types[old_type] -= 1
+                    if old_site is not None:
+                        self.sites[old_site][old_type] -= 1
+                if new_type is not None and new_type not in FRONTIER_TYPES:
+                    self.page_types[new_type] += 1
+                    if new_site is not None:
+                        self.sites[new_site][new_type] += 1
+
+    def count(self, page_type):
+        return self.page_types[page_type]
+
+    def budget_left(self, in_flight):
+        """HTML pages that may still be leased, pages in flight count against the budget."""
+        return self.max_pages - self.page_types["HTML"] - in_flight
+
+    def snapshot(self, include_sites=False):
+        with self.lock:
+            snapshot = {
+                "max_pages": self.max_pages,
+                "page_types": {page_type: count for page_type, count in self.page_types.items() if count},
+            }
+            if include_sites:
+                snapshot["sites"] = {
+                    site_id: {page_type: count for page_type, count in counts.items() if count}
+                    for site_id, counts in self.sites.items()
+                }
+            return snapshot
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The server modules import each other by their flat names, like when run from pa1/server
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
@@ -0,0 +1,42 @@
+"""Leasing, expiry and completion of the in-memory frontier."""
+from frontier import Frontier
+
+
+def make_frontier(*pages):
+    frontier = Frontier()
+    frontier.add_many(pages)
+    return frontier
+
+
+def test_lease_by_relevance():
+    frontier = make_frontier((1, "http://a/1", 5, "a"), (2, "http://b/2", 9, "b"), (3, "http://a/3", 7, "a"))
+    assert [page.id for page in frontier.lease(3, now=0, lease_expires=10)] == [2, 3, 1]
+    assert len(frontier) == 0
+    assert frontier.lease_count() == 3
+
+
+def test_expired_lease_is_leased_again():
+    frontier = make_frontier((1, "http://a/1", 5, "a"))
+    frontier.lease(1, now=0, lease_expires=10)
+    assert [page.id for page in frontier.lease(1, now=11, lease_expires=20)] == [1]
+
+
+def test_late_result_after_expiry_is_not_leased_again():
+    frontier = make_frontier((1, "http://a/1", 5, "a"), (2, "http://a/2", 1, "a"))
+    frontier.lease(1, now=0, lease_expires=10)
+    # The lease expires and page 1 is queued again, then its result arrives
+    assert frontier.lease(0, now=11, lease_expires=20) == []
+    assert len(frontier) == 2
+    frontier.complete([1])
+
+    assert len(frontier) == 1
+    assert [page.id for page in frontier.lease(5, now=12, lease_expires=20)] == [2]
+    assert frontier.lease(5, now=13, lease_expires=20) == []
+
+
+def test_release_puts_pages_back():
+    frontier = make_frontier((1, "http://a/1", 5, "a"))
+    frontier.lease(1, now=0, lease_expires=10)
+    frontier.release([1])
+    assert frontier.lease_count() == 0
+    assert [page.id for page in frontier.lease(1, now=1, lease_expires=10)] == [1]